@@ -0,0 +1,72 @@
+import argparse
+import json
+import pickle
+import sys
+import time
+
+from commonData import Request, ServerReport, ServerStatus, decode_message, encode_message
+
+ROUNDS = 100000
+REPORT_BATCH = 10  # statuses per ServerReport
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser(description="Struct codec against plain pickle")
+    parser.add_argument('--rounds', default=ROUNDS, type=int)
+    parser.add_argument('--batch', default=REPORT_BATCH, type=int)
+    parser.add_argument('--output', default=None, help='JSON result file, default stdout')
+    return parser.parse_args()
+
+
+def sample_messages(batch):
+    now = time.time()
+    request = Request("client-A", 12345, 20, 750.25)
+    request.request_send_time = now
+    request.request_receive_time = now + 1e-3
+    request.request_process_time = now + 2e-3
+    request.reply_send_time = now + 0.75
+    request.reply_receive_time = now + 0.751
+    status = ServerStatus(55.5, False, True, now, 3, 4)
+    report = ServerReport("10.0.0.1", [ServerStatus(10. * i, False, i > 5, now + i * 0.02, i, i)
+                                       for i in range(batch)])
+    return {"request": request, "status": status, "report": report}
+
+
+def measure(function, argument, rounds):
+    start_time = time.perf_counter()
+    for _ in range(rounds):
+        function(argument)
+    return (time.perf_counter() - start_time) / rounds * 1e9
+
+
+def main():
+    args = get_arguments()
+    codecs = {
+        "pickle": (pickle.dumps, pickle.loads),
+        "struct": (encode_message, decode_message),
+    }
+    results = []
+    for name, message in sample_messages(args.batch).items():
+        for codec, (encode, decode) in codecs.items():
+            payload = encode(message)
+            result = {
+                "message": name,
+                "codec": codec,
+                "bytes": len(payload),
+                "encode_ns": measure(encode, message, args.rounds),
+                "decode_ns": measure(decode, payload, args.rounds),
+            }
+            results.append(result)
+            print("{:<8} {:<7}: {:>5} bytes, encode {:>7.0f}ns, decode {:>7.0f}ns".format(
+                name, codec, result["bytes"], result["encode_ns"], result["decode_ns"]), file=sys.stderr)
+    report = {"rounds": args.rounds, "batch": args.batch, "results": results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
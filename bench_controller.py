@@ -0,0 +1,327 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import struct
+import sys
+import time
+import tracemalloc
+
+from commonData import ServerStatus
+
+# the controller needs POX, this repository usually lives in pox/ext/
+POX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+SCALES = "10,100,1000,10000"  # servers and clients per run
+POLICIES = "1,2,3,4,5,6,7,8,9"
+DECISIONS = 10000  # client to vip packets per run
+STATUS_EVERY = 100  # decisions between two synthetic status rounds
+CLIENT_NETWORK = "10.64.0.0/16"
+SERVER_NETWORK = "10.128.0.0/16"
+TOLERANCE = 0.2  # allowed drop of decisions/sec against the baseline
+SEED = 1
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser(
+        description="Replay synthetic PacketIn and ConnectionUp events through the controller")
+    parser.add_argument('--pox_dir', default=os.environ.get("POX_DIR", POX_DIR))
+    parser.add_argument('--scales', default=SCALES,
+                        help='Comma separated numbers of servers and clients, default={}'.format(SCALES))
+    parser.add_argument('--policies', default=POLICIES)
+    parser.add_argument('--decisions', default=DECISIONS, type=int)
+    parser.add_argument('--status_every', default=STATUS_EVERY, type=int)
+    parser.add_argument('--no_pack', action='store_true',
+                        help='Do not serialize the OpenFlow messages sent to the switch')
+    parser.add_argument('--no_memory', action='store_true',
+                        help='Skip the tracemalloc pass')
+    parser.add_argument('--output', default=None, help='JSON result file, default stdout')
+    parser.add_argument('--baseline', default=None,
+                        help='Previous JSON result, exit with 1 when decisions/sec regressed')
+    parser.add_argument('--tolerance', default=TOLERANCE, type=float)
+    parser.add_argument('--seed', default=SEED, type=int)
+    return parser.parse_args()
+
+
+class StubSource():
+    # stands for core.openflow and core.openflow_discovery, events are fed by hand
+    _eventMixin_events = set()
+
+    def addListeners(self, sink, *args, **kwargs):
+        return []
+
+
+class StubCore():
+    def __init__(self):
+        self.openflow = StubSource()
+        self.openflow_discovery = StubSource()
+
+    def addListenerByName(self, *args, **kwargs):
+        pass
+
+    def callLater(self, callback, *args, **kwargs):
+        callback(*args, **kwargs)
+
+    def callDelayed(self, delay, callback, *args, **kwargs):
+        callback(*args, **kwargs)
+
+
+class StubConnection():
+    def __init__(self, dpid, pack=True):
+        self.dpid = dpid
+        self.pack = pack
+        self.message_num = 0
+        self.byte_num = 0
+
+    def send(self, message):
+        # a real connection serializes every message before writing it
+        self.message_num += 1
+        if self.pack:
+            self.byte_num += len(message.pack())
+
+
+class StubEvent():
+    def __init__(self, connection, parsed=None, port=None):
+        self.connection = connection
+        self.dpid = connection.dpid
+        self.parsed = parsed
+        self.port = port
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {"p50_us": 0., "p99_us": 0., "max_us": 0.}
+    return {
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[min(int(len(samples) * 0.99), len(samples) - 1)] * 1e6,
+        "max_us": samples[-1] * 1e6,
+    }
+
+
+class ControllerBench():
+    """
+    One policy at one scale: a controller built on stubbed core and
+    connection objects learns every host from ARP replies to its ConnectionUp
+    sweep, then decides where `decisions` client packets go. Servers report
+    random synthetic statuses every status_every decisions.
+    """
+
+    def __init__(self, controller_module, policy, num, args):
+        self.module = controller_module
+        self.policy = policy
+        self.num = num
+        self.args = args
+        self.random = random.Random(args.seed)
+        pool_hosts = self.module.pool_hosts
+        IPAddr = self.module.IPAddr
+        self.client_ips = [IPAddr(ip) for ip in pool_hosts(CLIENT_NETWORK, num)]
+        self.server_ips = [IPAddr(ip) for ip in pool_hosts(SERVER_NETWORK, num)]
+        self.monitor_ip = IPAddr("10.0.3.1")
+        self.switch_ip = IPAddr("10.0.2.1")
+        self.connection = StubConnection(1, not args.no_pack)
+        self.controller = None
+
+    def build_controller(self):
+        module = self.module
+
+        class BenchController(module.Controller):
+            # statuses are fed synchronously instead of read from the status board
+            def run_read_usage_thread(self, server_ips):
+                pass
+
+        self.controller = BenchController(
+            self.switch_ip, self.server_ips, self.client_ips, self.monitor_ip,
+            module.EthAddr("00:00:00:00:00:11"), self.policy,
+            client_network=CLIENT_NETWORK, server_network=SERVER_NETWORK,
+            stale_deadline=1e9, health=False, stats_file=os.devnull)
+
+    def mac(self, index):
+        return self.module.EthAddr(struct.pack("!Q", 0x020000000000 + index)[2:])
+
+    def arp_reply(self, ip, mac):
+        # a host answering the controller's ConnectionUp arp request
+        arp_packet = self.module.arp()
+        arp_packet.opcode = self.module.arp.REPLY
+        arp_packet.hwsrc = mac
+        arp_packet.hwdst = self.controller.switch_mac
+        arp_packet.protosrc = ip
+        arp_packet.protodst = self.switch_ip
+        ether_packet = self.module.ethernet()
+        ether_packet.type = self.module.ethernet.ARP_TYPE
+        ether_packet.src = mac
+        ether_packet.dst = self.controller.switch_mac
+        ether_packet.set_payload(arp_packet)
+        return ether_packet
+
+    def client_packet(self, ip, mac):
+        from pox.lib.packet.tcp import tcp
+        segment = tcp()
+        segment.srcport = self.random.randint(1024, 65535)
+        segment.dstport = 5000
+        segment.SYN = True
+        ip_packet = self.module.ipv4()
+        ip_packet.protocol = self.module.ipv4.TCP_PROTOCOL
+        ip_packet.srcip = ip
+        ip_packet.dstip = self.switch_ip
+        ip_packet.set_payload(segment)
+        ether_packet = self.module.ethernet()
+        ether_packet.type = self.module.ethernet.IP_TYPE
+        ether_packet.src = mac
+        ether_packet.dst = self.controller.switch_mac
+        ether_packet.set_payload(ip_packet)
+        return ether_packet
+
+    def report_status(self):
+        now = time.time()
+        for ip in self.server_ips:
+            cpu_usage = self.random.uniform(0, 100)
+            queue_length = self.random.randint(0, 4)
+            status = ServerStatus(cpu_usage, cpu_usage == 0, queue_length > 0, now,
+                                  queue_length, self.random.randint(0, 5))
+            self.controller.update_server_load(ip, status)
+        self.controller.refresh_server_loads()
+
+    def run(self):
+        start_time = time.perf_counter()
+        self.build_controller()
+        build_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        self.controller._handle_ConnectionUp(StubEvent(self.connection))
+        connection_up_time = time.perf_counter() - start_time
+
+        # every host answers the sweep, each on its own switch port
+        hosts = [self.monitor_ip] + self.server_ips + self.client_ips
+        replies = [StubEvent(self.connection, self.arp_reply(ip, self.mac(port)), port)
+                   for port, ip in enumerate(hosts, 1)]
+        arp_latency = []
+        for event in replies:
+            start_time = time.perf_counter()
+            self.controller._handle_PacketIn(event)
+            arp_latency.append(time.perf_counter() - start_time)
+
+        uses_status = self.controller.policy.uses_status
+        if uses_status:
+            self.report_status()
+        client_ports = {ip: port for port, ip in enumerate(hosts, 1)}
+        packets = []
+        for _ in range(self.args.decisions):
+            ip = self.random.choice(self.client_ips)
+            packets.append(StubEvent(self.connection, self.client_packet(ip, self.mac(client_ports[ip])),
+                                     client_ports[ip]))
+        message_num = self.connection.message_num
+        decision_latency = []
+        status_latency = []
+        gc.collect()
+        total_start_time = time.perf_counter()
+        for index, event in enumerate(packets):
+            if uses_status and index and index % self.args.status_every == 0:
+                start_time = time.perf_counter()
+                self.report_status()
+                status_latency.append(time.perf_counter() - start_time)
+            start_time = time.perf_counter()
+            self.controller._handle_PacketIn(event)
+            decision_latency.append(time.perf_counter() - start_time)
+        total_time = time.perf_counter() - total_start_time
+        decision_time = sum(decision_latency)
+
+        result = {
+            "policy": self.policy,
+            "policy_name": self.controller.policy_name,
+            "servers": len(self.server_ips),
+            "clients": len(self.client_ips),
+            "build_s": build_time,
+            "connection_up_s": connection_up_time,
+            "arp": dict(count=len(arp_latency), **percentiles(arp_latency)),
+            "decisions": dict(
+                count=len(decision_latency),
+                per_sec=len(decision_latency) / decision_time if decision_time else 0.,
+                wall_per_sec=len(decision_latency) / total_time if total_time else 0.,
+                messages_per_decision=(self.connection.message_num - message_num) / max(len(packets), 1),
+                **percentiles(decision_latency)),
+            "status_refresh": dict(count=len(status_latency), **percentiles(status_latency)),
+            "flows": len(self.controller.flow_table),
+            "servers_used": len(set(self.controller.flow_table.client_server().values())),
+        }
+        return result
+
+
+def measure_memory(controller_module, policy, num, args):
+    # separate pass, tracemalloc slows every allocation down too much for the timed one
+    gc.collect()
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    bench = ControllerBench(controller_module, policy, num, args)
+    bench.run()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    flows = max(len(bench.controller.flow_table), 1)
+    return {
+        "retained_kb": (current - base) / 1024.,
+        "peak_kb": (peak - base) / 1024.,
+        "bytes_per_flow": (current - base) / flows,
+    }
+
+
+def check_baseline(results, path, tolerance):
+    with open(path) as f:
+        baseline = json.load(f)
+    previous = {(result["policy"], result["servers"]): result["decisions"]["per_sec"]
+                for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        key = (result["policy"], result["servers"])
+        if key in previous and result["decisions"]["per_sec"] < previous[key] * (1 - tolerance):
+            regressions.append("policy {} with {} servers: {:.0f} decisions/s, was {:.0f}".format(
+                key[0], key[1], result["decisions"]["per_sec"], previous[key]))
+    return regressions
+
+
+def main():
+    args = get_arguments()
+    sys.path.insert(1, os.path.abspath(args.pox_dir))
+    sys.path.insert(1, os.path.dirname(os.path.abspath(__file__)))
+    # policy warnings such as dropped packets are expected in a replay
+    logging.disable(logging.WARNING)
+    import controller
+    controller.core = StubCore()
+
+    results = []
+    for num in [int(num) for num in args.scales.split(",")]:
+        for policy in args.policies.split(","):
+            result = ControllerBench(controller, policy, num, args).run()
+            if not args.no_memory:
+                result["memory"] = measure_memory(controller, policy, num, args)
+            results.append(result)
+            print("policy {:<16} servers {:>6}: {:>9.0f} decisions/s, p50 {:>7.1f}us, p99 {:>7.1f}us".format(
+                result["policy_name"], num, result["decisions"]["per_sec"],
+                result["decisions"]["p50_us"], result["decisions"]["p99_us"]), file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.time(),
+        "decisions": args.decisions,
+        "status_every": args.status_every,
+        "pack": not args.no_pack,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.baseline:
+        regressions = check_baseline(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print("regression: " + regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
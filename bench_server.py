@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from commonData import (WIRE_FORMAT, FrameDecoder, Request, decode_message, encode_frames, encode_message,
+                        receive_frames)
+
+ENGINES = "process,thread"
+REQUESTS = 2000
+CONNECTIONS = 8
+PIPELINE = 1  # requests outstanding per connection
+TIME_USAGE = 0  # In ms, 0 measures the server's own overhead
+SERVER_IP = "127.0.0.1"
+SERVER_PORT = 5100
+LOG_FOLDER_PATH = "/tmp/server_status/"
+START_TIMEOUT = 10  # in s
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser(
+        description="Per request overhead of the server engines on localhost")
+    parser.add_argument('--engines', default=ENGINES)
+    parser.add_argument('--requests', default=REQUESTS, type=int)
+    parser.add_argument('--connections', default=CONNECTIONS, type=int)
+    parser.add_argument('--time_usage', default=TIME_USAGE, type=float)
+    parser.add_argument('--pipeline', default=PIPELINE, type=int)
+    parser.add_argument('--wire_format', default=WIRE_FORMAT, choices=["struct", "pickle"])
+    parser.add_argument('--server_port', default=SERVER_PORT, type=int)
+    parser.add_argument('--execution', default="sleep", choices=["sleep", "burn"],
+                        help='Let the server burn the requested cpu instead of sleeping')
+    parser.add_argument('--reconnect', action='store_true',
+                        help='Open a new connection for every request')
+    parser.add_argument('--output', default=None, help='JSON result file, default stdout')
+    return parser.parse_args()
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {"mean_us": 0., "p50_us": 0., "p99_us": 0., "max_us": 0.}
+    return {
+        "mean_us": sum(samples) / len(samples) * 1e6,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[min(int(len(samples) * 0.99), len(samples) - 1)] * 1e6,
+        "max_us": samples[-1] * 1e6,
+    }
+
+
+def start_server(engine, port, execution):
+    server = subprocess.Popen(
+        [sys.executable, "server.py", "--server_ip", SERVER_IP, "--server_port", str(port),
+         "--monitor_ip", SERVER_IP, "--monitor_port", "1", "--engine", engine, "--accept_pickle",
+         "--execution", execution],
+        cwd=os.path.dirname(os.path.abspath(__file__)), start_new_session=True)
+    deadline = time.time() + START_TIMEOUT
+    while time.time() < deadline:
+        try:
+            socket.create_connection((SERVER_IP, port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.05)
+    stop_server(server)
+    raise RuntimeError("server with engine {} did not start".format(engine))
+
+
+def stop_server(server):
+    # the server forks helpers, take the whole session down
+    try:
+        os.killpg(server.pid, 9)
+    except OSError:
+        pass
+    server.wait()
+
+
+def run_connection(client_index, port, request_num, args, results):
+    overheads, waits = [], []
+    connection = None
+    pipeline = 1 if args.reconnect else max(args.pipeline, 1)
+    start_times = {}
+    request_id = 0
+    while request_id < request_num or start_times:
+        if connection is None or (args.reconnect and not start_times):
+            if connection is not None:
+                connection.close()
+            connection = socket.create_connection((SERVER_IP, port))
+            decoder = FrameDecoder()
+        messages = []
+        while request_id < request_num and len(start_times) + len(messages) < pipeline:
+            request = Request("bench{}".format(client_index), request_id, 0, args.time_usage)
+            start_times[request.id] = time.perf_counter()
+            messages.append(encode_message(request, args.wire_format))
+            request_id += 1
+        if messages:
+            connection.sendall(encode_frames(messages))
+        for frame in receive_frames(connection, decoder):
+            reply = decode_message(frame, accept_pickle=True)
+            overheads.append(time.perf_counter() - start_times.pop(reply.id) - args.time_usage * 1e-3)
+            waits.append(reply.get_wait_time())
+    connection.close()
+    results.append((overheads, waits))
+
+
+def run_engine(engine, port, args):
+    server = start_server(engine, port, args.execution)
+    try:
+        results = []
+        request_num = max(args.requests // args.connections, 1)
+        threads = [threading.Thread(target=run_connection, args=(index, port, request_num, args, results))
+                   for index in range(args.connections)]
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        total_time = time.perf_counter() - start_time
+    finally:
+        stop_server(server)
+    overheads = [overhead for result in results for overhead in result[0]]
+    waits = [wait for result in results for wait in result[1]]
+    return {
+        "engine": engine,
+        "requests": len(overheads),
+        "connections": args.connections,
+        "reconnect": args.reconnect,
+        "pipeline": args.pipeline,
+        "wire_format": args.wire_format,
+        "execution": args.execution,
+        "requests_per_sec": len(overheads) / total_time,
+        # round trip minus the requested time usage, as seen by the client
+        "overhead": percentiles(overheads),
+        # receive to start of processing, as stamped by the server
+        "dispatch": percentiles(waits),
+    }
+
+
+def main():
+    args = get_arguments()
+    if not os.path.exists(LOG_FOLDER_PATH):
+        os.makedirs(LOG_FOLDER_PATH)
+    results = []
+    for index, engine in enumerate(args.engines.split(",")):
+        # a fresh port per engine, the previous server's sockets may still be closing
+        result = run_engine(engine, args.server_port + index, args)
+        results.append(result)
+        print("engine {:<8}: {:>8.0f} requests/s, overhead p50 {:>8.1f}us, p99 {:>8.1f}us".format(
+            engine, result["requests_per_sec"], result["overhead"]["p50_us"], result["overhead"]["p99_us"]),
+            file=sys.stderr)
+    report = {"time_usage_ms": args.time_usage, "results": results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,18 @@
 import argparse
+import asyncio
+import heapq
 import logging
 import multiprocessing
 import random
+import resource
 import socket
 import time
-import pickle
+import traceback
 
-from commonData import Request, SenderSocket
+from collections import deque
+
+from commonData import (RECEIVE_SIZE, FrameDecoder, Refusal, Rejection, Request, SenderSocket, add_wire_arguments,
+                        decode_message, encode_frame, encode_frames, encode_message, refusal_reason)
 
 REQUEST_CPU_USAGE_RANGE = [0, 40]  # In percentage
 REQUEST_TIME_USAGE_RANGE = [500, 1000]  # In ms
@@ -16,6 +22,19 @@ SERVER_PORT = 5000
 MONITOR_IP = "127.0.2.1"
 MONITOR_PORT = 6000
 FIX_USAGE = True
+PIPELINE = 1  # requests outstanding on the server connection, 1 waits for every reply
+MAX_RETRIES = 5  # rejections of a request before the client gives it up
+RETRY_BACKOFF = 100  # In ms, delay before the first retry, doubled for every further one
+MAX_BACKOFF = 5000  # In ms
+MODE = "closed"  # "closed" waits for replies before sending more, "open" sends requests as they arrive
+VIRTUAL_CLIENTS = 100  # clients sharing the event loop of one open loop process
+RPS = "10"  # requests per second, or time:rps points ramped linearly, e.g. 0:10,30:200,60:200
+DURATION = 60  # In s, length of a constant rps run
+ARRIVAL = "poisson"  # "poisson", "constant" or "pareto" gaps between two requests
+PARETO_SHAPE = 1.5  # heavy tailed gaps, mostly short bursts and a few long pauses
+RAMP_STEP = 0.01  # In s, time skipped while the target rps is 0
+DRAIN_TIMEOUT = 30  # In s, longest wait for the replies once the last request is sent
+REPORT_BATCH = 100  # replies per batch of reports to the monitor
 
 
 def get_arguments():
@@ -29,6 +48,19 @@ def get_arguments():
     parser.add_argument('--server_port', default=SERVER_PORT, type=int)
     parser.add_argument('--monitor_ip', default=MONITOR_IP)
     parser.add_argument('--monitor_port', default=MONITOR_PORT, type=int)
+    parser.add_argument('--pipeline', default=PIPELINE, type=int)
+    parser.add_argument('--max_retries', default=MAX_RETRIES, type=int)
+    parser.add_argument('--mode', default=MODE, choices=["closed", "open"])
+    parser.add_argument('--virtual_clients', default=VIRTUAL_CLIENTS, type=int,
+                        help='Open loop clients per process, each with its own client id and connection')
+    parser.add_argument('--processes', default=1, type=int,
+                        help='Open loop processes, the rps and virtual clients are split between them')
+    parser.add_argument('--rps', default=RPS,
+                        help='Requests per second, or time:rps points ramped linearly, default={}'.format(RPS))
+    parser.add_argument('--duration', default=DURATION, type=float,
+                        help='In s, length of a constant rps run, default={}'.format(DURATION))
+    parser.add_argument('--arrival', default=ARRIVAL, choices=["poisson", "constant", "pareto"])
+    add_wire_arguments(parser)
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel.upper(
     ), filename="/tmp/server_status/{}.log".format(args.client_id), filemode='w')
@@ -46,7 +78,9 @@ class Client():
         self.monitor_socket = SenderSocket(
             self.monitor_ip, self.monitor_port, "{}-monitor".format(self.client_id))
         self.request_log = []
+        self.init_workload()
 
+    def init_workload(self):
         self.request_cpu_usage_range = REQUEST_CPU_USAGE_RANGE
         self.use_fix_usage = FIX_USAGE
         self.fixed_usage = random.randint(
@@ -62,57 +96,393 @@ class Client():
         self.server_port = args.server_port
         self.monitor_ip = args.monitor_ip
         self.monitor_port = args.monitor_port
+        self.pipeline = max(args.pipeline, 1)
+        self.max_retries = args.max_retries
+        self.wire_format = args.wire_format
+        # replies come back in the format of the request, pickle ones are expected if we sent pickle
+        self.accept_pickle = args.accept_pickle or self.wire_format == "pickle"
 
     def send_requests(self, requests):
+        """
+        Send the requests with up to pipeline outstanding on one connection.
+
+        A rejected request is sent again after a jittered backoff, at least
+        the retry_after of the overloaded server. The connection is then
+        drained and, once the first retry is due, opened again through the
+        switch, so the balancer can move the client to another server.
+        """
         self.server_socket.connect()
         is_monitor_connected = self.monitor_socket.connect()
 
-        for request in requests:
-            request.request_send_time = time.time()
-            message = pickle.dumps(request)
-            request_done_data = self.server_socket.send_and_receive(message)
-            request_done = pickle.loads(request_done_data)
+        pending = deque(requests)
+        outstanding = {}  # id -> request sent and not answered yet
+        retries = []  # (retry time, request id, request) heap
+        reconnect = False
+        reports = []
+        while pending or outstanding or retries:
+            now = time.time()
+            if reconnect and not outstanding and (not retries or retries[0][0] <= now):
+                # nothing left on the overloaded server's connection and the backoff is over
+                self.server_socket.close()
+                self.server_socket.connect()
+                reconnect = False
+            while retries and retries[0][0] <= now:
+                pending.append(heapq.heappop(retries)[2])
+            # top the connection up to pipeline outstanding requests with one send
+            messages = []
+            while pending and not reconnect and len(outstanding) < self.pipeline:
+                request = pending.popleft()
+                if not request.request_send_time:
+                    # a retried request keeps the time of its first attempt
+                    request.request_send_time = time.time()
+                outstanding[request.id] = request
+                messages.append(encode_message(request, self.wire_format))
+            if messages:
+                self.server_socket.send_batch(messages)
+            if not outstanding:
+                # every request left waits for its retry time
+                time.sleep(max(retries[0][0] - time.time(), 0))
+                continue
+            request_done_data = self.server_socket.receive()
+            if request_done_data is None:
+                logging.error("Client {} lost the server with {} requests in flight".format(
+                    self.client_id, len(outstanding)))
+                break
+            request_done = decode_message(request_done_data, self.accept_pickle)
+            if isinstance(request_done, Refusal):
+                logging.error("Client {} refused by the server with {} requests in flight: {}".format(
+                    self.client_id, len(outstanding), request_done.reason))
+                break
+            request = outstanding.pop(request_done.id, None)
+            if request is None:
+                logging.warning("Client {} got a reply to unknown request {}".format(self.client_id, request_done.id))
+                continue
+            if isinstance(request_done, Rejection):
+                request.retries += 1
+                if request.retries > self.max_retries:
+                    logging.error("Client {} gave up request {} after {} rejections".format(
+                        self.client_id, request.id, self.max_retries))
+                    continue
+                delay = self.retry_delay(request.retries, request_done.retry_after)
+                logging.warning("Client {} request {} rejected, retry {} in {:.0f}ms".format(
+                    self.client_id, request.id, request.retries, delay))
+                heapq.heappush(retries, (time.time() + delay * 1e-3, request.id, request))
+                reconnect = True
+                continue
             request_done.reply_receive_time = time.time()
             logging.info("Client {} received reply: {}, time info: {}".format(
                 self.client_id, request_done.info(), request_done.time_info()))
 
             if is_monitor_connected:
-                self.monitor_socket.send_and_receive(
-                    pickle.dumps(request_done))
+                reports.append(encode_message(request_done, self.wire_format))
+                if len(reports) >= self.pipeline or not (pending or outstanding or retries):
+                    self.send_reports(reports)
+                    reports = []
+        if is_monitor_connected and reports:
+            self.send_reports(reports)
         self.server_socket.close()
         self.monitor_socket.close()
         return True
 
+    def retry_delay(self, retries, retry_after):
+        # exponential backoff jittered by +-50%, never below what the server asked for
+        backoff = min(RETRY_BACKOFF * 2 ** (retries - 1), MAX_BACKOFF)
+        return max(backoff * random.uniform(0.5, 1.5), retry_after)
+
+    def send_reports(self, reports):
+        # one batch to the monitor, then collect an acknowledgement per report
+        if self.monitor_socket.send_batch(reports):
+            for _ in reports:
+                acknowledgement = self.monitor_socket.receive()
+                if acknowledgement is None:
+                    break
+                reason = refusal_reason(acknowledgement)
+                if reason is not None:
+                    logging.error("Client {} refused by the monitor: {}".format(self.client_id, reason))
+                    break
+
     def generate_requests(self):
-        requests = []
-        for _ in range(self.request_size):
-            cpu_usage = self.fixed_usage
-            if not self.use_fix_usage:
-                cpu_usage = random.randint(
-                    self.request_cpu_usage_range[0], self.request_cpu_usage_range[1])
-            time_usage = round(random.uniform(
-                self.request_time_usage_range[0], self.request_time_usage_range[1]), 2)
-            requests.append(
-                Request(self.client_id, self.request_id, cpu_usage, time_usage))
-            self.request_id += 1
-        return requests
+        return [self.generate_request() for _ in range(self.request_size)]
+
+    def generate_request(self):
+        cpu_usage = self.fixed_usage
+        if not self.use_fix_usage:
+            cpu_usage = random.randint(
+                self.request_cpu_usage_range[0], self.request_cpu_usage_range[1])
+        time_usage = round(random.uniform(
+            self.request_time_usage_range[0], self.request_time_usage_range[1]), 2)
+        request = Request(self.client_id, self.request_id, cpu_usage, time_usage)
+        self.request_id += 1
+        return request
 
     def run(self):
         requests = self.generate_requests()
         self.send_requests(requests)
 
 
+class VirtualClient(Client):
+    """
+    One of the many clients of an open loop process. It shares the event
+    loop and the workload of a Client, but opens no socket of its own until
+    its first request: requests are written as they arrive, whatever is still
+    outstanding. A rejection retires the current connection, the retry and
+    the next requests go through a new one, so the balancer can pick another
+    server. The old connection closes once its last reply is in.
+    """
+
+    def __init__(self, args, sub_name, generator):
+        self.read_argument(args)
+        self.client_id += sub_name
+        self.init_workload()
+        self.generator = generator
+        self.writer = None  # current connection
+        self.connect_lock = None
+        self.outstanding = {}  # id -> (request, connection it was sent on)
+
+    async def send(self, request):
+        try:
+            if self.connect_lock is None:
+                self.connect_lock = asyncio.Lock()
+            async with self.connect_lock:
+                if self.writer is None:
+                    reader, self.writer = await asyncio.open_connection(self.server_ip, self.server_port)
+                    self.generator.spawn(self.receive(reader, self.writer))
+            writer = self.writer
+            if not request.request_send_time:
+                request.request_send_time = time.time()
+            self.outstanding[request.id] = (request, writer)
+            writer.write(encode_frame(encode_message(request, self.wire_format)))
+        except asyncio.CancelledError:
+            # the run ended while connecting
+            self.generator.failed_num += 1
+        except:
+            logging.error(traceback.format_exc())
+            self.generator.failed_num += 1
+
+    async def receive(self, reader, writer):
+        decoder = FrameDecoder()
+        try:
+            while True:
+                data = await reader.read(RECEIVE_SIZE)
+                if not data:
+                    break
+                for frame in decoder.feed(data):
+                    self.handle_reply(decode_message(frame, self.accept_pickle), writer)
+                if writer is not self.writer and not any(
+                        sent_on is writer for _, sent_on in self.outstanding.values()):
+                    break
+        except asyncio.CancelledError:
+            # the run is over
+            pass
+        except:
+            logging.error(traceback.format_exc())
+        if writer is self.writer:
+            self.writer = None
+        writer.close()
+        # whatever was still outstanding on this connection is lost
+        for request_id in [request_id for request_id, (_, sent_on) in self.outstanding.items() if sent_on is writer]:
+            del self.outstanding[request_id]
+            self.generator.failed_num += 1
+
+    def handle_reply(self, reply, writer):
+        if isinstance(reply, Refusal):
+            # the server closes the connection, what is outstanding on it is lost
+            logging.error("Client {} refused by the server: {}".format(self.client_id, reply.reason))
+            return
+        request, _ = self.outstanding.pop(reply.id, (None, None))
+        if request is None:
+            logging.warning("Client {} got a reply to unknown request {}".format(self.client_id, reply.id))
+            return
+        if not isinstance(reply, Rejection):
+            reply.reply_receive_time = time.time()
+            self.generator.complete(reply)
+            return
+        self.generator.rejected_num += 1
+        request.retries += 1
+        if request.retries > self.max_retries:
+            logging.error("Client {} gave up request {} after {} rejections".format(
+                self.client_id, request.id, self.max_retries))
+            self.generator.failed_num += 1
+            return
+        if writer is self.writer:
+            self.writer = None
+        delay = self.retry_delay(request.retries, reply.retry_after)
+        self.generator.retry_num += 1
+        self.generator.spawn(self.retry(request, delay))
+
+    async def retry(self, request, delay):
+        await asyncio.sleep(delay * 1e-3)
+        self.generator.retry_num -= 1
+        await self.send(request)
+
+
+class LoadGenerator():
+    """
+    Open loop load of one process: arrivals follow the rps profile whatever
+    the servers do, each one is a request of a randomly picked virtual client.
+    """
+
+    def __init__(self, args, sub_name="", rate_scale=1.):
+        self.args = args
+        self.client_id = args.client_id + sub_name
+        self.clients = [VirtualClient(args, "{}-v{}".format(sub_name, index), self)
+                        for index in range(max(args.virtual_clients, 1))]
+        self.rate_profile = parse_rate_profile(args.rps, args.duration, rate_scale)
+        self.arrival = args.arrival
+        self.tasks = set()
+        self.monitor_writer = None
+        self.reports = []
+        self.report_num = 0  # reports sent to the monitor
+        self.acknowledged_num = 0
+        self.sent_num = 0
+        self.completed_num = 0
+        self.rejected_num = 0
+        self.failed_num = 0
+        self.retry_num = 0  # rejected requests waiting to be sent again
+        self.latencies = []
+
+    def spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        # the loop only keeps weak references to running tasks
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def rate_at(self, elapsed):
+        points = self.rate_profile
+        for (start_time, start_rate), (end_time, end_rate) in zip(points, points[1:]):
+            if elapsed < end_time:
+                return start_rate + (end_rate - start_rate) * (elapsed - start_time) / (end_time - start_time)
+        return points[-1][1]
+
+    def next_gap(self, rate):
+        if self.arrival == "constant":
+            return 1. / rate
+        if self.arrival == "pareto":
+            # scaled to a mean gap of 1 / rate
+            return random.paretovariate(PARETO_SHAPE) * (PARETO_SHAPE - 1) / PARETO_SHAPE / rate
+        return random.expovariate(rate)
+
+    def complete(self, request):
+        self.completed_num += 1
+        self.latencies.append(request.reply_receive_time - request.request_send_time)
+        if self.monitor_writer is not None:
+            self.reports.append(encode_message(request, self.args.wire_format))
+            if len(self.reports) >= REPORT_BATCH:
+                self.send_reports()
+
+    def send_reports(self):
+        try:
+            self.monitor_writer.write(encode_frames(self.reports))
+            self.report_num += len(self.reports)
+        except:
+            logging.error(traceback.format_exc())
+        self.reports = []
+
+    async def receive_acknowledgements(self, reader):
+        decoder = FrameDecoder()
+        while True:
+            data = await reader.read(RECEIVE_SIZE)
+            if not data:
+                break
+            for frame in decoder.feed(data):
+                reason = refusal_reason(frame)
+                if reason is not None:
+                    logging.error("{} refused by the monitor: {}".format(self.client_id, reason))
+                self.acknowledged_num += 1
+
+    async def run(self):
+        try:
+            reader, self.monitor_writer = await asyncio.open_connection(self.args.monitor_ip, self.args.monitor_port)
+            self.spawn(self.receive_acknowledgements(reader))
+        except OSError:
+            logging.error("{} failed to connect to the monitor: {}".format(self.client_id, traceback.format_exc()))
+        loop = asyncio.get_running_loop()
+        duration = self.rate_profile[-1][0]
+        start_time = loop.time()
+        next_time = start_time
+        while True:
+            elapsed = next_time - start_time
+            if elapsed >= duration:
+                break
+            rate = self.rate_at(elapsed)
+            if rate <= 0:
+                next_time += RAMP_STEP
+                continue
+            next_time += self.next_gap(rate)
+            # never waits when late, the arrivals behind schedule go out at once
+            await asyncio.sleep(max(next_time - loop.time(), 0))
+            client = random.choice(self.clients)
+            self.spawn(client.send(client.generate_request()))
+            self.sent_num += 1
+        send_time = loop.time() - start_time
+        deadline = loop.time() + DRAIN_TIMEOUT
+        while loop.time() < deadline and (self.retry_num or any(client.outstanding for client in self.clients)):
+            await asyncio.sleep(0.1)
+        if self.monitor_writer is not None:
+            if self.reports:
+                self.send_reports()
+            await self.monitor_writer.drain()
+            # closing with acknowledgements still coming would reset the connection under the monitor
+            while loop.time() < deadline and self.acknowledged_num < self.report_num:
+                await asyncio.sleep(0.01)
+            self.monitor_writer.close()
+        for client in self.clients:
+            if client.writer is not None:
+                client.writer.close()
+        self.print_summary(send_time)
+
+    def print_summary(self, send_time):
+        latencies = sorted(self.latencies)
+        p50 = latencies[len(latencies) // 2] * 1e3 if latencies else 0.
+        p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1e3 if latencies else 0.
+        print("{}: sent={} ({:.1f} rps offered), completed={}, rejected={}, failed={}, latency p50={:.1f}ms, p99={:.1f}ms"
+              .format(self.client_id, self.sent_num, self.sent_num / send_time if send_time else 0.,
+                      self.completed_num, self.rejected_num, self.failed_num, p50, p99))
+
+
+def parse_rate_profile(rps, duration, rate_scale=1.):
+    # "50" -> [(0, 50), (duration, 50)], "0:10,30:200" -> [(0, 10), (30, 200)]
+    if ":" not in str(rps):
+        return [(0., float(rps) * rate_scale), (float(duration), float(rps) * rate_scale)]
+    points = []
+    for item in str(rps).split(","):
+        point_time, rate = item.split(":")
+        points.append((float(point_time), float(rate) * rate_scale))
+    points.sort()
+    if points[0][0] > 0:
+        points.insert(0, (0., points[0][1]))
+    return points
+
+
 def run_a_client(args, name=""):
     client = Client(args, name)
     client.run()
 
 
+def run_a_load_generator(args, name="", rate_scale=1.):
+    # one descriptor per virtual client connection, allow as many as the hard limit
+    try:
+        _, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard_limit, hard_limit))
+    except (ValueError, OSError):
+        logging.warning("could not raise the open file limit: {}".format(traceback.format_exc()))
+    asyncio.run(LoadGenerator(args, name, rate_scale).run())
+
+
 if __name__ == '__main__':
     args = get_arguments()
-    clinet_num = 1
-    for i in range(clinet_num):
-        name = ""
-        if clinet_num > 1:
-            name = "-" + str(chr(65+i))
-        multiprocessing.Process(target=run_a_client,
-                                args=(args, name,)).start()
+    if args.mode == "open":
+        process_num = max(args.processes, 1)
+        args.virtual_clients = max(args.virtual_clients // process_num, 1)
+        for i in range(process_num):
+            name = "-p{}".format(i) if process_num > 1 else ""
+            multiprocessing.Process(target=run_a_load_generator,
+                                    args=(args, name, 1. / process_num)).start()
+    else:
+        clinet_num = 1
+        for i in range(clinet_num):
+            name = ""
+            if clinet_num > 1:
+                name = "-" + str(chr(65+i))
+            multiprocessing.Process(target=run_a_client,
+                                    args=(args, name,)).start()
@@ -1,12 +1,52 @@
 import argparse
 import logging
+import pickle
 import socket
+import struct
 import traceback
 
-from collections import OrderedDict
+from collections import OrderedDict, deque
+
+FRAME_HEADER = struct.Struct("!I")  # payload length in bytes
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+RECEIVE_SIZE = 65536  # bytes asked from the socket per recv
+WIRE_FORMAT = "struct"  # "struct" for the fixed layouts below, "pickle" for any python object
+# status sampling of the servers, the monitor weights the samples with the same values
+LOG_FREQUENCY = 20  # In ms, sampling period while the load changes
+LOG_MAX_PERIOD = 160  # In ms, sampling period once the load is steady
+HEARTBEAT = 200  # In ms, longest time between two reported samples
+
+# first byte of every encoded message
+PICKLE_TAG = 0
+REQUEST_TAG = 1
+STATUS_TAG = 2
+REPORT_TAG = 3
+REFUSAL_TAG = 4
+REJECTION_TAG = 5
+# tag, client id length, request id, cpu usage, time usage, send, receive, process,
+# reply send and reply receive time, retries, then the utf-8 client id
+REQUEST_LAYOUT = struct.Struct("<BHqdd5dH")
+# tag, client id length, request id, retry after, then the utf-8 client id
+REJECTION_LAYOUT = struct.Struct("<BHqf")
+# tag, reason length, then the utf-8 reason
+REFUSAL_HEADER = struct.Struct("<BH")
+PICKLE_REFUSED = "pickle message refused, start with --accept_pickle to allow it"
+# cpu usage, is idle, is unavailable, timestamp, queue length, in flight requests,
+# p50 and p99 queue wait, p50 and p99 service time, completions per second, rejected requests
+STATUS_LAYOUT = struct.Struct("<d??dIIfffffI")
+STATUS_HEADER = struct.Struct("<B")
+# tag, server id length, status number, scheduler name length (0 without scheduler stats),
+# then the utf-8 server id, the utf-8 scheduler name, the scheduler stats and the statuses
+REPORT_HEADER = struct.Struct("<BHIH")
+# dispatched, backfilled and aged requests, cpu time, period, total and longest wait
+SCHEDULER_LAYOUT = struct.Struct("<IIIdddd")
 
 
 class Request():
+    __slots__ = ("client_id", "request_id", "cpu_usage", "time_usage", "id",
+                 "request_send_time", "request_receive_time", "request_process_time",
+                 "reply_send_time", "reply_receive_time", "retries")
+
     def __init__(self, client_id, request_id, cpu_usage, time_usage):
         self.client_id = client_id
         self.request_id = request_id
@@ -19,6 +59,7 @@ class Request():
         self.request_process_time = 0.
         self.reply_send_time = 0.
         self.reply_receive_time = 0.
+        self.retries = 0  # times a server rejected it before one served it
 
     def info(self):
         return "Request(ID:{}, CPU Usage:{}, Time Usage:{})".format(self.id, self.cpu_usage, self.time_usage)
@@ -49,6 +90,26 @@ class Request():
         return output
 
 
+class Rejection():
+    # reply of an overloaded server, the request may be sent again after retry_after ms
+    __slots__ = ("client_id", "request_id", "retry_after", "id")
+
+    def __init__(self, client_id, request_id, retry_after):
+        self.client_id = client_id
+        self.request_id = request_id
+        self.retry_after = retry_after
+
+        self.id = "{}-{}".format(client_id, request_id)
+
+
+class Refusal():
+    # last message of a connection whose messages the receiver will not load, always in struct
+    __slots__ = ("reason",)
+
+    def __init__(self, reason):
+        self.reason = reason
+
+
 class ClientReport():
     def __init__(self, client_id, report_type, request_log):
         self.client_id = client_id
@@ -57,17 +118,219 @@ class ClientReport():
 
 
 class ServerStatus():
-    def __init__(self, cpu_usage, is_idle, is_unavailable, timestamp):
+    __slots__ = ("cpu_usage", "is_idle", "is_unavailable", "timestamp", "queue_length", "in_flight",
+                 "wait_p50", "wait_p99", "service_p50", "service_p99", "rate", "rejected")
+
+    def __init__(self, cpu_usage, is_idle, is_unavailable, timestamp, queue_length=0, in_flight=0,
+                 wait_p50=0., wait_p99=0., service_p50=0., service_p99=0., rate=0., rejected=0):
         self.cpu_usage = cpu_usage
         self.is_idle = is_idle
         self.is_unavailable = is_unavailable
         self.timestamp = timestamp
+        self.queue_length = queue_length  # requests received but not started
+        self.in_flight = in_flight  # requests being processed
+        # In ms, over the requests started (wait) and finished (service) in the last second
+        self.wait_p50 = wait_p50
+        self.wait_p99 = wait_p99
+        self.service_p50 = service_p50
+        self.service_p99 = service_p99
+        self.rate = rate  # requests finished per second
+        self.rejected = rejected  # requests turned away since the server started
+
+
+class SchedulerStats():
+    # what the request scheduler of a server did since its previous report
+    __slots__ = ("scheduler", "dispatched", "backfilled", "aged", "cpu_time", "period", "wait_total", "wait_max")
+
+    def __init__(self, scheduler, dispatched, backfilled, aged, cpu_time, period, wait_total, wait_max):
+        self.scheduler = scheduler
+        self.dispatched = dispatched  # requests started
+        self.backfilled = backfilled  # requests started ahead of an older one
+        self.aged = aged  # requests started because they waited max_wait
+        self.cpu_time = cpu_time  # In percentage * s, cpu usage integrated over the period
+        self.period = period  # In s
+        self.wait_total = wait_total  # In s, receive to start, summed over the dispatched requests
+        self.wait_max = wait_max  # In s
+
+    def get_utilization(self):
+        return self.cpu_time / self.period if self.period > 0 else 0.
+
+    def get_wait_mean(self):
+        return self.wait_total / self.dispatched if self.dispatched else 0.
 
 
 class ServerReport():
-    def __init__(self, server_id, status_log):
+    __slots__ = ("server_id", "status_log", "scheduler_stats")
+
+    def __init__(self, server_id, status_log, scheduler_stats=None):
         self.server_id = server_id
         self.status_log = status_log
+        self.scheduler_stats = scheduler_stats
+
+
+def encode_message(message, wire_format=WIRE_FORMAT):
+    """
+    Payload of a frame. The first byte tags the layout, so a receiver can tell
+    struct messages from pickle ones and answer in the format it was sent.
+    """
+    if wire_format == "pickle":
+        return bytes((PICKLE_TAG,)) + pickle.dumps(message)
+    if isinstance(message, Request):
+        client_id = str(message.client_id).encode()
+        return REQUEST_LAYOUT.pack(
+            REQUEST_TAG, len(client_id), message.request_id, message.cpu_usage, message.time_usage,
+            message.request_send_time, message.request_receive_time, message.request_process_time,
+            message.reply_send_time, message.reply_receive_time, message.retries) + client_id
+    if isinstance(message, Rejection):
+        client_id = str(message.client_id).encode()
+        return REJECTION_LAYOUT.pack(REJECTION_TAG, len(client_id), message.request_id,
+                                     message.retry_after) + client_id
+    if isinstance(message, Refusal):
+        reason = str(message.reason).encode()
+        return REFUSAL_HEADER.pack(REFUSAL_TAG, len(reason)) + reason
+    if isinstance(message, ServerStatus):
+        return STATUS_HEADER.pack(STATUS_TAG) + pack_status(message)
+    if isinstance(message, ServerReport):
+        server_id = str(message.server_id).encode()
+        stats = message.scheduler_stats
+        scheduler = b""
+        parts = []
+        if stats is not None:
+            scheduler = str(stats.scheduler).encode()
+            parts.append(SCHEDULER_LAYOUT.pack(stats.dispatched, stats.backfilled, stats.aged, stats.cpu_time,
+                                               stats.period, stats.wait_total, stats.wait_max))
+        header = REPORT_HEADER.pack(REPORT_TAG, len(server_id), len(message.status_log), len(scheduler))
+        return b"".join([header, server_id, scheduler] + parts
+                        + [pack_status(status) for status in message.status_log])
+    raise TypeError("no struct layout for {}".format(type(message).__name__))
+
+
+def pack_status(status):
+    return STATUS_LAYOUT.pack(status.cpu_usage, status.is_idle, status.is_unavailable, status.timestamp,
+                              status.queue_length, status.in_flight, status.wait_p50, status.wait_p99,
+                              status.service_p50, status.service_p99, status.rate, status.rejected)
+
+
+def message_format(payload):
+    return "pickle" if payload[0] == PICKLE_TAG else "struct"
+
+
+def decode_message(payload, accept_pickle=False):
+    """
+    Message of a frame payload. Pickle payloads can run arbitrary code while
+    loading, they are refused unless accept_pickle is set.
+    """
+    tag = payload[0]
+    if tag == REQUEST_TAG:
+        (_, client_id_length, request_id, cpu_usage, time_usage, request_send_time, request_receive_time,
+         request_process_time, reply_send_time, reply_receive_time, retries) = REQUEST_LAYOUT.unpack_from(payload)
+        client_id = bytes(payload[REQUEST_LAYOUT.size:REQUEST_LAYOUT.size + client_id_length]).decode()
+        request = Request(client_id, request_id, cpu_usage, time_usage)
+        request.request_send_time = request_send_time
+        request.request_receive_time = request_receive_time
+        request.request_process_time = request_process_time
+        request.reply_send_time = reply_send_time
+        request.reply_receive_time = reply_receive_time
+        request.retries = retries
+        return request
+    if tag == REJECTION_TAG:
+        _, client_id_length, request_id, retry_after = REJECTION_LAYOUT.unpack_from(payload)
+        client_id = bytes(payload[REJECTION_LAYOUT.size:REJECTION_LAYOUT.size + client_id_length]).decode()
+        return Rejection(client_id, request_id, retry_after)
+    if tag == REFUSAL_TAG:
+        _, reason_length = REFUSAL_HEADER.unpack_from(payload)
+        return Refusal(bytes(payload[REFUSAL_HEADER.size:REFUSAL_HEADER.size + reason_length]).decode())
+    if tag == STATUS_TAG:
+        return ServerStatus(*STATUS_LAYOUT.unpack_from(payload, STATUS_HEADER.size))
+    if tag == REPORT_TAG:
+        _, server_id_length, status_num, scheduler_length = REPORT_HEADER.unpack_from(payload)
+        offset = REPORT_HEADER.size + server_id_length
+        server_id = bytes(payload[REPORT_HEADER.size:offset]).decode()
+        scheduler_stats = None
+        if scheduler_length:
+            scheduler = bytes(payload[offset:offset + scheduler_length]).decode()
+            offset += scheduler_length
+            scheduler_stats = SchedulerStats(scheduler, *SCHEDULER_LAYOUT.unpack_from(payload, offset))
+            offset += SCHEDULER_LAYOUT.size
+        status_log = [ServerStatus(*fields) for fields in STATUS_LAYOUT.iter_unpack(
+            payload[offset:offset + status_num * STATUS_LAYOUT.size])]
+        return ServerReport(server_id, status_log, scheduler_stats)
+    if tag == PICKLE_TAG:
+        if not accept_pickle:
+            raise ValueError(PICKLE_REFUSED)
+        return pickle.loads(payload[1:])
+    raise ValueError("unknown message tag {}".format(tag))
+
+
+def refusal_frame(payload, accept_pickle=False):
+    """
+    None when the payload can be decoded, else the frame telling the sender
+    why its connection closes. It is struct, which every peer decodes.
+    """
+    if message_format(payload) == "pickle" and not accept_pickle:
+        return encode_frame(encode_message(Refusal(PICKLE_REFUSED), "struct"))
+    return None
+
+
+def refusal_reason(payload):
+    # reason of a refusal, None for any other payload such as an acknowledgement
+    if payload and payload[0] == REFUSAL_TAG:
+        return decode_message(payload).reason
+    return None
+
+
+def encode_frame(payload):
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ValueError("frame of {} bytes is larger than {}".format(len(payload), MAX_FRAME_SIZE))
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def encode_frames(payloads):
+    # one buffer for many frames, sent with a single sendall
+    return b"".join(encode_frame(payload) for payload in payloads)
+
+
+class FrameDecoder():
+    """
+    Incremental decoder of length prefixed frames.
+
+    Bytes are fed as they come off the socket, in whatever pieces TCP
+    delivers them, and every frame completed by the new bytes is returned.
+    A partial frame stays buffered until the rest of it arrives.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        frames = []
+        offset = 0
+        while len(self.buffer) - offset >= FRAME_HEADER.size:
+            (length,) = FRAME_HEADER.unpack_from(self.buffer, offset)
+            if length > MAX_FRAME_SIZE:
+                raise ValueError("frame of {} bytes is larger than {}".format(length, MAX_FRAME_SIZE))
+            end = offset + FRAME_HEADER.size + length
+            if len(self.buffer) < end:
+                break
+            frames.append(bytes(self.buffer[offset + FRAME_HEADER.size:end]))
+            offset = end
+        if offset:
+            del self.buffer[:offset]
+        return frames
+
+
+def receive_frames(sock, decoder):
+    """
+    Block until at least one frame arrives, None once the peer closed the connection.
+    """
+    while True:
+        data = sock.recv(RECEIVE_SIZE)
+        if not data:
+            return None
+        frames = decoder.feed(data)
+        if frames:
+            return frames
 
 
 class SenderSocket():
@@ -81,6 +344,9 @@ class SenderSocket():
             socket.AF_INET, socket.SOCK_STREAM)  # Use Internet, TCP
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.is_connected = False
+        self.decoder = FrameDecoder()
+        # frames received but not returned by receive() yet
+        self.frames = deque()
 
     def connect(self):
         if self.is_connected:
@@ -101,28 +367,53 @@ class SenderSocket():
             socket.AF_INET, socket.SOCK_STREAM)  # Use Internet, TCP
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.is_connected = False
+        self.decoder = FrameDecoder()
+        self.frames = deque()
 
     def send(self, message):
+        return self.send_batch([message])
+
+    def send_batch(self, messages):
         try:
-            self.socket.send(message)
-            logging.info("{} sent message to {}.".format(
-                self.name, self.dst))
+            self.socket.sendall(encode_frames(messages))
+            logging.info("{} sent {} messages to {}.".format(
+                self.name, len(messages), self.dst))
         except:
             logging.error(traceback.format_exc())
             return False
         return True
 
     def receive(self):
+        # payload of the next frame
         try:
-            reply = self.socket.recv(1024)
-            if not reply:
-                raise TypeError("{} receive no reply from {}".format(
-                    self.name, self.dst))
-            return reply
+            if not self.frames:
+                frames = receive_frames(self.socket, self.decoder)
+                if frames is None:
+                    raise TypeError("{} receive no reply from {}".format(
+                        self.name, self.dst))
+                self.frames.extend(frames)
+            return self.frames.popleft()
         except:
             logging.error(traceback.format_exc())
             return
 
+    def drain(self):
+        # drop replies nobody waits for without blocking, False once the connection is gone
+        try:
+            while True:
+                data = self.socket.recv(RECEIVE_SIZE, socket.MSG_DONTWAIT)
+                if not data:
+                    return False
+                for frame in self.decoder.feed(data):
+                    reason = refusal_reason(frame)
+                    if reason is not None:
+                        logging.error("{} refused by {}: {}".format(self.name, self.dst, reason))
+        except BlockingIOError:
+            return True
+        except OSError:
+            logging.error(traceback.format_exc())
+            return False
+
     def send_and_receive(self, message):
         self.send(message)
         reply = self.receive()
@@ -136,6 +427,13 @@ class SenderSocket():
         return reply
 
 
+def add_wire_arguments(parser):
+    parser.add_argument('--wire_format', default=WIRE_FORMAT, choices=["struct", "pickle"],
+                        help='Format of the messages this process sends, default={}'.format(WIRE_FORMAT))
+    parser.add_argument('--accept_pickle', action='store_true',
+                        help='Accept pickle messages from the network, unsafe with untrusted peers')
+
+
 def set_up_log():
     parser = argparse.ArgumentParser()
     parser.add_argument('-log',
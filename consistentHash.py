@@ -0,0 +1,84 @@
+import hashlib
+
+MAGLEV_TABLE_SIZE = 65537  # prime, should be well above 100 * number of servers
+
+
+def hash_key(key, salt=b""):
+    digest = hashlib.blake2b(str(key).encode(), digest_size=8, key=salt).digest()
+    return int.from_bytes(digest, "little")
+
+
+class MaglevTable():
+    """
+    Maglev lookup table mapping a client key to a server in O(1).
+
+    Every server owns a permutation of the table slots, described by an
+    (offset, skip) pair, and servers take turns claiming their next preferred
+    free slot. The pairs are cached per server, so a membership change only
+    hashes the servers that joined, but the whole table is still refilled,
+    about 0.1 s with 100 servers. populate() only reads the object, so the
+    refill can run on another thread and be installed with set_backends().
+    Adding or removing one of n servers moves roughly 1/n of the slots.
+    """
+
+    def __init__(self, backends=(), table_size=MAGLEV_TABLE_SIZE):
+        self.table_size = table_size
+        self.permutations = {}  # backend -> (offset, skip)
+        self.backends = []
+        self.table = []
+        self.set_backends(backends)
+
+    def permutation(self, backend):
+        # a single get, set_backends may drop the entry from another thread
+        pair = self.permutations.get(backend)
+        if pair is None:
+            offset = hash_key(backend, b"offset") % self.table_size
+            skip = hash_key(backend, b"skip") % (self.table_size - 1) + 1
+            pair = self.permutations[backend] = (offset, skip)
+        return pair
+
+    def populate(self, backends=None):
+        backends = self.backends if backends is None else list(backends)
+        if not backends:
+            return []
+        table = [None] * self.table_size
+        permutations = [self.permutation(backend) for backend in backends]
+        next_index = [0] * len(backends)
+        filled = 0
+        while True:
+            for i, backend in enumerate(backends):
+                offset, skip = permutations[i]
+                slot = (offset + next_index[i] * skip) % self.table_size
+                while table[slot] is not None:
+                    next_index[i] += 1
+                    slot = (offset + next_index[i] * skip) % self.table_size
+                table[slot] = backend
+                next_index[i] += 1
+                filled += 1
+                if filled == self.table_size:
+                    return table
+
+    def set_backends(self, backends, table=None):
+        """
+        Rebuild the table for a new server list, or install the one populate()
+        built for it, and return the fraction of slots that now point to a
+        different server.
+        """
+        backends = list(backends)
+        if backends == self.backends and self.table:
+            return 0.
+        for backend in list(self.permutations):
+            if backend not in backends:
+                del self.permutations[backend]
+        old_table = self.table
+        self.backends = backends
+        self.table = self.populate() if table is None else table
+        if not old_table or not self.table:
+            return 1.
+        moved = sum(1 for old, new in zip(old_table, self.table) if old != new)
+        return moved / self.table_size
+
+    def lookup(self, key):
+        if not self.table:
+            return None
+        return self.table[hash_key(key) % self.table_size]
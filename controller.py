@@ -7,8 +7,8 @@ from pox.lib.packet.ipv4 import ipv4
 from pox.lib.addresses import EthAddr, IPAddr
 from pox.lib.packet.ethernet import ethernet, ETHER_BROADCAST
 from pox.lib.recoco import Timer
-import random
 import pickle
+import signal
 import threading
 import time
 import traceback
@@ -18,191 +18,606 @@ import os
  
 sys.path.insert(1, os.getcwd())
 
+from consistentHash import MaglevTable
+from flowTable import FlowTable
+from healthCheck import FAILURE_THRESHOLD, HEALTH_GRACE, HEALTH_INTERVAL, PROBE_PORT, PROBE_TIMEOUT, HealthChecker
+from hostRegistry import CLIENT, MONITOR, SERVER, VIP, HostRegistry, pool_hosts
+from instrumentation import TRACE_SAMPLE, Instrumentation
+from loadEstimator import EWMA_ALPHA, STALE_DEADLINE, LoadEstimator
+from loadIndex import IndexedHeap
+from netTopology import MAX_ECMP_PATHS, NetworkTopology
+from policies import SCORE_WEIGHTS, load_policy_modules, policy_class
+from prefixSplit import assign_prefixes, covering_network
+from statusBoard import StatusBoard
+
 CHECK_SERVER_PERIOD = 10  # in ms
 LOG_FOLDER_PATH = "/tmp/server_status/"
+STATUS_MODE = "board"  # "board" for the shared memory status board, "file" for pickle files
+CHOICES = 2  # number of servers sampled by the power of d choices policy
+IDLE_TIMEOUT = 10  # in s, 0 keeps idle flows forever
+HARD_TIMEOUT = 0  # in s, 0 never expires a flow regardless of traffic
+PROACTIVE_PRIORITY = of.OFP_DEFAULT_PRIORITY - 1  # exact reactive rules still win
+PROACTIVE_DELAY = 0.5  # in s, batches server arrivals before re-splitting the prefixes
+PATH_WEIGHT = 5  # cpu usage (in percentage) one flow on the busiest path link is worth
+SERVICE_TIME = 750  # in ms, mean time a request runs on a server
+REQUEST_CPU = 20  # In percentage, mean cpu usage of a request
+MAX_QUEUE = 8  # queued requests from which a server is saturated
+OVERLOAD_HOLD = 1000  # in ms, a server that rejected requests gets no new client for this long
+VERBOSE = 0  # 1 logs every policy decision, 2 also logs every flow removal
+STATS_FILE_PATH = "/tmp/server_status/controller_stats.json"
+CLIENT_NETWORK = "10.0.1.0/24"
+SERVER_NETWORK = "10.0.0.0/24"
 log = core.getLogger()
 
 
 class readFile(threading.Thread):
-    def __init__(self, server_ips, server_status):
-        threading.Thread.__init__(self)
+    def __init__(self, server_ips, update_load, refresh_loads, status_mode=STATUS_MODE):
+        # never keeps pox from exiting
+        threading.Thread.__init__(self, daemon=True)
         self.server_ips = server_ips
-        self.server_status = server_status
+        # callback(ip, ServerStatus) feeding the controller's load estimator
+        self.update_load = update_load
+        # callback() run after every sweep over the servers
+        self.refresh_loads = refresh_loads
+        self.status_mode = status_mode
+        # ip -> slot index in the status board, filled as servers show up
+        self.board_slots = {}
+        self.status_board = None
+        if self.status_mode == "board":
+            self.status_board = StatusBoard()
 
     def updateStatus(self, ip):
+        if self.status_board is not None:
+            self.updateStatusFromBoard(ip)
+        else:
+            self.updateStatusFromFile(ip)
+
+    def updateStatusFromBoard(self, ip):
+        slot = self.board_slots.get(ip)
+        if slot is None:
+            slot = self.status_board.find_slot(ip)
+            if slot is None:
+                # server has not started reporting yet
+                return
+            self.board_slots[ip] = slot
+        status = self.status_board.read(slot)
+        if status is not None:
+            self.update_load(IPAddr(ip), status)
+
+    def updateStatusFromFile(self, ip):
         #print("try open:", LOG_FOLDER_PATH+ip)
         file_address = LOG_FOLDER_PATH+ip
         try:
             if os.path.isfile(file_address) and os.path.getsize(file_address) > -1:
                 f = open(file_address, "rb")
                 data = pickle.load(f)
-                cpu_usage = data.status_log[-1].cpu_usage
-                timestamp = data.status_log[-1].timestamp
-                self.server_status[IPAddr(ip)] = cpu_usage
+                self.update_load(IPAddr(ip), data.status_log[-1])
                 #print("server {}, usage: {}".format(ip, cpu_usage))
                 f.close()
         except:
-            print(traceback.format_exc())
-            #print("status file not exist")
-            self.server_status[IPAddr(ip)] = 0
-    
+            # no new sample, the estimator marks the server stale once it is too old
+            log.debug("failed to read status of {}: {}".format(ip, traceback.format_exc()))
 
     def run(self):
         while True:
             for ip in self.server_ips:
                 self.updateStatus(ip.toStr())
+            self.refresh_loads()
             time.sleep(CHECK_SERVER_PERIOD/1000)
 
 
 class Controller(EventMixin):
-    def __init__(self, switch_ip, server_ips_lst, client_ips_lst, monitor_ip, switch_mac, policy):
+    def __init__(self, switch_ip, server_ips_lst, client_ips_lst, monitor_ip, switch_mac, policy, status_mode=STATUS_MODE, choices=CHOICES,
+                 idle_timeout=IDLE_TIMEOUT, hard_timeout=HARD_TIMEOUT,
+                 proactive=False, client_network=None, server_network=None,
+                 verbose=VERBOSE, trace_sample=TRACE_SAMPLE, stats_file=STATS_FILE_PATH,
+                 ewma_alpha=EWMA_ALPHA, stale_deadline=STALE_DEADLINE,
+                 health=True, health_interval=HEALTH_INTERVAL, failure_threshold=FAILURE_THRESHOLD, health_grace=HEALTH_GRACE,
+                 probe=False, probe_port=PROBE_PORT, probe_timeout=PROBE_TIMEOUT,
+                 path_weight=PATH_WEIGHT, max_paths=MAX_ECMP_PATHS,
+                 service_time=SERVICE_TIME, request_cpu=REQUEST_CPU, max_queue=MAX_QUEUE,
+                 score_weights=SCORE_WEIGHTS, overload_hold=OVERLOAD_HOLD):
         self.listenTo(core.openflow)
         core.openflow_discovery.addListeners(self)
-        # loadbalancing policy
-        self.policy = policy
+        # loadbalancing policy, by number or by registered name, created once the tables exist
+        policy_cls = policy_class(policy)
+        self.policy_name = policy_cls.name
+        # handler latency, decision counters and sampled decisions, see export_stats
+        self.verbose = int(verbose)
+        self.stats = Instrumentation(trace_sample)
+        self.stats_file = stats_file
+        core.addListenerByName("GoingDownEvent", lambda event: self.export_stats())
+        self.status_mode = status_mode
+        self.choices = int(choices)
+        # request model of the expected wait policy
+        self.service_time = float(service_time) * 1e-3
+        self.request_cpu = float(request_cpu)
+        self.max_queue = int(max_queue)
+        # metric:weight pairs of the weighted policy
+        self.score_weights = score_weights
+        # server ip -> rejected requests in its last status, and end of its overload
+        self.overload_hold = float(overload_hold) * 1e-3
+        self.rejected = {}
+        self.overloaded_until = {}
+        # client ip -> overloaded server its rule to was removed, kept until its next packet
+        self.released_clients = {}
+        # flow rule timeouts, expired rules send the next packet back to the policy
+        self.idle_timeout = int(idle_timeout)
+        self.hard_timeout = int(hard_timeout)
         # list of client and server ip
         self.monitor_ip = monitor_ip
+        # server ip -> estimated cpu usage, stale servers are left out
         self.server_status = {}
-        self.server_ips = server_ips_lst
-        self.client_ips = client_ips_lst
-        # index for round robin decision making
-        self.index = 0
-        self.all_ip = []
-        for ip in self.client_ips:
-            self.all_ip.append(ip)
-        for ip in self.server_ips:
-            self.server_status[ip] = 0
-            self.all_ip.append(ip)
-        self.all_ip.append(self.monitor_ip)
+        self.load_estimator = LoadEstimator(ewma_alpha, stale_deadline)
+        self.stale_servers = set()
+        # server ip -> cpu usage, ordered for the resource based policy
+        self.load_index = IndexedHeap()
+        # server ip -> number of active client to server flows
+        self.connection_index = IndexedHeap()
+        # installed rules, kept up to date by FlowRemoved events
+        self.flow_table = FlowTable()
+        self.status_lock = threading.Lock()
         # every packet is sent to this ip address and be modified and forwarded
         self.switch_ip = switch_ip
         self.switch_mac = switch_mac
+        # role of every host, clients and servers can join and leave at runtime
+        self.hosts = HostRegistry()
+        self.hosts.add(self.switch_ip, VIP)
+        self.hosts.add(self.monitor_ip, MONITOR)
+        self.client_network = client_network or covering_network(client_ips_lst)
+        self.server_network = server_network or covering_network(server_ips_lst)
+        self.hosts.add_pool(self.client_network, CLIENT)
+        self.hosts.add_pool(self.server_network, SERVER)
+        for ip in client_ips_lst:
+            self.hosts.add(ip, CLIENT)
+        for ip in server_ips_lst:
+            self.hosts.add(ip, SERVER)
+            self.server_status[ip] = 0
+            self.load_index.update(ip, 0)
+            self.connection_index.update(ip, 0)
+        # ordered member lists owned by the registry, shared with the status thread
+        self.server_ips = self.hosts.members[SERVER]
+        self.client_ips = self.hosts.members[CLIENT]
+        # servers the health checker declared down, and the ones policies may choose from
+        self.down_servers = set()
+        self.active_servers = list(self.server_ips)
         # ip -> mac and port table
         self.server_iptomac = {}
         self.client_iptomac = {}
         self.monitor_macport = ()
-        if int(self.policy) == 3:
-            self.run_read_usage_thread(self.server_ips, self.server_status)
+        # (requested ip, requester mac, out port) -> packed arp reply frame,
+        # cleared whenever one of the tables above changes
+        self.arp_reply_cache = {}
+        # consistent hashing lookup table keyed on client ip
+        self.maglev = None
+        # fraction of table slots and of known clients moved by the last rebuild
+        self.last_remap = (0., 0.)
+        # bumped by every rebuild, a table built for an older server list is dropped
+        self.maglev_generation = 0
+        if policy_cls.uses_maglev:
+            self.maglev = MaglevTable(self.active_servers)
+        # proactive mode splits the client network into nw_src prefixes, one rule each
+        self.proactive = str(proactive).lower() in ("true", "1", "yes")
+        if self.proactive and policy_cls.prefix_mode is None:
+            log.warning("policy {} is not stateless, proactive rules disabled".format(self.policy_name))
+            self.proactive = False
+        # server ip -> share of the client prefixes, 1 by default
+        self.server_weights = {}
+        # prefix -> server ip of the prefix rules currently on the switches
+        self.proactive_rules = {}
+        self.proactive_pending = False
+        self.connections = {}
+        # switch fabric learnt from discovery, host locations and per client paths
+        self.topology = NetworkTopology(int(max_paths))
+        self.path_weight = float(path_weight)
+        # client ip -> (server ip, client to server path, server to client path)
+        self.client_paths = {}
+        self.health = str(health).lower() in ("true", "1", "yes")
+        self.policy = policy_cls(self)
+        if self.policy.uses_status or self.health:
+            self.run_read_usage_thread(self.server_ips)
+        if self.health:
+            HealthChecker(self.server_ips, self.is_server_stale,
+                          lambda ip: core.callLater(self.mark_server_down, ip),
+                          lambda ip: core.callLater(self.mark_server_up, ip),
+                          health_interval, failure_threshold,
+                          str(probe).lower() in ("true", "1", "yes"), probe_port, probe_timeout, health_grace).start()
 
-    def run_read_usage_thread(self, server_ips, server_status):
-        thread = readFile(server_ips, server_status)
+    def run_read_usage_thread(self, server_ips):
+        thread = readFile(server_ips, self.update_server_load,
+                          self.refresh_server_loads, self.status_mode)
         thread.start()
 
-    def target_server(self):
-        # random policy
-        if int(self.policy) == 1:
-            ip = random.choice(self.server_ips)
-            print("************randomIP: " + str(ip) + "************")
-            return ip
-        # round robin policy
-        elif int(self.policy) == 2:
-            ip = self.server_ips[self.index]
-            self.index = self.index + 1
-            if self.index > len(self.server_ips) - 1:
-                self.index = 0
-            print("************roundrobinIP: " + str(ip) + "************")
-            return ip
-        # resource based policy
-        elif int(self.policy) == 3:
-            print("server status: " + str(self.server_status))
-            ip = min(self.server_status, key=self.server_status.get)
-            print("************resourceIP: " + str(ip) + "************")
-            return ip
+    def update_server_load(self, ip, status):
+        with self.status_lock:
+            if not self.load_estimator.update(ip, status.cpu_usage, status.timestamp):
+                # the same sample read again, keep what policies counted since it was taken
+                return
+            self.policy.on_status(ip, status)
+            rejected = self.rejected.get(ip, status.rejected)
+            self.rejected[ip] = status.rejected
+        if status.rejected > rejected:
+            core.callLater(self.shed_server, ip)
+
+    def refresh_server_loads(self):
+        # move the load index to the current estimates and drop servers that went quiet, down or are held
+        now = time.time()
+        with self.status_lock:
+            for ip in self.server_ips:
+                load = self.load_estimator.estimate(ip, now)
+                if load is None and ip not in self.stale_servers:
+                    self.stale_servers.add(ip)
+                    log.warning("server {} is stale, no status for {:.0f}ms".format(
+                        ip, self.load_estimator.age(ip, now) * 1e3))
+                elif load is not None and ip in self.stale_servers:
+                    self.stale_servers.discard(ip)
+                    log.info("server {} reports again".format(ip))
+                if load is None or ip not in self.active_servers:
+                    if ip in self.load_index:
+                        self.server_status.pop(ip, None)
+                        self.load_index.remove(ip)
+                        self.policy.on_load(ip, None)
+                elif self.server_status.get(ip) != load or ip not in self.load_index:
+                    self.server_status[ip] = load
+                    self.load_index.update(ip, load)
+                    self.policy.on_load(ip, load)
+
+    def is_server_stale(self, ip):
+        with self.status_lock:
+            return self.load_estimator.is_stale(ip)
+
+    def mark_server_down(self, ip):
+        # evict a failed server from every policy and move its clients to healthy servers
+        if ip in self.down_servers or self.hosts.role(ip) != SERVER:
+            return
+        with self.status_lock:
+            self.down_servers.add(ip)
+            self.server_status.pop(ip, None)
+            self.load_index.remove(ip)
+            self.connection_index.remove(ip)
+            self.policy.on_load(ip, None)
+            entries = self.flow_table.flows_of_server(ip)
+            for entry in entries:
+                self.flow_table.remove(entry.cookie)
+                self.policy.on_flow_removed(entry)
+        log.warning("server {} is down, migrating {} flows".format(ip, len(entries)))
+        self.refresh_active_servers()
+        for entry in entries:
+            connection = self.connections.get(entry.dpid)
+            if connection is not None:
+                self.delete_rule(connection, entry.nw_src, entry.nw_dst)
+        for entry in entries:
+            connection = self.connections.get(entry.dpid)
+            if entry.is_server_to_client or entry.is_transit:
+                continue
+            self.release_path(entry.client_ip)
+            if connection is None:
+                continue
+            server_ip = self.target_server(entry.client_ip)
+            if server_ip is None or server_ip not in self.server_iptomac or entry.client_ip not in self.client_iptomac:
+                continue
+            self.stats.record_decision("failover", entry.client_ip, server_ip)
+            self.pin_client(connection, entry.client_ip, server_ip)
+
+    def shed_server(self, ip):
+        """
+        A server rejecting requests gets no new client for overload_hold, and
+        the rules sending clients to it are removed. A rejected client backs
+        off and connects again, its SYN then comes back to the policy, while
+        the next packet of a connection still running goes to the same server.
+        """
+        if ip in self.down_servers or self.hosts.role(ip) != SERVER:
+            return
+        is_overloaded = ip in self.overloaded_until
+        self.overloaded_until[ip] = time.time() + self.overload_hold
+        with self.status_lock:
+            entries = [entry for entry in self.flow_table.flows_of_server(ip) if not entry.is_server_to_client]
+            for entry in entries:
+                self.flow_table.remove(entry.cookie)
+                self.policy.on_flow_removed(entry)
+            self.refresh_connection_count(ip)
+        if not is_overloaded:
+            log.warning("server {} is overloaded, no new clients for {:.0f}ms".format(ip, self.overload_hold * 1e3))
+            self.refresh_active_servers()
+            core.callDelayed(self.overload_hold, self.check_overload, ip)
+        for entry in entries:
+            connection = self.connections.get(entry.dpid)
+            if connection is not None:
+                self.delete_rule(connection, entry.nw_src, entry.nw_dst)
+            if not entry.is_transit:
+                self.release_path(entry.client_ip)
+                self.released_clients[entry.client_ip] = ip
+
+    def check_overload(self, ip):
+        remaining = self.overloaded_until.get(ip, 0.) - time.time()
+        if remaining > 0:
+            # rejected again since, hold it longer
+            core.callDelayed(remaining, self.check_overload, ip)
+            return
+        self.overloaded_until.pop(ip, None)
+        log.info("server {} takes new clients again".format(ip))
+        self.refresh_active_servers()
+
+    def mark_server_up(self, ip):
+        if ip not in self.down_servers:
+            return
+        with self.status_lock:
+            self.down_servers.discard(ip)
+        log.info("server {} is back up".format(ip))
+        self.refresh_active_servers()
+
+    def refresh_active_servers(self):
+        with self.status_lock:
+            active_servers = [ip for ip in self.server_ips if ip not in self.down_servers]
+            # overloaded servers are only left out while another one can take the clients
+            self.active_servers = [ip for ip in active_servers if ip not in self.overloaded_until] or active_servers
+            # the indexes only hold servers that may be chosen, least loaded and least connections
+            # would otherwise pick a held server, its connection count is the lowest once shed
+            for ip in self.server_ips:
+                if ip not in self.active_servers:
+                    self.connection_index.remove(ip)
+                elif ip not in self.connection_index:
+                    self.connection_index.update(ip, self.flow_table.active_flows(ip))
+        self.refresh_server_loads()
+        self.policy.on_servers_changed(self.active_servers)
+        if self.maglev is not None:
+            self.rebuild_maglev()
+        self.schedule_proactive_update()
+
+    def track_flow(self, dpid, nw_src, nw_dst, client_ip, server_ip, is_server_to_client, is_transit=False):
+        # record a rule in the flow table and keep the per server flow count in line with it
+        with self.status_lock:
+            cookie, replaced = self.flow_table.add(
+                dpid, nw_src, nw_dst, client_ip, server_ip, is_server_to_client, is_transit)
+            self.refresh_connection_count(server_ip)
+            if replaced is not None:
+                self.refresh_connection_count(replaced.server_ip)
+                self.policy.on_flow_removed(replaced)
+            self.policy.on_flow_added(self.flow_table.entries[cookie])
+        return cookie
+
+    def refresh_connection_count(self, server_ip):
+        if server_ip in self.connection_index:
+            self.connection_index.update(server_ip, self.flow_table.active_flows(server_ip))
+
+    def set_server_ips(self, server_ips):
+        # change the server pool at runtime
+        with self.status_lock:
+            removed_ips = [ip for ip in self.server_ips if ip not in server_ips]
+            added_ips = [ip for ip in server_ips if ip not in self.server_ips]
+            for ip in removed_ips:
+                self.hosts.remove(ip)
+                self.server_status.pop(ip, None)
+                self.load_index.remove(ip)
+                self.connection_index.remove(ip)
+                self.policy.on_load(ip, None)
+                self.server_iptomac.pop(ip, None)
+                self.load_estimator.remove(ip)
+                self.stale_servers.discard(ip)
+                self.down_servers.discard(ip)
+            for ip in added_ips:
+                self.hosts.add(ip, SERVER)
+                self.server_status[ip] = 0
+                self.load_index.update(ip, 0)
+                self.connection_index.update(ip, 0)
+                self.policy.on_load(ip, 0)
+        if removed_ips:
+            self.arp_reply_cache.clear()
+        self.refresh_active_servers()
+        for ip in added_ips:
+            for connection in self.connections.values():
+                self.send_arp_request(connection, ip)
+        log.info("server pool changed, joined: {}, left: {}".format(added_ips, removed_ips))
+
+    def add_server(self, ip):
+        if self.hosts.role(ip) != SERVER:
+            self.set_server_ips(self.server_ips + [ip])
+
+    def remove_server(self, ip):
+        if self.hosts.role(ip) == SERVER:
+            self.set_server_ips([server_ip for server_ip in self.server_ips if server_ip != ip])
+
+    def add_client(self, ip):
+        if self.hosts.add(ip, CLIENT):
+            for connection in self.connections.values():
+                self.send_arp_request(connection, ip)
+            log.info("client {} joined".format(ip))
+
+    def remove_client(self, ip):
+        if self.hosts.role(ip) == CLIENT:
+            self.hosts.remove(ip)
+            self.client_iptomac.pop(ip, None)
+            self.arp_reply_cache.clear()
+            log.info("client {} left".format(ip))
+
+    def classify(self, ip):
+        # role of a host, hosts showing up from a pool join it on the fly
+        role = self.hosts.role(ip)
+        if role is None:
+            role = self.hosts.pool_role(ip)
+            if role == CLIENT:
+                self.add_client(ip)
+            elif role == SERVER:
+                self.add_server(ip)
+        return role
+
+    def set_server_weight(self, ip, weight):
+        self.server_weights[ip] = weight
+        self.schedule_proactive_update()
+
+    def rebuild_maglev(self):
+        # refilling the table takes about 0.1 s with 100 servers, build it off the POX thread,
+        # the hash policy skips the servers that left meanwhile
+        self.maglev_generation += 1
+        generation, backends = self.maglev_generation, list(self.active_servers)
+
+        def build():
+            table = self.maglev.populate(backends)
+            core.callLater(self.install_maglev, generation, backends, table)
+        threading.Thread(target=build, daemon=True).start()
+
+    def install_maglev(self, generation, backends, table):
+        if generation != self.maglev_generation:
+            return None
+        moved_slots = self.maglev.set_backends(backends, table)
+        with self.status_lock:
+            assignment = list(self.flow_table.client_server().items())
+        moved_clients = sum(1 for client_ip, server_ip in assignment
+                            if self.maglev.lookup(client_ip) != server_ip)
+        self.last_remap = (moved_slots, moved_clients / max(len(assignment), 1))
+        log.info("consistent hash table rebuilt for {} servers: {:.2%} of slots and {:.2%} of {} clients remapped".format(
+            len(backends), self.last_remap[0], self.last_remap[1], len(assignment)))
+        # prefix rules computed meanwhile used the old table
+        self.schedule_proactive_update()
+        return self.last_remap
+
+    def schedule_proactive_update(self):
+        if not self.proactive or self.proactive_pending:
+            return
+        self.proactive_pending = True
+        core.callDelayed(PROACTIVE_DELAY, self.update_proactive_rules)
+
+    def update_proactive_rules(self):
+        # re-split the client prefixes over the servers we can reach and only touch changed rules
+        self.proactive_pending = False
+        servers = [ip for ip in self.active_servers if ip in self.server_iptomac]
+        lookup = self.maglev.lookup if self.maglev is not None else None
+        assignment = assign_prefixes(self.client_network, servers, self.server_weights,
+                                     self.policy.prefix_mode, lookup)
+        assignment = {prefix: server_ip for prefix, server_ip in assignment.items()
+                      if server_ip in self.server_iptomac}
+        for prefix in list(self.proactive_rules):
+            if prefix not in assignment:
+                self.send_prefix_rule(prefix, None)
+                del self.proactive_rules[prefix]
+        changed = 0
+        for prefix, server_ip in assignment.items():
+            if self.proactive_rules.get(prefix) != server_ip:
+                self.send_prefix_rule(prefix, server_ip)
+                self.proactive_rules[prefix] = server_ip
+                changed += 1
+        log.info("proactive rules: {} prefixes over {} servers, {} changed".format(
+            len(self.proactive_rules), len(servers), changed))
+
+    def send_prefix_rule(self, prefix, server_ip):
+        # install the client prefix -> server rule, or delete it when server_ip is None
+        fm = of.ofp_flow_mod()
+        fm.priority = PROACTIVE_PRIORITY
+        fm.match.dl_type = 0x800
+        fm.match.nw_src = prefix
+        fm.match.nw_dst = self.switch_ip
+        if server_ip is None:
+            fm.command = of.OFPFC_DELETE_STRICT
+        else:
+            (server_mac, server_port) = self.server_iptomac[server_ip]
+            fm.actions.append(of.ofp_action_nw_addr.set_dst(server_ip))
+            fm.actions.append(of.ofp_action_dl_addr.set_dst(server_mac))
+            fm.actions.append(of.ofp_action_dl_addr.set_src(self.switch_mac))
+            fm.actions.append(of.ofp_action_output(port=server_port))
+        for connection in self.connections.values():
+            connection.send(fm)
+
+    def install_return_rule(self, connection, client_ip):
+        # any server to this client looks like the switch, so replies need no PacketIn either
+        (client_mac, client_port) = self.client_iptomac[client_ip]
+        fm = of.ofp_flow_mod()
+        fm.priority = PROACTIVE_PRIORITY
+        fm.match.dl_type = 0x800
+        fm.match.nw_src = str(self.server_network)
+        fm.match.nw_dst = client_ip
+        fm.actions.append(of.ofp_action_nw_addr.set_src(self.switch_ip))
+        fm.actions.append(of.ofp_action_dl_addr.set_src(self.switch_mac))
+        fm.actions.append(of.ofp_action_dl_addr.set_dst(client_mac))
+        fm.actions.append(of.ofp_action_output(port=client_port))
+        connection.send(fm)
+
+    def target_server(self, client_ip=None):
+        if not self.active_servers:
+            return None
+        return self.policy.select(client_ip)
 
     def handle_arp_packet(self, packet, connection, inport):
         srcip = packet.payload.protosrc
         dstip = packet.payload.protodst
+        src_role = self.classify(srcip)
+        if src_role in (CLIENT, SERVER, MONITOR):
+            self.topology.learn_host(srcip, connection.dpid, inport)
+        if src_role == CLIENT:
+            self.learn_client(connection, srcip, packet.src, inport)
+        elif src_role == SERVER:
+            self.learn_server(srcip, packet.src, inport)
+        elif src_role == MONITOR:
+            self.learn_monitor(packet.src, inport)
         if packet.payload.opcode == arp.REQUEST:
-            # packet is from client
-            if srcip == self.monitor_ip:
-                arp_packet = arp()
-                if dstip in self.client_iptomac:
-                    dstmac = self.client_iptomac[dstip][0]
-                elif dstip in self.server_iptomac:
-                    dstmac = self.server_iptomac[dstip][0]
-                arp_packet.hwsrc = dstmac
-                arp_packet.hwdst = self.monitor_macport[0]
-                arp_packet.opcode = arp_packet.REPLY
-                arp_packet.prototype = arp_packet.PROTO_TYPE_IP
-                arp_packet.protosrc = packet.payload.protodst
-                arp_packet.protodst = packet.payload.protosrc
-                ether_packet = ethernet()
-                ether_packet.type = ethernet.ARP_TYPE
-                ether_packet.src = dstmac
-                ether_packet.dst = self.monitor_macport[0]
-                ether_packet.set_payload(arp_packet)
-                msg = of.ofp_packet_out()
-                msg.data = ether_packet.pack()
-                msg.actions.append(of.ofp_action_output(port=inport))
-                connection.send(msg)
-            elif dstip == self.monitor_ip:
-                arp_packet = arp()
-                if srcip in self.client_iptomac:
-                    srcmac = self.client_iptomac[srcip][0]
-                elif srcip in self.server_iptomac:
-                    srcmac = self.server_iptomac[srcip][0]
-                arp_packet.hwsrc = self.monitor_macport[0]
-                arp_packet.hwdst = srcmac
-                arp_packet.opcode = arp_packet.REPLY
-                arp_packet.prototype = arp_packet.PROTO_TYPE_IP
-                arp_packet.protosrc = packet.payload.protodst
-                arp_packet.protodst = packet.payload.protosrc
-                ether_packet = ethernet()
-                ether_packet.type = ethernet.ARP_TYPE
-                ether_packet.src = self.monitor_macport[0]
-                ether_packet.dst = srcmac
-                ether_packet.set_payload(arp_packet)
-                msg = of.ofp_packet_out()
-                msg.data = ether_packet.pack()
-                msg.actions.append(of.ofp_action_output(port=inport))
-                connection.send(msg)
-            else:
-                if srcip in self.client_ips:
-                    self.client_iptomac[srcip] = (packet.src, inport)
-                    if dstip == self.switch_ip:
-                        # send the arp reply packet
-                        arp_packet = arp()
-                        arp_packet.hwsrc = self.switch_mac
-                        arp_packet.hwdst = packet.src
-                        arp_packet.opcode = arp_packet.REPLY
-                        arp_packet.prototype = arp_packet.PROTO_TYPE_IP
-                        arp_packet.protosrc = packet.payload.protodst
-                        arp_packet.protodst = packet.payload.protosrc
-                        ether_packet = ethernet()
-                        ether_packet.type = ethernet.ARP_TYPE
-                        ether_packet.src = self.switch_mac
-                        ether_packet.dst = packet.src
-                        ether_packet.set_payload(arp_packet)
-                        msg = of.ofp_packet_out()
-                        msg.data = ether_packet.pack()
-                        msg.actions.append(of.ofp_action_output(port=inport))
-                        connection.send(msg)
-                elif srcip in self.server_ips:
-                    if dstip in self.client_iptomac:
-                        client_mac = self.client_iptomac[dstip][0]
-                        arp_packet = arp()
-                        arp_packet.hwsrc = client_mac
-                        arp_packet.hwdst = packet.src
-                        arp_packet.opcode = arp_packet.REPLY
-                        arp_packet.prototype = arp_packet.PROTO_TYPE_IP
-                        arp_packet.protosrc = packet.payload.protodst
-                        arp_packet.protodst = packet.payload.protosrc
-                        ether_packet = ethernet()
-                        ether_packet.type = ethernet.ARP_TYPE
-                        ether_packet.src = client_mac
-                        ether_packet.dst = packet.src
-                        ether_packet.set_payload(arp_packet)
-                        msg = of.ofp_packet_out()
-                        msg.data = ether_packet.pack()
-                        msg.actions.append(of.ofp_action_output(port=inport))
-                        connection.send(msg)
-        if packet.payload.opcode == arp.REPLY:
-            if srcip in self.server_ips:
-                self.server_iptomac[srcip] = (packet.src, inport)
-            if srcip in self.client_ips:
-                self.client_iptomac[srcip] = (packet.src, inport)
-            if srcip == self.monitor_ip:
-                self.monitor_macport = (packet.src, inport)
+            reply_key = (dstip, packet.src, inport)
+            reply_data = self.arp_reply_cache.get(reply_key)
+            if reply_data is None:
+                reply_mac = self.resolve_arp(srcip, dstip)
+                if reply_mac is None:
+                    return
+                reply_data = self.build_arp_reply(reply_mac, packet.src, dstip, srcip)
+                self.arp_reply_cache[reply_key] = reply_data
+            msg = of.ofp_packet_out()
+            msg.data = reply_data
+            msg.actions.append(of.ofp_action_output(port=inport))
+            connection.send(msg)
+
+    def resolve_arp(self, srcip, dstip):
+        # mac the controller answers with for an arp request, None if it should stay silent
+        src_role = self.hosts.role(srcip)
+        if src_role == MONITOR:
+            # monitor talks to every host directly
+            for iptomac in (self.client_iptomac, self.server_iptomac):
+                if dstip in iptomac:
+                    return iptomac[dstip][0]
+        elif dstip == self.monitor_ip:
+            if self.monitor_macport and (srcip in self.client_iptomac or srcip in self.server_iptomac):
+                return self.monitor_macport[0]
+        elif src_role == CLIENT:
+            # clients only ever see the switch
+            if dstip == self.switch_ip:
+                return self.switch_mac
+        elif src_role == SERVER:
+            # servers answer clients directly, the switch rewrites the source on the way
+            if dstip in self.client_iptomac:
+                return self.client_iptomac[dstip][0]
+        return None
+
+    def build_arp_reply(self, reply_mac, requester_mac, reply_ip, requester_ip):
+        arp_packet = arp()
+        arp_packet.hwsrc = reply_mac
+        arp_packet.hwdst = requester_mac
+        arp_packet.opcode = arp.REPLY
+        arp_packet.prototype = arp.PROTO_TYPE_IP
+        arp_packet.protosrc = reply_ip
+        arp_packet.protodst = requester_ip
+        ether_packet = ethernet()
+        ether_packet.type = ethernet.ARP_TYPE
+        ether_packet.src = reply_mac
+        ether_packet.dst = requester_mac
+        ether_packet.set_payload(arp_packet)
+        return ether_packet.pack()
+
+    def learn_server(self, ip, mac, port):
+        if self.server_iptomac.get(ip) == (mac, port):
+            return
+        self.server_iptomac[ip] = (mac, port)
+        self.arp_reply_cache.clear()
+        self.schedule_proactive_update()
+
+    def learn_monitor(self, mac, port):
+        if self.monitor_macport == (mac, port):
+            return
+        self.monitor_macport = (mac, port)
+        self.arp_reply_cache.clear()
+
+    def learn_client(self, connection, ip, mac, port):
+        if self.client_iptomac.get(ip) == (mac, port):
+            return
+        self.client_iptomac[ip] = (mac, port)
+        self.arp_reply_cache.clear()
+        if self.proactive:
+            self.install_return_rule(connection, ip)
 
     def install_rule(self, connection, outport, src_ip, dst_ip, isServerToClient):
         # server to client rule
@@ -217,6 +632,8 @@ class Controller(EventMixin):
             (client_mac, _) = self.client_iptomac[dst_ip]
             fm.actions.append(of.ofp_action_dl_addr.set_dst(client_mac))
             fm.actions.append(of.ofp_action_output(port=outport))
+            self.set_flow_lifetime(fm, self.track_flow(
+                connection.dpid, src_ip, dst_ip, dst_ip, src_ip, True))
             connection.send(fm)
 
         # client to server rule
@@ -230,12 +647,126 @@ class Controller(EventMixin):
             fm.actions.append(of.ofp_action_dl_addr.set_dst(server_mac))
             fm.actions.append(of.ofp_action_dl_addr.set_src(self.switch_mac))
             fm.actions.append(of.ofp_action_output(port=outport))
+            self.set_flow_lifetime(fm, self.track_flow(
+                connection.dpid, src_ip, self.switch_ip, src_ip, dst_ip, False))
             connection.send(fm)
 
+    def delete_rule(self, connection, nw_src, nw_dst):
+        fm = of.ofp_flow_mod()
+        fm.command = of.OFPFC_DELETE_STRICT
+        fm.match.dl_type = 0x800
+        fm.match.nw_src = nw_src
+        fm.match.nw_dst = nw_dst
+        connection.send(fm)
+
+    def install_transit_rule(self, connection, outport, nw_src, nw_dst, client_ip, server_ip, is_server_to_client):
+        # switches after the first one only forward the already rewritten packet
+        fm = of.ofp_flow_mod()
+        fm.match.dl_type = 0x800
+        fm.match.nw_src = nw_src
+        fm.match.nw_dst = nw_dst
+        fm.actions.append(of.ofp_action_output(port=outport))
+        self.set_flow_lifetime(fm, self.track_flow(
+            connection.dpid, nw_src, nw_dst, client_ip, server_ip, is_server_to_client, True))
+        connection.send(fm)
+
+    def pin_client(self, connection, client_ip, server_ip):
+        # install both directions of a client's flow to its server, return the out port towards
+        # the server on the client's switch and towards the client on the server's switch
+        self.release_path(client_ip)
+        client_location = self.topology.location(client_ip)
+        server_location = self.topology.location(server_ip)
+        if client_location is not None and server_location is not None and client_location[0] != server_location[0]:
+            return self.pin_client_path(client_ip, server_ip, client_location, server_location)
+        (_, server_port) = self.server_iptomac[server_ip]
+        (_, client_port) = self.client_iptomac[client_ip]
+        self.install_rule(connection, server_port, client_ip, server_ip, isServerToClient=False)
+        self.install_rule(connection, client_port, server_ip, client_ip, isServerToClient=True)
+        return server_port, client_port
+
+    def pin_client_path(self, client_ip, server_ip, client_location, server_location):
+        forward_path = self.topology.pick_path(client_location[0], server_location[0], (client_ip, server_ip))
+        backward_path = self.topology.pick_path(server_location[0], client_location[0], (server_ip, client_ip))
+        if forward_path is None or backward_path is None:
+            log.warning("no path between client {} and server {}".format(client_ip, server_ip))
+            return None, None
+        forward = self.topology.hops(forward_path, server_location[1])
+        backward = self.topology.hops(backward_path, client_location[1])
+        if any(dpid not in self.connections for dpid, _ in forward + backward):
+            log.warning("switch on the path of client {} is not connected".format(client_ip))
+            return None, None
+        self.client_paths[client_ip] = (server_ip, forward_path, backward_path)
+        self.topology.add_load(forward_path, 1)
+        self.topology.add_load(backward_path, 1)
+        # downstream switches first, so the rewritten packet never misses a rule
+        for dpid, port in reversed(forward[1:]):
+            self.install_transit_rule(self.connections[dpid], port, client_ip, server_ip,
+                                      client_ip, server_ip, False)
+        (dpid, port) = forward[0]
+        self.install_rule(self.connections[dpid], port, client_ip, server_ip, isServerToClient=False)
+        for dpid, port in reversed(backward[1:]):
+            self.install_transit_rule(self.connections[dpid], port, self.switch_ip, client_ip,
+                                      client_ip, server_ip, True)
+        (dpid, port) = backward[0]
+        self.install_rule(self.connections[dpid], port, server_ip, client_ip, isServerToClient=True)
+        return forward[0][1], backward[0][1]
+
+    def release_path(self, client_ip):
+        path = self.client_paths.pop(client_ip, None)
+        if path is not None:
+            (_, forward_path, backward_path) = path
+            self.topology.add_load(forward_path, -1)
+            self.topology.add_load(backward_path, -1)
+
+    def route_plain(self, packet, connection, srcip, dstip):
+        # monitor traffic is not balanced, just routed along a shortest path
+        src_location = self.topology.location(srcip)
+        dst_location = self.topology.location(dstip)
+        if src_location is None or dst_location is None:
+            return False
+        path = self.topology.pick_path(src_location[0], dst_location[0], (srcip, dstip))
+        if path is None or any(dpid not in self.connections for dpid in path):
+            return False
+        out_port = None
+        for dpid, port in self.topology.hops(path, dst_location[1]):
+            fm = of.ofp_flow_mod()
+            fm.match.dl_type = 0x800
+            fm.match.nw_dst = dstip
+            fm.match.nw_src = srcip
+            fm.actions.append(of.ofp_action_output(port=port))
+            self.connections[dpid].send(fm)
+            if dpid == connection.dpid:
+                out_port = port
+        if out_port is not None:
+            msg = of.ofp_packet_out()
+            msg.data = packet
+            msg.actions.append(of.ofp_action_output(port=out_port))
+            connection.send(msg)
+        return True
+
+    def reroute_link(self, dpid1, dpid2):
+        # clients whose path crossed a link that went away get a new path to the same server
+        for client_ip, (server_ip, forward_path, backward_path) in list(self.client_paths.items()):
+            if self.topology.uses_link(forward_path, dpid1, dpid2) or self.topology.uses_link(backward_path, dpid1, dpid2):
+                client_location = self.topology.location(client_ip)
+                if client_location is not None and client_location[0] in self.connections:
+                    self.pin_client(self.connections[client_location[0]], client_ip, server_ip)
+                else:
+                    self.release_path(client_ip)
+
+    def set_flow_lifetime(self, fm, cookie):
+        fm.idle_timeout = self.idle_timeout
+        fm.hard_timeout = self.hard_timeout
+        fm.cookie = cookie
+        # ask the switch for a FlowRemoved so the flow table follows expiry
+        fm.flags |= of.OFPFF_SEND_FLOW_REM
+
     def handle_ip_packet(self, packet, connection):
         srcip = packet.payload.srcip
         dstip = packet.payload.dstip
         if srcip == self.monitor_ip or dstip == self.monitor_ip:
+            if self.topology.is_multi_switch() and self.route_plain(packet, connection, srcip, dstip):
+                return
             fm = of.ofp_flow_mod()
             fm.match.dl_type = 0x800
             fm.match.nw_dst = dstip
@@ -247,15 +778,30 @@ class Controller(EventMixin):
             action = of.ofp_action_output(port=of.OFPP_FLOOD)
             msg.actions.append(action)
             connection.send(msg)
+        src_role = self.hosts.role(srcip)
         # packet from client to switch
-        if srcip in self.client_ips and dstip == self.switch_ip:
+        if src_role == CLIENT and dstip == self.switch_ip:
             msg = of.ofp_packet_out()
-            target_server_ip = self.target_server()
+            released_server_ip = self.released_clients.pop(srcip, None)
+            if released_server_ip is not None and released_server_ip not in self.down_servers and not is_tcp_syn(packet):
+                # a connection opened before its server got overloaded, keep it there
+                target_server_ip = released_server_ip
+                decision = "overload_keep"
+            else:
+                target_server_ip = self.target_server(srcip)
+                decision = self.policy_name
+            if target_server_ip is None or target_server_ip not in self.server_iptomac:
+                log.warning("no usable server for client {}, packet dropped".format(srcip))
+                return
+            self.stats.record_decision(decision, srcip, target_server_ip)
+            if self.verbose >= 1:
+                log.info("{} policy sent client {} to server {}".format(
+                    self.policy_name, srcip, target_server_ip))
             # install rule, modify packet and resend packet
-            (server_mac, server_port) = self.server_iptomac[target_server_ip]
-            (client_mac, client_port) = self.client_iptomac[srcip]
-            self.install_rule(connection, server_port, srcip, target_server_ip, isServerToClient=False)
-            self.install_rule(connection, client_port, target_server_ip, srcip, isServerToClient=True)
+            (server_mac, _) = self.server_iptomac[target_server_ip]
+            (server_port, _) = self.pin_client(connection, srcip, target_server_ip)
+            if server_port is None:
+                return
             packet.payload.dstip = target_server_ip
             packet.dst = server_mac
             msg.data = packet
@@ -263,66 +809,155 @@ class Controller(EventMixin):
             msg.actions.append(action)
             connection.send(msg)
         # packet from server to client
-        elif srcip in self.server_ips and dstip in self.client_ips:
+        elif src_role == SERVER and self.hosts.role(dstip) == CLIENT:
+            if srcip in self.down_servers:
+                # the client has been moved away, do not pin it back
+                return
             msg = of.ofp_packet_out()
-            (server_mac, server_port) = self.server_iptomac[srcip]
-            (client_mac, client_port) = self.client_iptomac[dstip]
-            self.install_rule(connection, server_port, dstip, srcip, isServerToClient=False)
-            self.install_rule(connection, client_port, srcip, dstip, isServerToClient=True)
-            packet.payload.dstip = dstip
+            (client_mac, _) = self.client_iptomac[dstip]
+            (_, client_port) = self.pin_client(connection, dstip, srcip)
+            if client_port is None:
+                return
+            # the reply rule may expire before the request rule, keep the reply looking like the switch
+            packet.payload.srcip = self.switch_ip
+            packet.src = self.switch_mac
             packet.dst = client_mac
             msg.data = packet
             action = of.ofp_action_output(port=client_port)
             msg.actions.append(action)
+            connection.send(msg)
 
     def _handle_ConnectionUp(self, event):
+        start_time = time.perf_counter()
+        self.connections[event.dpid] = event.connection
+        # a (re)connected switch starts without our prefix rules
+        self.proactive_rules = {}
+        if self.proactive:
+            for client_ip in self.client_iptomac:
+                self.install_return_rule(event.connection, client_ip)
+            self.schedule_proactive_update()
         # send arp request packet to form the ip -> mac and port table when connection up
-        for ip in self.all_ip:
-            arp_packet = arp()
-            arp_packet.opcode = arp.REQUEST
-            arp_packet.hwtype = arp.HW_TYPE_ETHERNET
-            arp_packet.prototype = arp.PROTO_TYPE_IP
-            arp_packet.hwlen = 6
-            arp_packet.protodst = ip
-            arp_packet.protosrc = self.switch_ip
-
-            ether_packet = ethernet()
-            ether_packet.type = ethernet.ARP_TYPE
-            ether_packet.dst = ETHER_BROADCAST
-            ether_packet.src = self.switch_mac
-            ether_packet.set_payload(arp_packet)
+        for ip in self.hosts.hosts():
+            self.send_arp_request(event.connection, ip)
+        self.stats.record_latency("connection_up", time.perf_counter() - start_time)
 
-            msg = of.ofp_packet_out()
-            msg.data = ether_packet.pack()
-            msg.actions.append(of.ofp_action_output(port=of.OFPP_FLOOD))
-            event.connection.send(msg)
+    def send_arp_request(self, connection, ip):
+        arp_packet = arp()
+        arp_packet.opcode = arp.REQUEST
+        arp_packet.hwtype = arp.HW_TYPE_ETHERNET
+        arp_packet.prototype = arp.PROTO_TYPE_IP
+        arp_packet.hwlen = 6
+        arp_packet.protodst = ip
+        arp_packet.protosrc = self.switch_ip
+
+        ether_packet = ethernet()
+        ether_packet.type = ethernet.ARP_TYPE
+        ether_packet.dst = ETHER_BROADCAST
+        ether_packet.src = self.switch_mac
+        ether_packet.set_payload(arp_packet)
+
+        msg = of.ofp_packet_out()
+        msg.data = ether_packet.pack()
+        msg.actions.append(of.ofp_action_output(port=of.OFPP_FLOOD))
+        connection.send(msg)
+
+    def _handle_LinkEvent(self, event):
+        link = event.link
+        if event.added:
+            self.topology.add_link(link.dpid1, link.port1, link.dpid2, link.port2)
+        else:
+            self.topology.remove_link(link.dpid1, link.port1, link.dpid2, link.port2)
+            self.reroute_link(link.dpid1, link.dpid2)
+        log.info("link {}.{} -> {}.{} {}".format(link.dpid1, link.port1, link.dpid2, link.port2,
+                                                 "up" if event.added else "down"))
+
+    def _handle_FlowRemoved(self, event):
+        start_time = time.perf_counter()
+        with self.status_lock:
+            entry = self.flow_table.remove(event.ofp.cookie)
+            if entry is not None:
+                self.refresh_connection_count(entry.server_ip)
+                self.policy.on_flow_removed(entry)
+        if entry is not None and self.flow_table.is_counted(entry):
+            path = self.client_paths.get(entry.client_ip)
+            if path is not None and path[0] == entry.server_ip:
+                self.release_path(entry.client_ip)
+        self.stats.record_latency("flow_removed", time.perf_counter() - start_time)
+        if entry is not None and self.verbose >= 2:
+            log.info("flow {} -> {} removed after {:.1f}s, {} flows left".format(
+                entry.nw_src, entry.nw_dst, time.time() - entry.install_time, len(self.flow_table)))
 
     def _handle_PacketIn(self, event):
+        start_time = time.perf_counter()
         packet = event.parsed
         if packet.type == packet.ARP_TYPE:
             self.handle_arp_packet(event.parsed, event.connection, event.port)
+            self.stats.record_latency("arp", time.perf_counter() - start_time)
         elif packet.type == packet.IP_TYPE:
             self.handle_ip_packet(event.parsed, event.connection)
+            self.stats.record_latency("ip", time.perf_counter() - start_time)
         else:
             log.debug("unknown packet received")
 
+    def export_stats(self, path=None):
+        path = path or self.stats_file
+        try:
+            self.stats.dump(path)
+            log.info("controller stats written to {}".format(path))
+        except:
+            log.error(traceback.format_exc())
+        return self.stats.export()
+
+def is_tcp_syn(packet):
+    # first packet of a new tcp connection
+    segment = packet.find('tcp')
+    return segment is not None and segment.SYN and not segment.ACK
+
+
 def read_config_from_file():
     contents = None
     with open('topology.in', "r") as f:
         contents = f.read().split()
     client_num = int(contents[0])
     server_num = int(contents[1])
-    return client_num, server_num
+    # optional client and server pools, any prefix length
+    client_network = contents[2] if len(contents) > 2 else CLIENT_NETWORK
+    server_network = contents[3] if len(contents) > 3 else SERVER_NETWORK
+    return client_num, server_num, client_network, server_network
 
-def launch(policy):
-    client_num, server_num = read_config_from_file()
+def launch(policy, status_mode=STATUS_MODE, choices=CHOICES,
+           idle_timeout=IDLE_TIMEOUT, hard_timeout=HARD_TIMEOUT,
+           proactive=False, client_network=None, server_network=None,
+           verbose=VERBOSE, trace_sample=TRACE_SAMPLE, stats_file=STATS_FILE_PATH,
+           ewma_alpha=EWMA_ALPHA, stale_deadline=STALE_DEADLINE,
+           health=True, health_interval=HEALTH_INTERVAL, failure_threshold=FAILURE_THRESHOLD, health_grace=HEALTH_GRACE,
+           probe=False, probe_port=PROBE_PORT, probe_timeout=PROBE_TIMEOUT,
+           path_weight=PATH_WEIGHT, max_paths=MAX_ECMP_PATHS,
+           service_time=SERVICE_TIME, request_cpu=REQUEST_CPU, max_queue=MAX_QUEUE,
+           score_weights=SCORE_WEIGHTS, policy_modules=None, overload_hold=OVERLOAD_HOLD):
+    # third party policies register themselves on import
+    load_policy_modules(policy_modules)
+    client_num, server_num, file_client_network, file_server_network = read_config_from_file()
+    client_network = client_network or file_client_network
+    server_network = server_network or file_server_network
     s_ip_lst = []
     c_ip_lst = []
-    for i in range(client_num):
-        c_ip_lst.append(IPAddr('10.0.1.'+str(i+1)))
-    for i in range(server_num):
-        s_ip_lst.append(IPAddr('10.0.0.'+str(i+1)))
+    for ip in pool_hosts(client_network, client_num):
+        c_ip_lst.append(IPAddr(ip))
+    for ip in pool_hosts(server_network, server_num):
+        s_ip_lst.append(IPAddr(ip))
     fake_switch_ip = IPAddr("10.0.2.1")
     fake_switch_mac = EthAddr("00:00:00:00:00:11")
     pox.openflow.discovery.launch()
-    core.registerNew(Controller, fake_switch_ip, s_ip_lst, c_ip_lst, IPAddr('10.0.3.1'), fake_switch_mac, policy)
\ No newline at end of file
+    # options by keyword, a new one cannot shift the others
+    core.registerNew(Controller, fake_switch_ip, s_ip_lst, c_ip_lst, IPAddr('10.0.3.1'), fake_switch_mac, policy,
+                     status_mode=status_mode, choices=choices, idle_timeout=idle_timeout, hard_timeout=hard_timeout,
+                     proactive=proactive, client_network=client_network, server_network=server_network,
+                     verbose=verbose, trace_sample=trace_sample, stats_file=stats_file,
+                     ewma_alpha=ewma_alpha, stale_deadline=stale_deadline,
+                     health=health, health_interval=health_interval, failure_threshold=failure_threshold,
+                     health_grace=health_grace, probe=probe, probe_port=probe_port, probe_timeout=probe_timeout,
+                     path_weight=path_weight, max_paths=max_paths, service_time=service_time, request_cpu=request_cpu,
+                     max_queue=max_queue, score_weights=score_weights, overload_hold=overload_hold)
+    # kill -USR1 <pox pid> writes the stats without stopping the controller
+    signal.signal(signal.SIGUSR1, lambda signum, frame: core.callLater(core.Controller.export_stats))
\ No newline at end of file
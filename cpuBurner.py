@@ -0,0 +1,119 @@
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+
+BURN_SLICE = 10  # In ms, a request burns its cpu share of every slice and sleeps the rest
+
+# set in every burning process by init_burn_worker
+burn_time = None
+burn_core = None
+
+
+def available_cores():
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        # no affinity on this platform, nothing gets pinned
+        return list(range(os.cpu_count() or 1))
+
+
+def parse_cores(cores):
+    # "0,2,4-7" to [0, 2, 4, 5, 6, 7], None or "" for every core this process may run on
+    if not cores:
+        return available_cores()
+    parsed = []
+    for part in str(cores).split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            parsed += range(int(first), int(last) + 1)
+        else:
+            parsed.append(int(part))
+    return parsed
+
+
+def init_burn_worker(shared_burn_time, core_counter, cores):
+    """
+    Pin the calling process to the next core, round robin over cores, and
+    keep the shared counter its burnt cpu time is added to.
+    """
+    global burn_time, burn_core
+    burn_time = shared_burn_time
+    with core_counter.get_lock():
+        burn_core = cores[core_counter.value % len(cores)]
+        core_counter.value += 1
+    try:
+        os.sched_setaffinity(0, {burn_core})
+    except (AttributeError, OSError):
+        logging.warning("could not pin burn worker {} to core {}: {}".format(
+            os.getpid(), burn_core, traceback.format_exc()))
+
+
+def burn(cpu_share, time_usage):
+    """
+    Keep the core busy for cpu_share (0 to 1) of every BURN_SLICE during
+    time_usage ms, the cpu time it really got is measured, not assumed.
+    """
+    start_time = time.perf_counter()
+    end_time = start_time + float(time_usage) * 1e-3
+    cpu_share = min(max(cpu_share, 0.), 1.)
+    now = start_time
+    while now < end_time:
+        slice_end = min(now + BURN_SLICE * 1e-3, end_time)
+        busy_end = now + (slice_end - now) * cpu_share
+        start_cpu_time = time.process_time()
+        while time.perf_counter() < busy_end:
+            pass
+        if burn_time is not None:
+            with burn_time.get_lock():
+                burn_time.value += time.process_time() - start_cpu_time
+        now = time.perf_counter()
+        if now < slice_end:
+            time.sleep(slice_end - now)
+            now = time.perf_counter()
+    return burn_core
+
+
+class BurnPool():
+    """
+    Worker processes pinned round robin to cores, burning the cpu of the
+    requests handed to them. Workers are forked and started at once, before
+    the caller starts any thread.
+    """
+
+    def __init__(self, worker_number, cores, burn_time, core_counter):
+        self.cores = cores
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=worker_number, mp_context=multiprocessing.get_context("fork"),
+            initializer=init_burn_worker, initargs=(burn_time, core_counter, cores))
+        # with fork every worker starts on the first submit
+        self.executor.submit(burn, 0., 0.).result()
+
+    def submit(self, cpu_share, time_usage):
+        return self.executor.submit(burn, cpu_share, time_usage)
+
+
+class CpuMeter():
+    """
+    Cpu usage of the burning processes between two reads, in percentage of
+    the cores they are pinned to.
+    """
+
+    def __init__(self, burn_time, core_number):
+        self.burn_time = burn_time
+        self.core_number = core_number
+        self.last_burn_time = burn_time.value
+        self.last_time = time.perf_counter()
+        self.cpu_usage = 0.
+
+    def read(self):
+        now = time.perf_counter()
+        current_burn_time = self.burn_time.value
+        if now > self.last_time:
+            self.cpu_usage = ((current_burn_time - self.last_burn_time) / (now - self.last_time)
+                              / self.core_number * 1e2)
+        self.last_burn_time = current_burn_time
+        self.last_time = now
+        return self.cpu_usage
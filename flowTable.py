@@ -0,0 +1,84 @@
+import time
+
+
+class FlowEntry():
+    def __init__(self, cookie, dpid, nw_src, nw_dst, client_ip, server_ip, is_server_to_client,
+                 is_transit=False):
+        self.cookie = cookie
+        self.dpid = dpid
+        self.nw_src = nw_src
+        self.nw_dst = nw_dst
+        self.client_ip = client_ip
+        self.server_ip = server_ip
+        self.is_server_to_client = is_server_to_client
+        # forwarding only rule on a switch after the first one of the path
+        self.is_transit = is_transit
+        self.install_time = time.time()
+
+    def key(self):
+        return (self.dpid, self.nw_src, self.nw_dst)
+
+
+class FlowTable():
+    """
+    Controller side copy of the load balancing rules installed on the switches.
+
+    Entries are keyed by their OpenFlow match, so installing a rule with the
+    same match replaces the old entry just like the switch does, and they are
+    removed when the switch reports a FlowRemoved for their cookie. The number
+    of client to server rules on the client's own switch per server is the
+    server's active flow count.
+    """
+
+    def __init__(self):
+        self.entries = {}  # cookie -> FlowEntry
+        self.cookie_by_key = {}  # (dpid, nw_src, nw_dst) -> cookie
+        self.server_flow_count = {}  # server ip -> active client to server flows
+        self.next_cookie = 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, dpid, nw_src, nw_dst, client_ip, server_ip, is_server_to_client, is_transit=False):
+        """
+        Record a rule about to be installed, return its cookie and the entry it replaced.
+        """
+        cookie = self.next_cookie
+        self.next_cookie += 1
+        entry = FlowEntry(cookie, dpid, nw_src, nw_dst,
+                          client_ip, server_ip, is_server_to_client, is_transit)
+        replaced = None
+        old_cookie = self.cookie_by_key.get(entry.key())
+        if old_cookie is not None:
+            replaced = self.remove(old_cookie)
+        self.entries[cookie] = entry
+        self.cookie_by_key[entry.key()] = cookie
+        if self.is_counted(entry):
+            self.server_flow_count[server_ip] = self.server_flow_count.get(server_ip, 0) + 1
+        return cookie, replaced
+
+    def remove(self, cookie):
+        entry = self.entries.pop(cookie, None)
+        if entry is None:
+            return None
+        if self.cookie_by_key.get(entry.key()) == cookie:
+            del self.cookie_by_key[entry.key()]
+        if self.is_counted(entry):
+            self.server_flow_count[entry.server_ip] -= 1
+            if self.server_flow_count[entry.server_ip] <= 0:
+                del self.server_flow_count[entry.server_ip]
+        return entry
+
+    def is_counted(self, entry):
+        return not entry.is_server_to_client and not entry.is_transit
+
+    def active_flows(self, server_ip):
+        return self.server_flow_count.get(server_ip, 0)
+
+    def client_server(self):
+        # client ip -> server ip of every active client to server rule
+        return {entry.client_ip: entry.server_ip for entry in self.entries.values()
+                if self.is_counted(entry)}
+
+    def flows_of_server(self, server_ip):
+        return [entry for entry in self.entries.values() if entry.server_ip == server_ip]
@@ -0,0 +1,87 @@
+import logging
+import socket
+import threading
+import time
+
+HEALTH_INTERVAL = 200  # in ms between two health rounds
+FAILURE_THRESHOLD = 3  # failed rounds in a row before a server is declared down
+PROBE_PORT = 5000
+PROBE_TIMEOUT = 100  # in ms
+HEALTH_GRACE = 5000  # in ms after a server joins during which failed rounds are not counted
+
+
+class HealthChecker(threading.Thread):
+    """
+    Decides which servers are alive and tells the controller when that changes.
+
+    A server fails a round when its status is stale or, with probing enabled,
+    when a TCP connection to its service port cannot be opened. After
+    failure_threshold failed rounds in a row it is reported down, and it is
+    reported up again on the first round it passes. A dead server is therefore
+    evicted at most stale deadline + failure_threshold * interval after its
+    last status. Failed rounds only count once a server has been in the pool
+    for the grace period, so servers still starting are not evicted.
+    """
+
+    def __init__(self, server_ips, is_stale, on_down, on_up, interval=HEALTH_INTERVAL,
+                 failure_threshold=FAILURE_THRESHOLD, probe=False, probe_port=PROBE_PORT,
+                 probe_timeout=PROBE_TIMEOUT, grace=HEALTH_GRACE):
+        threading.Thread.__init__(self, daemon=True)
+        self.server_ips = server_ips
+        self.is_stale = is_stale
+        self.on_down = on_down
+        self.on_up = on_up
+        self.interval = float(interval) * 1e-3
+        self.failure_threshold = int(failure_threshold)
+        self.probe = probe
+        self.probe_port = int(probe_port)
+        self.probe_timeout = float(probe_timeout) * 1e-3
+        self.grace = float(grace) * 1e-3
+        self.join_times = {}  # ip -> time the checker first saw it
+        self.failures = {}  # ip -> failed rounds in a row
+        self.down_servers = set()
+
+    def probe_server(self, ip):
+        try:
+            with socket.create_connection((str(ip), self.probe_port), timeout=self.probe_timeout):
+                return True
+        except OSError:
+            return False
+
+    def check(self, ip):
+        if self.is_stale(ip):
+            return False
+        if self.probe and not self.probe_server(ip):
+            return False
+        return True
+
+    def check_all(self, now=None):
+        now = now or time.time()
+        for ip in list(self.server_ips):
+            join_time = self.join_times.setdefault(ip, now)
+            if self.check(ip):
+                self.failures[ip] = 0
+                if ip in self.down_servers:
+                    self.down_servers.discard(ip)
+                    self.on_up(ip)
+                continue
+            if now - join_time < self.grace:
+                continue
+            self.failures[ip] = self.failures.get(ip, 0) + 1
+            if self.failures[ip] >= self.failure_threshold and ip not in self.down_servers:
+                self.down_servers.add(ip)
+                self.on_down(ip)
+        for ip in list(self.join_times):
+            if ip not in self.server_ips:
+                # server left the pool
+                del self.join_times[ip]
+                self.failures.pop(ip, None)
+                self.down_servers.discard(ip)
+
+    def run(self):
+        while True:
+            try:
+                self.check_all()
+            except Exception as e:
+                logging.error("health check failed: {}".format(e))
+            time.sleep(self.interval)
@@ -0,0 +1,87 @@
+import ipaddress
+
+CLIENT = "client"
+SERVER = "server"
+MONITOR = "monitor"
+VIP = "vip"
+ROLES = (CLIENT, SERVER, MONITOR, VIP)
+
+
+class HostRegistry():
+    """
+    Role of every address the controller deals with.
+
+    Known hosts are classified with a single dict lookup. Addresses that have
+    not joined yet are matched against the CIDR pools by longest prefix, with
+    one hashed table per prefix length, so the cost does not grow with the
+    number of hosts. Members of each role are also kept in insertion order,
+    since the policies walk and sample the server list.
+    """
+
+    def __init__(self):
+        self.roles = {}  # ip -> role
+        self.members = {role: [] for role in ROLES}
+        # prefix length -> {network address as int -> role}, longest prefix first
+        self.pools = {}
+        self.pool_networks = {role: [] for role in ROLES}
+
+    def add_pool(self, network, role):
+        network = ipaddress.ip_network(str(network))
+        self.pools.setdefault(network.prefixlen, {})[int(network.network_address)] = role
+        self.pools = dict(sorted(self.pools.items(), reverse=True))
+        self.pool_networks[role].append(network)
+
+    def add(self, ip, role):
+        old_role = self.roles.get(ip)
+        if old_role == role:
+            return False
+        if old_role is not None:
+            self.members[old_role].remove(ip)
+        self.roles[ip] = role
+        self.members[role].append(ip)
+        return True
+
+    def remove(self, ip):
+        role = self.roles.pop(ip, None)
+        if role is not None:
+            self.members[role].remove(ip)
+        return role
+
+    def role(self, ip):
+        return self.roles.get(ip)
+
+    def pool_role(self, ip):
+        address = int(ipaddress.ip_address(str(ip)))
+        for prefixlen, networks in self.pools.items():
+            mask = (0xFFFFFFFF << (32 - prefixlen)) & 0xFFFFFFFF
+            role = networks.get(address & mask)
+            if role is not None:
+                return role
+        return None
+
+    def classify(self, ip):
+        role = self.roles.get(ip)
+        if role is None:
+            role = self.pool_role(ip)
+        return role
+
+    def network(self, role):
+        networks = self.pool_networks[role]
+        return networks[0] if networks else None
+
+    def hosts(self):
+        # every host the controller should resolve, used for the arp sweep
+        return self.members[CLIENT] + self.members[SERVER] + self.members[MONITOR]
+
+
+def pool_hosts(network, num):
+    # the first num host addresses of a pool, a /24 is no longer the limit
+    network = ipaddress.ip_network(str(network))
+    hosts = []
+    for address in network.hosts():
+        if len(hosts) == num:
+            break
+        hosts.append(str(address))
+    if len(hosts) < num:
+        raise ValueError("{} cannot hold {} hosts".format(network, num))
+    return hosts
@@ -0,0 +1,91 @@
+import json
+import time
+
+from collections import Counter, deque
+
+HISTOGRAM_BUCKETS = 32  # bucket i holds latencies in [2^i, 2^(i+1)) us
+TRACE_SIZE = 1024  # sampled decisions kept
+TRACE_SAMPLE = 100  # keep one decision out of this many
+
+
+class LatencyHistogram():
+    def __init__(self, name=""):
+        self.name = name
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+
+    def record(self, seconds):
+        micros = int(seconds * 1e6)
+        self.buckets[min(micros.bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        # upper bound of the bucket holding the percentile, in seconds
+        if self.count == 0:
+            return 0.
+        rank = self.count * percent * 0.01
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min((1 << index) * 1e-6, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_us": self.total / max(self.count, 1) * 1e6,
+            "p50_us": self.percentile(50) * 1e6,
+            "p99_us": self.percentile(99) * 1e6,
+            "max_us": self.max * 1e6,
+            "buckets": {"<{}us".format(1 << index): count
+                        for index, count in enumerate(self.buckets) if count},
+        }
+
+
+class Instrumentation():
+    """
+    Cheap always-on counters for the controller's event handlers.
+
+    Handler latency goes into per event type log2 histograms, every policy
+    decision bumps a counter, and one decision in trace_sample is kept in a
+    bounded ring buffer. Nothing is formatted until export() is called.
+    """
+
+    def __init__(self, trace_sample=TRACE_SAMPLE, trace_size=TRACE_SIZE):
+        self.start_time = time.time()
+        self.histograms = {}
+        self.decisions = Counter()
+        self.trace_sample = max(int(trace_sample), 1)
+        self.trace = deque(maxlen=trace_size)
+        self.decision_num = 0
+
+    def record_latency(self, event_type, seconds):
+        histogram = self.histograms.get(event_type)
+        if histogram is None:
+            histogram = self.histograms[event_type] = LatencyHistogram(event_type)
+        histogram.record(seconds)
+
+    def record_decision(self, policy, client_ip, server_ip):
+        self.decisions[policy] += 1
+        self.decision_num += 1
+        if self.decision_num % self.trace_sample == 0:
+            self.trace.append((time.time(), policy, client_ip, server_ip))
+
+    def export(self):
+        return {
+            "uptime_s": time.time() - self.start_time,
+            "latency": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+            "decisions": dict(self.decisions),
+            "trace": [{"time": timestamp, "policy": policy, "client": str(client_ip), "server": str(server_ip)}
+                      for timestamp, policy, client_ip, server_ip in self.trace],
+        }
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.export(), f, indent=2)
@@ -0,0 +1,86 @@
+import math
+import multiprocessing
+import time
+
+from collections import deque
+
+HISTOGRAM_MIN = 0.01  # In ms, upper bound of the first bucket
+BUCKETS_PER_DOUBLING = 4  # buckets are about 19% wide
+HISTOGRAM_BUCKETS = 105  # the last one holds everything above about 11 min
+RATE_WINDOW = 1000  # In ms, summaries and completion rate cover the last window
+
+
+def bucket_of(value):
+    if value <= HISTOGRAM_MIN:
+        return 0
+    return min(int(math.log2(value / HISTOGRAM_MIN) * BUCKETS_PER_DOUBLING) + 1, HISTOGRAM_BUCKETS - 1)
+
+
+def bucket_value(index):
+    # geometric middle of the bucket
+    if index == 0:
+        return HISTOGRAM_MIN / 2
+    return HISTOGRAM_MIN * 2 ** ((index - 0.5) / BUCKETS_PER_DOUBLING)
+
+
+def percentile(counts, percent):
+    total = sum(counts)
+    if not total:
+        return 0.
+    rank = total * percent * 1e-2
+    seen = 0
+    for index, count in enumerate(counts):
+        seen += count
+        if seen >= rank:
+            return bucket_value(index)
+    return bucket_value(len(counts) - 1)
+
+
+class Histogram():
+    """
+    Log bucketed counts in shared memory, one row of buckets per writer.
+
+    A writer only ever increments its own row, so recording is a single
+    unlocked add and readers in other processes sum the rows. Counts only
+    grow, a reader gets the samples of a period by subtracting two
+    snapshots.
+    """
+
+    def __init__(self, row_num=1):
+        self.row_num = row_num
+        self.counts = multiprocessing.Array('q', row_num * HISTOGRAM_BUCKETS, lock=False)
+
+    def record(self, value, row=0):
+        self.counts[row * HISTOGRAM_BUCKETS + bucket_of(value)] += 1
+
+    def snapshot(self):
+        counts = self.counts[:]
+        return [sum(counts[index::HISTOGRAM_BUCKETS]) for index in range(HISTOGRAM_BUCKETS)]
+
+
+class LatencyWindow():
+    """
+    Reader side: p50 and p99 of queue wait and service time, and completions
+    per second, over the last window of snapshots.
+    """
+
+    def __init__(self, wait_histogram, service_histogram, window=RATE_WINDOW):
+        self.wait_histogram = wait_histogram
+        self.service_histogram = service_histogram
+        self.window = window * 1e-3
+        self.snapshots = deque()  # (time, wait counts, service counts), oldest first
+
+    def read(self, now=None):
+        now = now or time.time()
+        wait_counts = self.wait_histogram.snapshot()
+        service_counts = self.service_histogram.snapshot()
+        self.snapshots.append((now, wait_counts, service_counts))
+        # keep the newest snapshot at least a window old as the start of the window
+        while len(self.snapshots) > 2 and now - self.snapshots[1][0] >= self.window:
+            self.snapshots.popleft()
+        start_time, start_wait_counts, start_service_counts = self.snapshots[0]
+        wait = [count - start_count for count, start_count in zip(wait_counts, start_wait_counts)]
+        service = [count - start_count for count, start_count in zip(service_counts, start_service_counts)]
+        period = now - start_time
+        rate = sum(service) / period if period > 0 else 0.
+        return (percentile(wait, 50), percentile(wait, 99), percentile(service, 50), percentile(service, 99), rate)
@@ -0,0 +1,75 @@
+import time
+
+EWMA_ALPHA = 0.3  # weight of the newest sample
+STALE_DEADLINE = 500  # in ms without a new sample before a server is stale
+MAX_LOAD = 100  # In percentage
+
+
+class ServerEstimate():
+    def __init__(self, value, timestamp):
+        self.value = value  # smoothed cpu usage
+        self.trend = 0.  # smoothed change of cpu usage per second
+        self.timestamp = timestamp  # server time of the last sample
+
+
+class LoadEstimator():
+    """
+    Smoothed, age-aware view of the cpu usage servers report.
+
+    Samples are folded into an EWMA of the value and of its slope, and the
+    estimate is projected forward by the age of the last sample. A server
+    whose last sample is older than the stale deadline has no estimate, so
+    the policies can leave it out instead of treating it as idle. Servers
+    that never reported get the deadline as grace period from start.
+    """
+
+    def __init__(self, alpha=EWMA_ALPHA, stale_deadline=STALE_DEADLINE, max_load=MAX_LOAD):
+        self.alpha = float(alpha)
+        self.stale_deadline = float(stale_deadline) * 1e-3
+        self.max_load = max_load
+        self.start_time = time.time()
+        self.estimates = {}  # ip -> ServerEstimate
+
+    def update(self, ip, cpu_usage, timestamp):
+        """
+        Fold in a sample, return False when it is not newer than the last one.
+        """
+        estimate = self.estimates.get(ip)
+        if estimate is None:
+            self.estimates[ip] = ServerEstimate(cpu_usage, timestamp)
+            return True
+        elapsed = timestamp - estimate.timestamp
+        if elapsed <= 0:
+            return False
+        value = self.alpha * cpu_usage + (1 - self.alpha) * estimate.value
+        slope = (value - estimate.value) / elapsed
+        estimate.trend = self.alpha * slope + (1 - self.alpha) * estimate.trend
+        estimate.value = value
+        estimate.timestamp = timestamp
+        return True
+
+    def remove(self, ip):
+        self.estimates.pop(ip, None)
+
+    def age(self, ip, now=None):
+        now = now or time.time()
+        estimate = self.estimates.get(ip)
+        if estimate is None:
+            return now - self.start_time
+        return now - estimate.timestamp
+
+    def is_stale(self, ip, now=None):
+        return self.age(ip, now) > self.stale_deadline
+
+    def estimate(self, ip, now=None):
+        """
+        Projected cpu usage of a server, None when it is stale.
+        """
+        now = now or time.time()
+        if self.is_stale(ip, now):
+            return None
+        estimate = self.estimates.get(ip)
+        if estimate is None:
+            return 0.
+        projected = estimate.value + estimate.trend * max(now - estimate.timestamp, 0.)
+        return min(max(projected, 0.), self.max_load)
@@ -0,0 +1,90 @@
+class IndexedHeap():
+    """
+    Addressable binary min-heap keyed by server.
+
+    Every key has exactly one entry, and `position` maps it to its slot in the
+    heap array, so changing the value of a key is a single sift in O(log n)
+    instead of a rebuild or a scan over all servers.
+    """
+
+    def __init__(self, items=()):
+        self.heap = []  # list of [value, key]
+        self.position = {}
+        for key, value in items:
+            self.update(key, value)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, key):
+        return key in self.position
+
+    def get(self, key, default=None):
+        index = self.position.get(key)
+        if index is None:
+            return default
+        return self.heap[index][0]
+
+    def peek(self):
+        if not self.heap:
+            return None, None
+        value, key = self.heap[0]
+        return key, value
+
+    def update(self, key, value):
+        index = self.position.get(key)
+        if index is None:
+            self.heap.append([value, key])
+            index = len(self.heap) - 1
+            self.position[key] = index
+            self.sift_up(index)
+            return
+        old_value = self.heap[index][0]
+        self.heap[index][0] = value
+        if value < old_value:
+            self.sift_up(index)
+        elif value > old_value:
+            self.sift_down(index)
+
+    def add(self, key, delta):
+        self.update(key, self.get(key, 0) + delta)
+
+    def remove(self, key):
+        index = self.position.pop(key, None)
+        if index is None:
+            return
+        last = self.heap.pop()
+        if index < len(self.heap):
+            self.heap[index] = last
+            self.position[last[1]] = index
+            self.sift_up(index)
+            self.sift_down(self.position[last[1]])
+
+    def swap(self, i, j):
+        self.heap[i], self.heap[j] = self.heap[j], self.heap[i]
+        self.position[self.heap[i][1]] = i
+        self.position[self.heap[j][1]] = j
+
+    def sift_up(self, index):
+        while index > 0:
+            parent = (index - 1) >> 1
+            if self.heap[index][0] < self.heap[parent][0]:
+                self.swap(index, parent)
+                index = parent
+            else:
+                break
+
+    def sift_down(self, index):
+        size = len(self.heap)
+        while True:
+            smallest = index
+            left = 2 * index + 1
+            right = left + 1
+            if left < size and self.heap[left][0] < self.heap[smallest][0]:
+                smallest = left
+            if right < size and self.heap[right][0] < self.heap[smallest][0]:
+                smallest = right
+            if smallest == index:
+                break
+            self.swap(index, smallest)
+            index = smallest
@@ -1,4 +1,6 @@
+import argparse
 import atexit
+import ipaddress
 import threading
 import time
 from mininet.net import Mininet
@@ -8,19 +10,29 @@ from mininet.topo import Topo
 from mininet.link import TCLink
 from mininet.node import RemoteController
 
+from hostRegistry import pool_hosts
+from prefixSplit import covering_network
+
 net = None
 MONITOR_NAME = 'monitor'
 MONITOR_IP = '10.0.3.1'
 MONITOR_CLIENT_PORT = 6000
 MONITOR_SERVER_PORT = 6001
 FAKE_SERVER_IP = '10.0.2.1'
+CLIENT_NETWORK = '10.0.1.0/24'
+SERVER_NETWORK = '10.0.0.0/24'
 SERVER_PORT = 5000
 CONTROLLER_IP = '0.0.0.0'
+LEAF_NUM = 1  # a single switch unless more leaves are asked for
+SPINE_NUM = 2
 
 
 class LoadBalanceNetLauncher:
-    def __init__(self):
-        self.net_mask = "/8"
+    def __init__(self, leaf_num=LEAF_NUM, spine_num=SPINE_NUM):
+        self.leaf_num = max(leaf_num, 1)
+        self.spine_num = spine_num if self.leaf_num > 1 else 0
+        # prefix of the host addresses, set from the pools in build_net
+        self.net_mask = None
         self.monitor_name = MONITOR_NAME
         self.monitor_ip = MONITOR_IP
         self.monitor_client_port = MONITOR_CLIENT_PORT
@@ -32,13 +44,25 @@ class LoadBalanceNetLauncher:
         self.servers = []
         self.monitor = None
         self.switch = None
+        self.leaves = []
+        self.spines = []
         self.net = None
         self.topo = Topo()
 
     def getContents(self, contents):
         client_num = int(contents[0])
         server_num = int(contents[1])
-        return client_num, server_num
+        client_network = contents[2] if len(contents) > 2 else CLIENT_NETWORK
+        server_network = contents[3] if len(contents) > 3 else SERVER_NETWORK
+        return client_num, server_num, client_network, server_network
+
+    def network_mask(self, client_network, server_network):
+        # one subnet holding both pools, the monitor and the balanced ip, so every host reaches them on link
+        addresses = [self.monitor_ip, self.fake_server_ip]
+        for network in (client_network, server_network):
+            network = ipaddress.ip_network(network)
+            addresses += [network.network_address, network.broadcast_address]
+        return "/{}".format(covering_network(addresses).prefixlen)
 
     def build_net(self):
         info('** Creating the network\n')
@@ -50,36 +74,46 @@ class LoadBalanceNetLauncher:
         # Read file contents
         f = open('topology.in', "r")
         contents = f.read().split()
-        client_num, server_num = self.getContents(contents)
+        client_num, server_num, client_network, server_network = self.getContents(contents)
+        self.net_mask = self.network_mask(client_network, server_network)
         host_num = client_num + server_num + 1
         print("Hosts: ", host_num)
-        print("Switch: ", 1)
+        print("Switch: ", self.leaf_num + self.spine_num)
         print("Clients: ", client_num)
         print("Servers: ", server_num)
 
-        # Add switch
-        sconfig = {'dpid': "%016x" % 1}
-        switch_name = 's1'
-        self.switch = self.net.addSwitch(switch_name, **sconfig)
+        # Add switches, leaves s1..sN and spines after them, every leaf linked to every spine
+        for i in range(1, self.leaf_num + self.spine_num + 1):
+            sconfig = {'dpid': "%016x" % i}
+            switch_name = 's{}'.format(i)
+            self.net.addSwitch(switch_name, **sconfig)
+            if i <= self.leaf_num:
+                self.leaves.append(switch_name)
+            else:
+                self.spines.append(switch_name)
+        for leaf in self.leaves:
+            for spine in self.spines:
+                self.net.addLink(leaf, spine)
+        self.switch = self.leaves[0]
         # Add monitor
         monitor_ip = self.monitor_ip + self.net_mask
         monitor_name = self.monitor_name
         self.monitor = self.net.addHost(monitor_name, ip=monitor_ip)
-        self.net.addLink(monitor_name, switch_name)
+        self.net.addLink(monitor_name, self.leaves[0])
         print('monitor:', monitor_ip)
-        # Add clients
-        for i in range(1, client_num + 1):
-            ip = '10.0.1.{}/8'.format(i)
+        # Add clients, spread over the leaves
+        for i, client_ip in enumerate(pool_hosts(client_network, client_num), 1):
+            ip = client_ip + self.net_mask
             name = 'client{}'.format(i)
             self.clients.append(self.net.addHost(name, ip=ip))
-            self.net.addLink(name, switch_name)
+            self.net.addLink(name, self.leaves[(i - 1) % self.leaf_num])
             print(name, ip)
-        # Add servers
-        for i in range(1, server_num + 1):
-            ip = '10.0.0.{}/8'.format(i)
+        # Add servers, spread over the leaves starting from the last one
+        for i, server_ip in enumerate(pool_hosts(server_network, server_num), 1):
+            ip = server_ip + self.net_mask
             name = 'server{}'.format(i)
             self.servers.append(self.net.addHost(name, ip=ip))
-            self.net.addLink(name, switch_name)
+            self.net.addLink(name, self.leaves[-i % self.leaf_num])
             print(name, ip)
 
     def launch_host(self):
@@ -108,7 +142,12 @@ class LoadBalanceNetLauncher:
 
 
 if __name__ == '__main__':
-    launcher = LoadBalanceNetLauncher()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--leaves', default=LEAF_NUM, type=int,
+                        help='Number of leaf switches, more than 1 builds a leaf-spine fabric')
+    parser.add_argument('--spines', default=SPINE_NUM, type=int)
+    args = parser.parse_args()
+    launcher = LoadBalanceNetLauncher(args.leaves, args.spines)
     # Force cleanup on exit by registering a cleanup function
     atexit.register(launcher.stop)
 
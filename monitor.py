@@ -1,13 +1,15 @@
 import argparse
 import logging
 import statistics
-import pickle
 import socket
 import time
 import traceback
 import threading
 import traceback
 
+from commonData import (HEARTBEAT, LOG_FREQUENCY, PICKLE_REFUSED, RECEIVE_SIZE, FrameDecoder, SchedulerStats,
+                        decode_message, encode_frames, refusal_frame)
+
 
 CPU_RESOURCE = 100  # In percentage
 CPU_IDLE_USAGE = 0  # In percentage
@@ -27,6 +29,8 @@ def get_arguments():
     parser.add_argument('--monitor_ip', default=MONITOR_IP)
     parser.add_argument('--monitor_client_port', default=MONITOR_CLIENT_PORT, type=int)
     parser.add_argument('--monitor_server_port', default=MONITOR_SERVER_PORT, type=int)
+    parser.add_argument('--accept_pickle', action='store_true',
+                        help='Accept pickle reports from the network, unsafe with untrusted peers')
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel.upper(), filename="/tmp/server_status/monitor.log", filemode='w')
     return args
@@ -86,6 +90,7 @@ class Monitor():
         self.count_lock = threading.Lock()
         self.client_log = {}
         self.server_log = {}
+        self.scheduler_log = {}
 
 
         self.results = []
@@ -94,6 +99,7 @@ class Monitor():
         self.ip = args.monitor_ip
         self.client_port = args.monitor_client_port
         self.server_port = args.monitor_server_port
+        self.accept_pickle = args.accept_pickle
 
     def wait_for_client(self):
         self.client_socket.listen(self.max_connection_number)
@@ -107,19 +113,31 @@ class Monitor():
     def serve_client(self, client, address):
         logging.info("Start serving client: {}".format(address))
         self.client_in()
+        decoder = FrameDecoder()
         while True:
             try:
-                client_report_data = client.recv(8192)
+                client_report_data = client.recv(RECEIVE_SIZE)
                 if client_report_data:
-                    request = pickle.loads(client_report_data)
-                    client_id = request.client_id
-                    logging.debug("Receive report from {}, report id: {}".format(client_id, request.request_id))
-                    if client_id not in self.client_log:
-                        self.client_log[client_id] = []
-                    self.client_log[client_id].append(request)
-                    reply_message = "Report from {} with id '{}' received".format(
-                        client_id, request.request_id)
-                    client.send(reply_message.encode())
+                    replies = []
+                    for frame in decoder.feed(client_report_data):
+                        refusal = refusal_frame(frame, self.accept_pickle)
+                        if refusal is not None:
+                            logging.warning("Client {} refused: {}".format(address, PICKLE_REFUSED))
+                            client.sendall(encode_frames(replies) + refusal)
+                            client.close()
+                            self.client_out()
+                            return False
+                        request = decode_message(frame, self.accept_pickle)
+                        client_id = request.client_id
+                        logging.debug("Receive report from {}, report id: {}".format(client_id, request.request_id))
+                        if client_id not in self.client_log:
+                            self.client_log[client_id] = []
+                        self.client_log[client_id].append(request)
+                        reply_message = "Report from {} with id '{}' received".format(
+                            client_id, request.request_id)
+                        replies.append(reply_message.encode())
+                    if replies:
+                        client.sendall(encode_frames(replies))
                 else:
                     logging.info("Client {} disconnected.".format(address))
                     break
@@ -161,19 +179,32 @@ class Monitor():
 
     def serve_server(self, server, address):
         logging.info("Start serving server: {}".format(address))
+        decoder = FrameDecoder()
         while True:
             try:
-                server_report_data = server.recv(1024)
+                server_report_data = server.recv(RECEIVE_SIZE)
                 if server_report_data:
-                    server_report = pickle.loads(server_report_data)
-                    server_id = server_report.server_id
-                    logging.debug("Server report from {}".format(server_id))
-                    if server_id not in self.server_log:
-                        self.server_log[server_id] = []
-                    self.server_log[server_id] += server_report.status_log
-                    reply = "Report from server {} received".format(
-                        server_id)
-                    server.send(reply.encode())
+                    replies = []
+                    for frame in decoder.feed(server_report_data):
+                        refusal = refusal_frame(frame, self.accept_pickle)
+                        if refusal is not None:
+                            logging.warning("Server {} refused: {}".format(address, PICKLE_REFUSED))
+                            server.sendall(encode_frames(replies) + refusal)
+                            server.close()
+                            return False
+                        server_report = decode_message(frame, self.accept_pickle)
+                        server_id = server_report.server_id
+                        logging.debug("Server report from {}".format(server_id))
+                        if server_id not in self.server_log:
+                            self.server_log[server_id] = []
+                        self.server_log[server_id] += server_report.status_log
+                        if server_report.scheduler_stats is not None:
+                            self.add_scheduler_stats(server_id, server_report.scheduler_stats)
+                        reply = "Report from server {} received".format(
+                            server_id)
+                        replies.append(reply.encode())
+                    if replies:
+                        server.sendall(encode_frames(replies))
                 else:
                     logging.info("Server {} disconnected".format(address))
                     break
@@ -182,6 +213,45 @@ class Monitor():
                 server.close()
                 return False
 
+    def add_scheduler_stats(self, server_id, stats):
+        if server_id not in self.scheduler_log:
+            self.scheduler_log[server_id] = SchedulerStats(stats.scheduler, 0, 0, 0, 0., 0., 0., 0.)
+        total = self.scheduler_log[server_id]
+        total.scheduler = stats.scheduler
+        total.dispatched += stats.dispatched
+        total.backfilled += stats.backfilled
+        total.aged += stats.aged
+        total.cpu_time += stats.cpu_time
+        total.period += stats.period
+        total.wait_total += stats.wait_total
+        total.wait_max = max(total.wait_max, stats.wait_max)
+
+    def analysis_scheduler(self):
+        for server_id, stats in self.scheduler_log.items():
+            info = "Server {} scheduler {}: dispatched={}, backfilled={}, aged={}, utilization={:.2f}%, wait mean={:.2f}ms, wait max={:.2f}ms".format(
+                server_id, stats.scheduler, stats.dispatched, stats.backfilled, stats.aged,
+                stats.get_utilization(), stats.get_wait_mean() * 1e3, stats.wait_max * 1e3)
+            print(info)
+            self.results.append(info)
+
+    def analysis_rejections(self, all_request):
+        # server side rejections counted by the servers, retries as reported by the clients with their requests
+        rejected_num = 0
+        for server_id, status_log in self.server_log.items():
+            if not status_log:
+                continue
+            status_log = sorted(status_log, key=lambda status: status.timestamp)
+            rejected = status_log[-1].rejected - status_log[0].rejected
+            rejected_num += rejected
+            info = "Server {} rejected {} requests".format(server_id, rejected)
+            print(info)
+            self.results.append(info)
+        retried = [request.retries for request in all_request if request.retries]
+        info = "All server rejected={}, retries={}, requests retried={} of {}".format(
+            rejected_num, sum(retried), len(retried), len(all_request))
+        print(info)
+        self.results.append(info)
+
     def is_valid_time(self, timestamp):
         start_time, end_time = self.get_valid_period()
         return start_time <= timestamp and timestamp <= end_time
@@ -204,11 +274,11 @@ class Monitor():
         self.results.append(stats.get_info())
         return stats
 
-    def analysis_server_log(self, status_log, name=""):
+    def analysis_server_log(self, status_log, name="", field="cpu_usage"):
         cpu_usage_list = []
         for status in status_log:
             if self.is_valid_time(status.timestamp):
-                cpu_usage_list.append(status.cpu_usage)
+                cpu_usage_list.append(getattr(status, field))
         stats = ListStats(cpu_usage_list, name)
         print(stats.get_info())
         self.results.append(stats.get_info())
@@ -248,6 +318,18 @@ class Monitor():
         self.results.append(info)
         return (wait_time_stats, cpu_usage_stats, time_usage_stats)
 
+    def expand_status_log(self, status_log):
+        # servers only report changed statuses, weight each one by how long it held
+        status_log = sorted(status_log, key=lambda status: status.timestamp)
+        expanded = []
+        for index, status in enumerate(status_log):
+            duration = LOG_FREQUENCY
+            if index + 1 < len(status_log):
+                # a longer gap means the server stopped reporting, not that the status held
+                duration = min((status_log[index + 1].timestamp - status.timestamp) * 1e3, HEARTBEAT)
+            expanded += [status] * max(int(round(duration / LOG_FREQUENCY)), 1)
+        return expanded
+
     def generate_log(self):
         try:
             all_requests = []
@@ -260,6 +342,7 @@ class Monitor():
 
             all_status_logs = []
             for server_id, status_log in self.server_log.items():
+                status_log = self.expand_status_log(status_log)
                 self.analysis_server_log(
                     status_log, "Server {} cpu usage".format(server_id))
                 all_status_logs += status_log
@@ -267,7 +350,22 @@ class Monitor():
             print()
             self.results.append('')
 
+            # latency summaries the servers measured themselves, over their last second
+            for server_id, status_log in self.server_log.items():
+                status_log = self.expand_status_log(status_log)
+                self.analysis_server_log(status_log, "Server {} p99 wait (ms)".format(server_id), "wait_p99")
+                self.analysis_server_log(status_log, "Server {} p99 service (ms)".format(server_id), "service_p99")
+                self.analysis_server_log(status_log, "Server {} completions/s".format(server_id), "rate")
+            print()
+            self.results.append('')
+
+            if self.scheduler_log:
+                self.analysis_scheduler()
+                print()
+                self.results.append('')
+
             self.analysis_effciency(all_requests)
+            self.analysis_rejections(all_requests)
 
             print("----------------")
             with open(REPORT_FILE_PATH, 'w') as f:
@@ -282,6 +380,7 @@ class Monitor():
         self.active_client_num = 0
         self.client_log = {}
         self.server_log = {}
+        self.scheduler_log = {}
         
         self.results = []
 
@@ -0,0 +1,138 @@
+import zlib
+
+from collections import deque
+
+MAX_ECMP_PATHS = 8  # equal cost paths kept per switch pair
+
+
+class NetworkTopology():
+    """
+    Link state of the switch fabric and host attachment points.
+
+    Links come from discovery events. Shortest paths from a switch are found
+    with one BFS that keeps every equal cost predecessor, and the resulting
+    paths are cached per switch pair until a link changes, so repeated flows
+    between the same edge switches cost a dict lookup. Every directed link
+    carries the number of flows routed over it, used to pick the least
+    congested equal cost path and to score servers by path congestion.
+    """
+
+    def __init__(self, max_paths=MAX_ECMP_PATHS):
+        self.max_paths = max_paths
+        self.adjacency = {}  # dpid -> {neighbor dpid: out port}
+        self.switch_ports = set()  # (dpid, port) facing another switch
+        self.locations = {}  # host ip -> (dpid, port)
+        self.link_load = {}  # (dpid, neighbor dpid) -> flows routed over the link
+        self.bfs_cache = {}  # src dpid -> (distance, predecessors)
+        self.route_cache = {}  # (src dpid, dst dpid) -> list of paths (tuples of dpids)
+
+    def invalidate(self):
+        self.bfs_cache = {}
+        self.route_cache = {}
+
+    def add_link(self, dpid1, port1, dpid2, port2):
+        self.adjacency.setdefault(dpid1, {})[dpid2] = port1
+        self.switch_ports.add((dpid1, port1))
+        self.switch_ports.add((dpid2, port2))
+        # a port we took for a host port turned out to lead to a switch
+        for ip, location in list(self.locations.items()):
+            if location in ((dpid1, port1), (dpid2, port2)):
+                del self.locations[ip]
+        self.invalidate()
+
+    def remove_link(self, dpid1, port1, dpid2, port2):
+        neighbors = self.adjacency.get(dpid1, {})
+        if neighbors.get(dpid2) == port1:
+            del neighbors[dpid2]
+        self.switch_ports.discard((dpid1, port1))
+        self.invalidate()
+
+    def is_multi_switch(self):
+        return any(self.adjacency.values())
+
+    def learn_host(self, ip, dpid, port):
+        if (dpid, port) in self.switch_ports:
+            return False
+        if self.locations.get(ip) == (dpid, port):
+            return False
+        self.locations[ip] = (dpid, port)
+        return True
+
+    def location(self, ip):
+        return self.locations.get(ip)
+
+    def bfs(self, src):
+        if src not in self.bfs_cache:
+            distance = {src: 0}
+            predecessors = {src: []}
+            queue = deque([src])
+            while queue:
+                dpid = queue.popleft()
+                for neighbor in self.adjacency.get(dpid, {}):
+                    if neighbor not in distance:
+                        distance[neighbor] = distance[dpid] + 1
+                        predecessors[neighbor] = [dpid]
+                        queue.append(neighbor)
+                    elif distance[neighbor] == distance[dpid] + 1:
+                        predecessors[neighbor].append(dpid)
+            self.bfs_cache[src] = (distance, predecessors)
+        return self.bfs_cache[src]
+
+    def shortest_paths(self, src, dst):
+        key = (src, dst)
+        if key not in self.route_cache:
+            distance, predecessors = self.bfs(src)
+            paths = []
+            if dst in distance:
+                # walk the predecessor dag back from dst, bounded by max_paths
+                stack = [(dst, (dst,))]
+                while stack and len(paths) < self.max_paths:
+                    dpid, suffix = stack.pop()
+                    if dpid == src:
+                        paths.append(suffix)
+                        continue
+                    for predecessor in predecessors[dpid]:
+                        stack.append((predecessor, (predecessor,) + suffix))
+            self.route_cache[key] = paths
+        return self.route_cache[key]
+
+    def links_of(self, path):
+        return list(zip(path, path[1:]))
+
+    def path_cost(self, path):
+        return max((self.link_load.get(link, 0) for link in self.links_of(path)), default=0)
+
+    def pick_path(self, src, dst, flow_key):
+        paths = self.shortest_paths(src, dst)
+        if not paths:
+            return None
+        lowest = min(self.path_cost(path) for path in paths)
+        candidates = [path for path in paths if self.path_cost(path) == lowest]
+        # spread ties over the equal cost paths by flow
+        return candidates[zlib.crc32(str(flow_key).encode()) % len(candidates)]
+
+    def congestion(self, src, dst):
+        """
+        Load of the busiest link on the best path, None if dst is unreachable.
+        """
+        paths = self.shortest_paths(src, dst)
+        if not paths:
+            return None
+        return min(self.path_cost(path) for path in paths)
+
+    def hops(self, path, host_port):
+        # (dpid, out port) for every switch on the path, the last one leads to the host
+        hops = []
+        for dpid, next_dpid in self.links_of(path):
+            hops.append((dpid, self.adjacency[dpid][next_dpid]))
+        hops.append((path[-1], host_port))
+        return hops
+
+    def add_load(self, path, delta):
+        for link in self.links_of(path):
+            self.link_load[link] = self.link_load.get(link, 0) + delta
+            if self.link_load[link] <= 0:
+                del self.link_load[link]
+
+    def uses_link(self, path, dpid1, dpid2):
+        return (dpid1, dpid2) in self.links_of(path)
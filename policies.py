@@ -0,0 +1,440 @@
+import importlib
+import random
+
+from consistentHash import hash_key
+
+try:
+    import numpy
+except ImportError:
+    # scored policies fall back to a python loop over the same rows
+    numpy = None
+
+INITIAL_ROWS = 64  # server rows allocated up front, doubled when full
+TIE_BREAK = 1e-6  # expected wait (in s) one percent of cpu usage is worth
+SCORE_WEIGHTS = "cpu:1,connections:1,queue:10"
+
+# name -> policy class
+POLICIES = {}
+# historical --policy=N values -> name
+POLICY_NUMBERS = {}
+
+
+def register_policy(cls):
+    """
+    Class decorator making a policy selectable by its name, and by its number if it has one.
+    """
+    POLICIES[cls.name] = cls
+    if cls.number is not None:
+        POLICY_NUMBERS[cls.number] = cls.name
+    return cls
+
+
+def policy_class(policy):
+    name = str(policy)
+    if name.isdigit():
+        name = POLICY_NUMBERS.get(int(name), name)
+    if name not in POLICIES:
+        raise ValueError("unknown policy {}, available: {}".format(policy, ", ".join(sorted(POLICIES))))
+    return POLICIES[name]
+
+
+def load_policy_modules(modules):
+    # comma separated modules that register their own policies when imported
+    for module in str(modules or "").split(","):
+        if module.strip():
+            importlib.import_module(module.strip())
+
+
+class Policy():
+    """
+    Base class of the load balancing policies.
+
+    A policy is created once with the controller and select() is called for
+    every new client flow with the controller's active server list non empty.
+    The hooks let a policy keep its own state up to date instead of scanning
+    the controller's tables on every decision: on_status and on_load run on
+    the status thread with the controller's status lock held, on_flow_added
+    and on_flow_removed run under the same lock, on_servers_changed runs on
+    the POX thread after a server joined, left, failed or recovered.
+    """
+
+    name = None
+    number = None
+    # reads the servers' status, the controller then starts the status thread
+    uses_status = False
+    # assign_prefixes mode for proactive prefix rules, None if the policy needs every flow
+    prefix_mode = None
+    # needs the controller's consistent hashing table
+    uses_maglev = False
+
+    def __init__(self, controller):
+        self.controller = controller
+
+    def select(self, client_ip=None):
+        raise NotImplementedError
+
+    def on_status(self, ip, status):
+        pass
+
+    def on_load(self, ip, load):
+        # load is the estimated cpu usage, None once the server is stale or down
+        pass
+
+    def on_flow_added(self, entry):
+        pass
+
+    def on_flow_removed(self, entry):
+        pass
+
+    def on_servers_changed(self, active_servers):
+        pass
+
+    def sample_servers(self, num):
+        # pick num distinct servers with expected O(num) work, independent of the pool size
+        servers = self.controller.active_servers
+        if num >= len(servers):
+            return list(servers)
+        picked = set()
+        while len(picked) < num:
+            picked.add(random.randrange(len(servers)))
+        return [servers[index] for index in picked]
+
+    def least_loaded(self):
+        ip, _ = self.controller.load_index.peek()
+        return ip
+
+
+@register_policy
+class RandomPolicy(Policy):
+    name = "random"
+    number = 1
+    prefix_mode = "random"
+
+    def select(self, client_ip=None):
+        return random.choice(self.controller.active_servers)
+
+
+@register_policy
+class RoundRobinPolicy(Policy):
+    name = "roundrobin"
+    number = 2
+    prefix_mode = "roundrobin"
+
+    def __init__(self, controller):
+        Policy.__init__(self, controller)
+        self.index = 0
+
+    def select(self, client_ip=None):
+        servers = self.controller.active_servers
+        if self.index >= len(servers):
+            self.index = 0
+        ip = servers[self.index]
+        self.index += 1
+        return ip
+
+    def on_servers_changed(self, active_servers):
+        if self.index >= len(active_servers):
+            self.index = 0
+
+
+@register_policy
+class ResourcePolicy(Policy):
+    name = "resource"
+    number = 3
+    uses_status = True
+
+    def select(self, client_ip=None):
+        with self.controller.status_lock:
+            return self.least_loaded()
+
+
+@register_policy
+class LeastConnectionPolicy(Policy):
+    name = "leastconnection"
+    number = 4
+
+    def select(self, client_ip=None):
+        with self.controller.status_lock:
+            ip, _ = self.controller.connection_index.peek()
+        return ip
+
+
+@register_policy
+class ChoicesPolicy(Policy):
+    # power of d choices, the least loaded of d sampled servers
+    name = "choices"
+    number = 5
+    uses_status = True
+
+    def select(self, client_ip=None):
+        controller = self.controller
+        candidates = self.sample_servers(controller.choices)
+        with controller.status_lock:
+            candidates = [candidate for candidate in candidates if candidate in controller.server_status]
+            if not candidates:
+                # only stale servers sampled, take the least loaded fresh one
+                return self.least_loaded()
+            return min(candidates, key=lambda candidate: (
+                controller.server_status[candidate], controller.connection_index.get(candidate, 0)))
+
+
+@register_policy
+class HashPolicy(Policy):
+    # consistent hashing on the client ip
+    name = "hash"
+    number = 6
+    prefix_mode = "hash"
+    uses_maglev = True
+
+    def select(self, client_ip=None):
+        active_servers = self.controller.active_servers
+        server_ip = self.controller.maglev.lookup(client_ip)
+        if server_ip not in active_servers:
+            # the table of the current server list is still being built
+            server_ip = active_servers[hash_key(client_ip) % len(active_servers)]
+        return server_ip
+
+
+@register_policy
+class PathAwarePolicy(Policy):
+    # sampled servers scored by cpu usage and path congestion
+    name = "pathaware"
+    number = 7
+    uses_status = True
+
+    def select(self, client_ip=None):
+        controller = self.controller
+        topology = controller.topology
+        candidates = self.sample_servers(controller.choices)
+        client_location = topology.location(client_ip)
+        ip, best_score = None, None
+        with controller.status_lock:
+            for candidate in candidates:
+                if candidate not in controller.server_status:
+                    continue
+                congestion = 0
+                server_location = topology.location(candidate)
+                if client_location is not None and server_location is not None:
+                    congestion = topology.congestion(client_location[0], server_location[0])
+                    if congestion is None:
+                        continue
+                score = controller.server_status[candidate] + controller.path_weight * congestion
+                if best_score is None or score < best_score:
+                    ip, best_score = candidate, score
+            if ip is None:
+                ip = self.least_loaded()
+        return ip
+
+
+class ScoredPolicy(Policy):
+    """
+    Base class of policies choosing the server with the lowest score over
+    several metrics.
+
+    Every server ever seen owns a row of a servers x metrics matrix kept in
+    contiguous NumPy arrays next to a usable mask, and the hooks write single
+    cells as statuses and flows come in. A decision is then one vectorized
+    score_array() and argmin over the pool instead of a Python loop over dicts.
+    Without NumPy the same rows are lists and score_row() is called per row.
+    Rows are never freed, servers that leave the pool are only masked out.
+    """
+
+    uses_status = True
+    metrics = ("cpu", "connections", "queue", "in_flight", "wait", "service")
+
+    def __init__(self, controller):
+        Policy.__init__(self, controller)
+        self.column = {metric: index for index, metric in enumerate(self.metrics)}
+        self.rows = {}  # ip -> row
+        self.ips = []  # row -> ip
+        self.values = self.new_values(INITIAL_ROWS)
+        self.active = self.new_mask(INITIAL_ROWS)  # in the controller's active servers
+        self.fresh = self.new_mask(INITIAL_ROWS)  # has a load estimate
+        for ip in controller.active_servers:
+            self.active[self.row(ip)] = True
+        for ip, load in controller.server_status.items():
+            self.on_load(ip, load)
+
+    def new_values(self, size):
+        if numpy is not None:
+            return numpy.zeros((size, len(self.metrics)))
+        return [[0.] * len(self.metrics) for _ in range(size)]
+
+    def new_mask(self, size):
+        if numpy is not None:
+            return numpy.zeros(size, dtype=bool)
+        return [False] * size
+
+    def grow(self):
+        size = len(self.active)
+        if numpy is not None:
+            self.values = numpy.concatenate((self.values, self.new_values(size)))
+            self.active = numpy.concatenate((self.active, self.new_mask(size)))
+            self.fresh = numpy.concatenate((self.fresh, self.new_mask(size)))
+        else:
+            self.values.extend(self.new_values(size))
+            self.active.extend(self.new_mask(size))
+            self.fresh.extend(self.new_mask(size))
+
+    def row(self, ip):
+        row = self.rows.get(ip)
+        if row is None:
+            if len(self.ips) == len(self.active):
+                self.grow()
+            row = self.rows[ip] = len(self.ips)
+            self.ips.append(ip)
+        return row
+
+    def set(self, ip, metric, value):
+        self.values[self.row(ip)][self.column[metric]] = value
+
+    def add(self, ip, metric, delta):
+        self.values[self.row(ip)][self.column[metric]] += delta
+
+    def on_status(self, ip, status):
+        self.set(ip, "queue", status.queue_length)
+        self.set(ip, "in_flight", status.in_flight)
+        # p99 in ms, measured by the server
+        self.set(ip, "wait", status.wait_p99)
+        self.set(ip, "service", status.service_p99)
+
+    def on_load(self, ip, load):
+        row = self.row(ip)
+        self.fresh[row] = load is not None
+        if load is not None:
+            self.values[row][self.column["cpu"]] = load
+
+    def on_flow_added(self, entry):
+        self.set(entry.server_ip, "connections", self.controller.flow_table.active_flows(entry.server_ip))
+
+    def on_flow_removed(self, entry):
+        self.set(entry.server_ip, "connections", self.controller.flow_table.active_flows(entry.server_ip))
+
+    def on_servers_changed(self, active_servers):
+        with self.controller.status_lock:
+            for row in range(len(self.ips)):
+                self.active[row] = False
+            for ip in active_servers:
+                self.active[self.row(ip)] = True
+
+    def score_array(self, values):
+        """
+        Scores of all rows from the rows x metrics array, inf for unusable rows.
+        """
+        raise NotImplementedError
+
+    def score_row(self, values):
+        """
+        Score of one row from its list of metrics, None when unusable.
+        """
+        raise NotImplementedError
+
+    def best_row(self):
+        size = len(self.ips)
+        if numpy is not None:
+            scores = self.score_array(self.values[:size])
+            scores[~(self.active[:size] & self.fresh[:size])] = numpy.inf
+            row = int(numpy.argmin(scores)) if size else 0
+            if not size or scores[row] == numpy.inf:
+                return None
+            return row
+        best, best_score = None, None
+        for row in range(size):
+            if not (self.active[row] and self.fresh[row]):
+                continue
+            score = self.score_row(self.values[row])
+            if score is not None and (best_score is None or score < best_score):
+                best, best_score = row, score
+        return best
+
+    def select(self, client_ip=None):
+        with self.controller.status_lock:
+            row = self.best_row()
+            if row is None:
+                # every server is stale or unusable, take the least loaded fresh one
+                return self.least_loaded()
+            self.on_selected(row)
+            return self.ips[row]
+
+    def on_selected(self, row):
+        pass
+
+
+@register_policy
+class ExpectedWaitPolicy(ScoredPolicy):
+    """
+    Least expected wait before a new request runs, cpu usage breaks ties.
+
+    A request runs right away on a server with an empty queue and enough
+    free cpu, otherwise the queue ahead of it and itself drain as the
+    requests in flight complete. Servers with max_queue queued requests are
+    saturated and skipped. Requests sent since the last status count as
+    queued, so a burst of decisions does not pile onto one server.
+    """
+
+    name = "expectedwait"
+    number = 8
+
+    def expected_wait(self, load, queue_length, in_flight):
+        controller = self.controller
+        if queue_length == 0 and load + controller.request_cpu <= 100:
+            return 0.
+        return (queue_length + 1) * controller.service_time / max(in_flight, 1)
+
+    def score_array(self, values):
+        controller = self.controller
+        load = values[:, self.column["cpu"]]
+        queue_length = values[:, self.column["queue"]]
+        in_flight = values[:, self.column["in_flight"]]
+        immediate = (queue_length == 0) & (load + controller.request_cpu <= 100)
+        wait = (queue_length + 1) * controller.service_time / numpy.maximum(in_flight, 1)
+        scores = numpy.where(immediate, 0., wait) + TIE_BREAK * load
+        scores[queue_length >= controller.max_queue] = numpy.inf
+        return scores
+
+    def score_row(self, values):
+        load = values[self.column["cpu"]]
+        queue_length = values[self.column["queue"]]
+        if queue_length >= self.controller.max_queue:
+            return None
+        return self.expected_wait(load, queue_length, values[self.column["in_flight"]]) + TIE_BREAK * load
+
+    def on_selected(self, row):
+        self.values[row][self.column["queue"]] += 1
+
+
+@register_policy
+class WeightedPolicy(ScoredPolicy):
+    # lowest weighted sum of the metrics, weights from --score_weights
+    name = "weighted"
+    number = 9
+
+    def __init__(self, controller):
+        ScoredPolicy.__init__(self, controller)
+        weights = parse_weights(getattr(controller, "score_weights", SCORE_WEIGHTS))
+        for metric in weights:
+            if metric not in self.column:
+                raise ValueError("unknown metric {}, available: {}".format(metric, ", ".join(self.metrics)))
+        self.weights = [weights.get(metric, 0.) for metric in self.metrics]
+        if numpy is not None:
+            self.weights = numpy.array(self.weights)
+
+    def score_array(self, values):
+        return values @ self.weights
+
+    def score_row(self, values):
+        return sum(weight * value for weight, value in zip(self.weights, values))
+
+    def on_selected(self, row):
+        # queued until the next status says otherwise
+        self.values[row][self.column["queue"]] += 1
+
+
+def parse_weights(weights):
+    # "cpu:1,queue:10" -> {"cpu": 1.0, "queue": 10.0}
+    parsed = {}
+    for item in str(weights).split(","):
+        if item.strip():
+            metric, weight = item.split(":")
+            parsed[metric.strip()] = float(weight)
+    return parsed
@@ -0,0 +1,67 @@
+import ipaddress
+import math
+import random
+
+PREFIXES_PER_SERVER = 4  # finer splits follow weights more closely but cost more rules
+
+
+def weighted_sequence(servers, weights, length):
+    # smooth weighted round robin, spreads every server evenly over the sequence
+    current = {server: 0. for server in servers}
+    total = sum(weights.get(server, 1) for server in servers)
+    sequence = []
+    for _ in range(length):
+        for server in servers:
+            current[server] += weights.get(server, 1)
+        picked = max(servers, key=lambda server: current[server])
+        current[picked] -= total
+        sequence.append(picked)
+    return sequence
+
+
+def split_network(network, server_num, prefixes_per_server=PREFIXES_PER_SERVER):
+    network = ipaddress.ip_network(str(network))
+    host_bits = network.max_prefixlen - network.prefixlen
+    extra_bits = math.ceil(math.log2(max(server_num * prefixes_per_server, 1)))
+    extra_bits = min(extra_bits, host_bits)
+    return list(network.subnets(prefixlen_diff=extra_bits))
+
+
+def assign_prefixes(network, servers, weights, mode, lookup=None,
+                    prefixes_per_server=PREFIXES_PER_SERVER):
+    """
+    Split the client network into source prefixes and give each to a server.
+
+    mode is "roundrobin" (weighted interleaving), "random" (the same shares
+    in shuffled order) or "hash" (lookup(prefix base address) picks the
+    server). Sibling prefixes that end up on the same server are merged so
+    the switch gets as few rules as possible. Returns {prefix: server}.
+    """
+    if not servers:
+        return {}
+    subnets = split_network(network, len(servers), prefixes_per_server)
+    if mode == "hash":
+        owners = [lookup(str(subnet.network_address)) for subnet in subnets]
+    else:
+        owners = weighted_sequence(servers, weights, len(subnets))
+        if mode == "random":
+            random.shuffle(owners)
+    subnets_by_server = {}
+    for subnet, owner in zip(subnets, owners):
+        subnets_by_server.setdefault(owner, []).append(subnet)
+    assignment = {}
+    for owner, owned in subnets_by_server.items():
+        for prefix in ipaddress.collapse_addresses(owned):
+            assignment[str(prefix)] = owner
+    return assignment
+
+
+def covering_network(ips):
+    # smallest prefix containing every address, the space the prefix rules have to cover
+    addresses = [ipaddress.ip_address(str(ip)) for ip in ips]
+    if not addresses:
+        return None
+    network = ipaddress.ip_network(addresses[0])
+    while not all(address in network for address in addresses):
+        network = network.supernet()
+    return network
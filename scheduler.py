@@ -0,0 +1,165 @@
+import heapq
+import math
+import time
+
+from collections import deque
+
+SCHEDULER = "fifo"
+MAX_WAIT = 2000  # In ms, an older request blocks every other one until it fits, 0 never
+CPU_BUCKETS = 101  # one bucket per percent of cpu usage, 0 to 100
+
+
+class WaitingRequest():
+    __slots__ = ("item", "request", "sequence", "enqueue_time", "bucket", "done")
+
+    def __init__(self, item, request, sequence, enqueue_time):
+        self.item = item
+        self.request = request
+        self.sequence = sequence
+        self.enqueue_time = enqueue_time
+        self.bucket = min(max(int(math.ceil(request.cpu_usage)), 0), CPU_BUCKETS - 1)
+        self.done = False
+
+
+class Scheduler():
+    """
+    Waiting requests of a server and the order they start in.
+
+    Requests are bucketed by the percent of cpu they need, each bucket is a
+    heap ordered by key(), so picking the best request that fits the free
+    cpu looks at the top of at most CPU_BUCKETS heaps, whatever the queue
+    length. Arrival order is kept next to the buckets: once the oldest
+    request waited max_wait it is the only one allowed to start, which lets
+    the cpu drain for it and bounds how long any request can starve.
+    """
+
+    name = None
+
+    def __init__(self, max_wait=MAX_WAIT):
+        self.max_wait = float(max_wait) * 1e-3
+        self.buckets = [[] for _ in range(CPU_BUCKETS)]
+        self.arrivals = deque()  # WaitingRequest by arrival, started ones are skipped lazily
+        self.sequence = 0
+        self.size = 0
+        self.aged_num = 0  # requests started because they aged
+        self.backfilled_num = 0  # requests started ahead of an older one
+
+    def __len__(self):
+        return self.size
+
+    def key(self, waiting):
+        return waiting.sequence
+
+    def add(self, item, request, now=None):
+        waiting = WaitingRequest(item, request, self.sequence, now or time.time())
+        self.sequence += 1
+        heapq.heappush(self.buckets[waiting.bucket], (self.key(waiting), waiting.sequence, waiting))
+        self.arrivals.append(waiting)
+        self.size += 1
+
+    def oldest(self):
+        while self.arrivals and self.arrivals[0].done:
+            self.arrivals.popleft()
+        return self.arrivals[0] if self.arrivals else None
+
+    def pop(self, free_cpu, now=None):
+        """
+        Item of the next request to start with free_cpu available, None if none should start yet.
+        """
+        oldest = self.oldest()
+        if oldest is None:
+            return None
+        if self.max_wait > 0 and (now or time.time()) - oldest.enqueue_time >= self.max_wait:
+            if oldest.request.cpu_usage > free_cpu:
+                return None
+            self.aged_num += 1
+            return self.start(oldest)
+        waiting = self.choose(oldest, free_cpu)
+        if waiting is None:
+            return None
+        if waiting is not oldest:
+            self.backfilled_num += 1
+        return self.start(waiting)
+
+    def choose(self, oldest, free_cpu):
+        raise NotImplementedError
+
+    def top(self, bucket):
+        # best live request of a bucket, dropping the started ones on the way
+        heap = self.buckets[bucket]
+        while heap and heap[0][2].done:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+
+    def fitting_buckets(self, free_cpu):
+        # buckets hold the usages rounded up, the one of free_cpu itself may still hold requests that fit
+        return range(min(int(math.ceil(free_cpu)), CPU_BUCKETS - 1), -1, -1)
+
+    def fitting(self, bucket, free_cpu):
+        # best live request of a bucket that fits free_cpu
+        waiting = self.top(bucket)
+        if waiting is None or waiting.request.cpu_usage <= free_cpu:
+            return waiting
+        # only the bucket of a fractional free_cpu gets here, scan it
+        fitting = [entry for entry in self.buckets[bucket]
+                   if not entry[2].done and entry[2].request.cpu_usage <= free_cpu]
+        return min(fitting)[2] if fitting else None
+
+    def start(self, waiting):
+        waiting.done = True
+        self.size -= 1
+        # the started request is either on top of its bucket or skipped later
+        self.top(waiting.bucket)
+        self.oldest()
+        return waiting.item
+
+
+class FifoScheduler(Scheduler):
+    # strict arrival order, the head blocks the queue until it fits
+    name = "fifo"
+
+    def choose(self, oldest, free_cpu):
+        if oldest.request.cpu_usage > free_cpu:
+            return None
+        return oldest
+
+
+class BackfillScheduler(Scheduler):
+    # the head if it fits, else the oldest of the largest requests that fit
+    name = "backfill"
+
+    def choose(self, oldest, free_cpu):
+        if oldest.request.cpu_usage <= free_cpu:
+            return oldest
+        for bucket in self.fitting_buckets(free_cpu):
+            waiting = self.fitting(bucket, free_cpu)
+            if waiting is not None:
+                return waiting
+        return None
+
+
+class SjfScheduler(Scheduler):
+    # shortest time usage first among the requests that fit
+    name = "sjf"
+
+    def key(self, waiting):
+        return float(waiting.request.time_usage)
+
+    def choose(self, oldest, free_cpu):
+        best = None
+        for bucket in self.fitting_buckets(free_cpu):
+            waiting = self.fitting(bucket, free_cpu)
+            if waiting is None:
+                continue
+            if best is None or (self.key(waiting), waiting.sequence) < (self.key(best), best.sequence):
+                best = waiting
+        return best
+
+
+SCHEDULERS = {scheduler.name: scheduler for scheduler in (FifoScheduler, BackfillScheduler, SjfScheduler)}
+
+
+def create_scheduler(name=SCHEDULER, max_wait=MAX_WAIT):
+    if name not in SCHEDULERS:
+        raise ValueError("unknown scheduler {}, available: {}".format(name, ", ".join(sorted(SCHEDULERS))))
+    return SCHEDULERS[name](max_wait)
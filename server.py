@@ -1,13 +1,23 @@
 import argparse
+import asyncio
 import logging
 import multiprocessing
 import os
 import pickle
+import queue
+import resource
 import socket
+import threading
 import time
 import traceback
 
-from commonData import SenderSocket, ServerStatus, ServerReport
+from commonData import (HEARTBEAT, LOG_FREQUENCY, LOG_MAX_PERIOD, PICKLE_REFUSED, RECEIVE_SIZE, FrameDecoder,
+                        Rejection, SchedulerStats, SenderSocket, ServerStatus, ServerReport, add_wire_arguments,
+                        decode_message, encode_frame, encode_frames, encode_message, message_format, refusal_frame)
+from cpuBurner import BurnPool, CpuMeter, burn, init_burn_worker, parse_cores
+from latencyStats import Histogram, LatencyWindow
+from scheduler import MAX_WAIT, SCHEDULER, SCHEDULERS, create_scheduler
+from statusBoard import StatusBoard
 
 CPU_RESOURCE = 100  # In percentage
 CPU_IDLE_USAGE = 0  # In percentage
@@ -18,9 +28,49 @@ MONITOR_IP = "127.0.2.1"
 MONITOR_PORT = 6001
 CONTROLLER_IP = "10.0.1.1"
 CONTROLLER_PORT = 7000
-LOG_FREQUENCY = 20  # In ms
-LOG_BATCH = 1
+LOG_BATCH = 10  # samples per report sent to the listeners
+LOG_BATCH_DELAY = 100  # In ms, longest a sample waits for its batch
+CPU_CHANGE_THRESHOLD = 5  # In percentage, smaller cpu changes are not reported
+RECONNECT_DELAY = 1  # In s, between two attempts to reach a lost listener
 LOG_FOLDER_PATH = "/tmp/server_status/"
+STATUS_MODE = "board"  # "board" for the shared memory status board, "file" for pickle files
+# "thread" for a pool of worker threads, "asyncio" for a single event loop,
+# "process" for a process per connection and request
+ENGINE = "thread"
+# Default workers per core the server may use, the cpu budget (CPU_RESOURCE) is spread over those cores.
+# A sleeping request costs no cpu, its worker only bounds the requests in flight, so there are several per core.
+# A burning request keeps one core busy for part of every slice, two per core let a core burn for one while
+# the other sleeps out its slice, more only time share the core.
+SLEEP_WORKERS_PER_CORE = 8
+BURN_WORKERS_PER_CORE = 2
+ASYNC_BACKLOG = 4096  # pending connections of the asyncio engine
+# "sleep" only waits time_usage, "burn" keeps cores busy for the requested cpu share
+EXECUTION = "sleep"
+ADMISSION_DEPTH = 256  # waiting requests from which new ones are rejected, 0 never
+ADMISSION_WAIT = 0  # In ms, expected wait from which new requests are rejected, 0 never
+RETRY_AFTER = 100  # In ms, shortest retry delay given to a rejected request
+MAX_RETRY_AFTER = 5000  # In ms
+SCHEDULE_TIMEOUT = 10  # In ms, longest a blocked scheduler waits before checking the aging again
+
+
+def default_worker_number(execution, cores):
+    workers_per_core = BURN_WORKERS_PER_CORE if execution == "burn" else SLEEP_WORKERS_PER_CORE
+    return workers_per_core * len(cores)
+
+
+def next_sample(period, since_reported, log_frequency=LOG_FREQUENCY, log_max_period=LOG_MAX_PERIOD,
+                heartbeat=HEARTBEAT):
+    """
+    Period until the next sample and whether to report the current one.
+    since_reported is the ms since the last reported sample, None when the
+    current one changed. An unchanged sample is only reported when waiting
+    for the next would leave more than the heartbeat between two reports.
+    """
+    if since_reported is None:
+        return log_frequency, True
+    period = min(period * 2, log_max_period)
+    return period, since_reported + period > heartbeat
+
 
 def get_arguments():
     parser = argparse.ArgumentParser()
@@ -30,6 +80,28 @@ def get_arguments():
     parser.add_argument('--server_port', default=SERVER_PORT, type=int)
     parser.add_argument('--monitor_ip', default=MONITOR_IP)
     parser.add_argument('--monitor_port', default=MONITOR_PORT, type=int)
+    parser.add_argument('--status_mode', default=STATUS_MODE, choices=["board", "file"])
+    parser.add_argument('--engine', default=ENGINE, choices=["thread", "asyncio", "process"])
+    parser.add_argument('--workers', default=None, type=int,
+                        help='Worker threads or burning processes, the most requests running at once, default {} '
+                        'per core for sleep execution and {} for burn'.format(SLEEP_WORKERS_PER_CORE,
+                                                                            BURN_WORKERS_PER_CORE))
+    parser.add_argument('--scheduler', default=SCHEDULER, choices=sorted(SCHEDULERS),
+                        help='Order waiting requests start in, default={}'.format(SCHEDULER))
+    parser.add_argument('--max_wait', default=MAX_WAIT, type=float,
+                        help='In ms, a request waiting longer blocks the others until it starts, 0 never, default={}'
+                        .format(MAX_WAIT))
+    parser.add_argument('--admission_depth', default=ADMISSION_DEPTH, type=int,
+                        help='Waiting requests from which new ones are rejected, 0 never, default={}'.format(
+                            ADMISSION_DEPTH))
+    parser.add_argument('--admission_wait', default=ADMISSION_WAIT, type=float,
+                        help='In ms, expected wait from which new requests are rejected, 0 never, default={}'.format(
+                            ADMISSION_WAIT))
+    parser.add_argument('--execution', default=EXECUTION, choices=["sleep", "burn"],
+                        help='How requests use their time, default={}'.format(EXECUTION))
+    parser.add_argument('--cores', default=None,
+                        help='Cores the burning workers are pinned to, e.g. 0,2-3, default every allowed core')
+    add_wire_arguments(parser)
     args = parser.parse_args()
     logging.basicConfig(level=args.loglevel.upper(),filename="/tmp/server_status/server_{}.log".format(args.server_ip), filemode='w')
     return args
@@ -51,7 +123,11 @@ class Server():
             CONTROLLER_IP, CONTROLLER_PORT, "{}-controller".format(self.ip))
         self.status_log = []
         self.log_frequency = LOG_FREQUENCY
+        self.log_max_period = LOG_MAX_PERIOD
         self.log_batch = LOG_BATCH
+        self.log_batch_delay = LOG_BATCH_DELAY
+        self.heartbeat = HEARTBEAT
+        self.cpu_change_threshold = CPU_CHANGE_THRESHOLD
         self.log_tmp_file_path = LOG_FOLDER_PATH + self.server_id + ".tmp"
         self.log_file_path = LOG_FOLDER_PATH + self.server_id
         if not os.path.exists(LOG_FOLDER_PATH):
@@ -60,17 +136,67 @@ class Server():
         self.max_cpu_resource = CPU_RESOURCE
         self.max_connection_number = MAX_CONNECTION_NUMBER
 
-        self.request_manager = multiprocessing.Manager()
-        self.request_queue = self.request_manager.Queue()
-        self.lock = multiprocessing.Lock()
+        # shared with the status reporting process
         self.cpu_usage = multiprocessing.Value('d', CPU_IDLE_USAGE)
-        self.cpu_condition = multiprocessing.Condition()
+        # requests received but not started, and requests being processed
+        self.queue_length = multiprocessing.Value('i', 0)
+        self.in_flight = multiprocessing.Value('i', 0)
+        # cpu usage integrated over time, both guarded by the cpu usage lock
+        self.cpu_time = multiprocessing.Value('d', 0., lock=False)
+        self.cpu_time_stamp = multiprocessing.Value('d', time.time(), lock=False)
+        # scheduler counters since the start, the longest wait since the last report
+        self.schedule_lock = multiprocessing.Lock()
+        self.dispatched = multiprocessing.Value('q', 0, lock=False)
+        self.backfilled = multiprocessing.Value('q', 0, lock=False)
+        self.aged = multiprocessing.Value('q', 0, lock=False)
+        self.wait_total = multiprocessing.Value('d', 0., lock=False)
+        self.wait_max = multiprocessing.Value('d', 0., lock=False)
+        # cpu time really burnt by the requests, the reported cpu usage in burn execution
+        self.burn_time = multiprocessing.Value('d', 0.)
+        self.burn_core_counter = multiprocessing.Value('i', 0)
+        self.burn_pool = None
+        self.cpu_meter = None
+        # queue waits are recorded by the dispatcher alone, service times by every worker thread in its own row,
+        # the processes of the process engine share a single row under a lock
+        self.wait_histogram = Histogram()
+        self.service_histogram = Histogram(self.worker_number if self.engine == "thread" else 1)
+        self.service_lock = multiprocessing.Lock()
+        self.latency_window = None
+        # requests turned away, and the completions/s the admission estimates waits with
+        self.rejected = multiprocessing.Value('q', 0)
+        self.completion_rate = multiprocessing.Value('d', 0., lock=False)
+        if self.engine == "process":
+            self.request_manager = multiprocessing.Manager()
+            self.request_queue = self.request_manager.Queue()
+            self.cpu_condition = multiprocessing.Condition()
+        elif self.engine == "asyncio":
+            # created in the event loop
+            self.request_queue = None
+            self.cpu_condition = None
+            self.request_tasks = set()
+        else:
+            # connections, dispatcher and workers share the process, no pickling between them
+            self.request_queue = queue.Queue()
+            self.cpu_condition = threading.Condition()
+            # requests handed to the workers, never more than there are idle workers
+            self.work_queue = queue.Queue()
 
     def read_argument(self, args):
         self.ip = args.server_ip
         self.port = args.server_port
         self.monitor_ip = args.monitor_ip
         self.monitor_port = args.monitor_port
+        self.status_mode = args.status_mode
+        self.engine = args.engine
+        self.scheduler_name = args.scheduler
+        self.max_wait = args.max_wait
+        self.execution = args.execution
+        self.admission_depth = args.admission_depth
+        self.admission_wait = args.admission_wait
+        self.cores = parse_cores(args.cores)
+        self.worker_number = args.workers or default_worker_number(self.execution, self.cores)
+        self.wire_format = args.wire_format
+        self.accept_pickle = args.accept_pickle
 
     def wait_for_client(self):
         self.socket.listen(self.max_connection_number)
@@ -78,20 +204,57 @@ class Server():
             client, address = self.socket.accept()
             logging.info("Got connection from: {}".format(address))
             client.settimeout(60)
-            multiprocessing.Process(target=self.serve_client,
-                                    args=(client, address)).start()
+            if self.engine == "process":
+                multiprocessing.Process(target=self.serve_client,
+                                        args=(client, address)).start()
+            else:
+                threading.Thread(target=self.serve_client, args=(client, address), daemon=True).start()
 
     def serve_client(self, client, address):
         logging.info("Start serving client: {}".format(address))
+        decoder = FrameDecoder()
+        # pipelined requests of one connection finish on different workers, one reply at a time.
+        # Processes cannot share it, their replies rely on a single sendall per frame.
+        send_lock = threading.Lock() if self.engine == "thread" else None
         while True:
             try:
-                request_data = client.recv(1024)
+                request_data = client.recv(RECEIVE_SIZE)
                 if request_data:
-                    request = pickle.loads(request_data)
-                    logging.info(
-                        "Got request id: {}, added to queue".format(request.id))
-                    request.request_receive_time = time.time()
-                    self.request_queue.put((request, client))
+                    frames = decoder.feed(request_data)
+                    rejections = []
+                    for frame in frames:
+                        refusal = refusal_frame(frame, self.accept_pickle)
+                        if refusal is not None:
+                            logging.warning("Client {} refused: {}".format(address, PICKLE_REFUSED))
+                            if send_lock is None:
+                                client.sendall(refusal)
+                            else:
+                                with send_lock:
+                                    client.sendall(refusal)
+                            client.close()
+                            return False
+                        request = decode_message(frame, self.accept_pickle)
+                        retry_after = self.admission_delay()
+                        if retry_after is not None:
+                            # replies go back in the format of their request
+                            rejections.append(self.reject(request, retry_after, message_format(frame)))
+                            continue
+                        logging.info(
+                            "Got request id: {}, added to queue".format(request.id))
+                        request.request_receive_time = time.time()
+                        with self.queue_length.get_lock():
+                            self.queue_length.value += 1
+                        self.request_queue.put((request, client, send_lock, message_format(frame)))
+                    if rejections:
+                        if send_lock is None:
+                            client.sendall(encode_frames(rejections))
+                        else:
+                            with send_lock:
+                                client.sendall(encode_frames(rejections))
+                    if len(rejections) < len(frames):
+                        # a dispatcher blocked on cpu may be able to backfill a new request
+                        with self.cpu_condition:
+                            self.cpu_condition.notify_all()
                 else:
                     logging.info("Client {} disconnected".format(address))
                     break
@@ -100,59 +263,354 @@ class Server():
                 client.close()
                 return False
 
-    def handle_request(self, request, client):
+    def admission_delay(self):
+        """
+        None when a new request may wait in the queue, else the ms after which
+        it should be sent again: the expected wait, queue length over the
+        recent completions/s, within RETRY_AFTER and MAX_RETRY_AFTER.
+        """
+        queue_length = self.queue_length.value
+        rate = self.completion_rate.value
+        expected_wait = queue_length / rate * 1e3 if rate > 0 else 0.
+        if ((self.admission_depth > 0 and queue_length >= self.admission_depth)
+                or (self.admission_wait > 0 and expected_wait >= self.admission_wait)):
+            return min(max(expected_wait, RETRY_AFTER), MAX_RETRY_AFTER)
+        return None
+
+    def reject(self, request, retry_after, reply_format):
+        logging.info("Overloaded, request {} rejected, retry after {:.0f}ms".format(request.id, retry_after))
+        with self.rejected.get_lock():
+            self.rejected.value += 1
+        return encode_message(Rejection(request.client_id, request.request_id, retry_after), reply_format)
+
+    def change_cpu_usage(self, delta):
+        with self.cpu_usage.get_lock():
+            now = time.time()
+            self.cpu_time.value += self.cpu_usage.value * (now - self.cpu_time_stamp.value)
+            self.cpu_time_stamp.value = now
+            self.cpu_usage.value += delta
+
+    def handle_request(self, request, client, send_lock=None, reply_format=None, worker_index=0):
         logging.info("Handling request {}...".format(request.id))
         request.request_process_time = time.time()
-        time_in_sec = float(request.time_usage) * 1e-3
-        time.sleep(time_in_sec)
+        self.execute(request)
         request.reply_send_time = time.time()
-        client.send(pickle.dumps(request))
-        with self.cpu_usage.get_lock():
-            self.cpu_usage.value -= request.cpu_usage
+        self.record_service(request, worker_index)
+        reply = encode_frame(encode_message(request, reply_format or self.wire_format))
+        if send_lock is None:
+            client.sendall(reply)
+        else:
+            with send_lock:
+                client.sendall(reply)
+        self.change_cpu_usage(-request.cpu_usage)
+        with self.in_flight.get_lock():
+            self.in_flight.value -= 1
         logging.info("Request {} finished, reply sent, current cpu usage: {:.2f}%".format(
             request.id, self.cpu_usage.value))
         with self.cpu_condition:
             self.cpu_condition.notify_all()
 
+    def record_service(self, request, worker_index=0):
+        service_time = (request.reply_send_time - request.request_process_time) * 1e3
+        if self.engine == "process":
+            with self.service_lock:
+                self.service_histogram.record(service_time)
+        else:
+            self.service_histogram.record(service_time, worker_index)
+
+    def burn_share(self, request):
+        # the server's cpu resource is spread over its cores, a request burns on a single one
+        return float(request.cpu_usage) / self.max_cpu_resource * len(self.cores)
+
+    def execute(self, request):
+        if self.execution == "sleep":
+            time.sleep(float(request.time_usage) * 1e-3)
+        elif self.burn_pool is not None:
+            self.burn_pool.submit(self.burn_share(request), request.time_usage).result()
+        else:
+            # process engine, the request burns in its own process
+            init_burn_worker(self.burn_time, self.burn_core_counter, self.cores)
+            burn(self.burn_share(request), request.time_usage)
+
     def handle_request_in_queue(self):
+        """
+        Dispatcher of the thread and process engines.
+
+        Every received request moves from the request queue into the
+        scheduler, which picks the waiting requests that start whenever cpu
+        (and for the thread engine, a worker) frees up. The dispatcher only
+        blocks on the request queue while nothing is waiting.
+        """
         logging.info("Start handling request in queue")
+        scheduler = create_scheduler(self.scheduler_name, self.max_wait)
         while True:
-            request, client = self.request_queue.get()
-            while self.cpu_usage.value + request.cpu_usage > self.max_cpu_resource:
-                logging.warning(
-                    "Insufficient cpu usage: {:.2f}%, {:.2f}% more needed for request {}-{}"
-                    .format(self.cpu_usage.value, request.cpu_usage, request.client_id, request.request_id))
-                with self.cpu_condition:
-                    self.cpu_condition.wait()
-            logging.info("Ready to handle request: {}, current cpu usage: {:.2f}%".format(
-                request.info(), self.cpu_usage.value))
-            with self.cpu_usage.get_lock():
-                self.cpu_usage.value += request.cpu_usage
+            try:
+                if not len(scheduler):
+                    self.schedule(scheduler, self.request_queue.get())
+                while True:
+                    self.schedule(scheduler, self.request_queue.get_nowait())
+            except queue.Empty:
+                pass
+            blocked = (self.cpu_usage.value, self.in_flight.value)
+            if self.start_requests(scheduler) or not len(scheduler):
+                continue
+            with self.cpu_condition:
+                # arrivals and finished requests notify under the condition, check before sleeping on them
+                if self.request_queue.empty() and blocked == (self.cpu_usage.value, self.in_flight.value):
+                    self.cpu_condition.wait(SCHEDULE_TIMEOUT * 1e-3)
+
+    def schedule(self, scheduler, item):
+        # the wait, and so the aging, counts from the request's arrival
+        scheduler.add(item, item[0], item[0].request_receive_time)
+
+    def start_requests(self, scheduler):
+        started = 0
+        # a thread engine request waits for a free worker as well
+        while len(scheduler) and (self.engine != "thread" or self.in_flight.value < self.worker_number):
+            now = time.time()
+            item = scheduler.pop(self.max_cpu_resource - self.cpu_usage.value, now)
+            if item is None:
+                logging.info("Insufficient cpu usage: {:.2f}%, {} requests waiting, {} in flight".format(
+                    self.cpu_usage.value, len(scheduler), self.in_flight.value))
+                break
+            self.start_request(item, now)
+            started += 1
+        if started:
+            with self.schedule_lock:
+                self.backfilled.value = scheduler.backfilled_num
+                self.aged.value = scheduler.aged_num
+        return started
+
+    def start_request(self, item, now):
+        request = item[0]
+        logging.info("Ready to handle request: {}, current cpu usage: {:.2f}%".format(
+            request.info(), self.cpu_usage.value))
+        wait_time = now - request.request_receive_time
+        with self.schedule_lock:
+            self.dispatched.value += 1
+            self.wait_total.value += wait_time
+            self.wait_max.value = max(self.wait_max.value, wait_time)
+        self.wait_histogram.record(wait_time * 1e3)
+        self.change_cpu_usage(request.cpu_usage)
+        with self.queue_length.get_lock():
+            self.queue_length.value -= 1
+        with self.in_flight.get_lock():
+            self.in_flight.value += 1
+        if self.engine == "asyncio":
+            task = asyncio.ensure_future(self.handle_request_async(*item))
+            # the loop only keeps weak references to running tasks
+            self.request_tasks.add(task)
+            task.add_done_callback(self.request_tasks.discard)
+        elif self.engine == "process":
+            request, client, _, reply_format = item
             multiprocessing.Process(target=self.handle_request,
-                                    args=(request, client)).start()
+                                    args=(request, client, None, reply_format)).start()
+        else:
+            self.work_queue.put(item)
+
+    def run_worker(self, worker_index):
+        # a warm worker thread, runs requests and sends their replies one at a time
+        while True:
+            request, client, send_lock, reply_format = self.work_queue.get()
+            try:
+                self.handle_request(request, client, send_lock, reply_format, worker_index)
+            except:
+                logging.error(traceback.format_exc())
+                self.change_cpu_usage(-request.cpu_usage)
+                with self.in_flight.get_lock():
+                    self.in_flight.value -= 1
+                with self.cpu_condition:
+                    self.cpu_condition.notify_all()
+
+    async def serve_client_async(self, reader, writer):
+        address = writer.get_extra_info("peername")
+        logging.info("Start serving client: {}".format(address))
+        decoder = FrameDecoder()
+        try:
+            while True:
+                request_data = await reader.read(RECEIVE_SIZE)
+                if not request_data:
+                    logging.info("Client {} disconnected".format(address))
+                    break
+                frames = decoder.feed(request_data)
+                rejections = []
+                for frame in frames:
+                    refusal = refusal_frame(frame, self.accept_pickle)
+                    if refusal is not None:
+                        logging.warning("Client {} refused: {}".format(address, PICKLE_REFUSED))
+                        writer.write(refusal)
+                        await writer.drain()
+                        writer.close()
+                        return
+                    request = decode_message(frame, self.accept_pickle)
+                    retry_after = self.admission_delay()
+                    if retry_after is not None:
+                        rejections.append(self.reject(request, retry_after, message_format(frame)))
+                        continue
+                    logging.info("Got request id: {}, added to queue".format(request.id))
+                    request.request_receive_time = time.time()
+                    with self.queue_length.get_lock():
+                        self.queue_length.value += 1
+                    self.request_queue.put_nowait((request, writer, message_format(frame)))
+                if rejections:
+                    writer.write(encode_frames(rejections))
+                if len(rejections) < len(frames):
+                    async with self.cpu_condition:
+                        self.cpu_condition.notify_all()
+        except:
+            logging.error(traceback.format_exc())
+            writer.close()
+
+    async def handle_request_async(self, request, writer, reply_format):
+        logging.info("Handling request {}...".format(request.id))
+        request.request_process_time = time.time()
+        if self.execution == "burn":
+            await asyncio.wrap_future(self.burn_pool.submit(self.burn_share(request), request.time_usage))
+        else:
+            await asyncio.sleep(float(request.time_usage) * 1e-3)
+        request.reply_send_time = time.time()
+        self.record_service(request)
+        try:
+            writer.write(encode_frame(encode_message(request, reply_format)))
+            await writer.drain()
+        except:
+            logging.error(traceback.format_exc())
+        self.change_cpu_usage(-request.cpu_usage)
+        with self.in_flight.get_lock():
+            self.in_flight.value -= 1
+        logging.info("Request {} finished, reply sent, current cpu usage: {:.2f}%".format(
+            request.id, self.cpu_usage.value))
+        async with self.cpu_condition:
+            self.cpu_condition.notify_all()
+
+    async def handle_request_in_queue_async(self):
+        logging.info("Start handling request in queue")
+        scheduler = create_scheduler(self.scheduler_name, self.max_wait)
+        while True:
+            if not len(scheduler):
+                self.schedule(scheduler, await self.request_queue.get())
+            while not self.request_queue.empty():
+                self.schedule(scheduler, self.request_queue.get_nowait())
+            if self.start_requests(scheduler) or not len(scheduler):
+                continue
+            # nothing else runs in between, no arrival or finished request can be missed
+            async with self.cpu_condition:
+                try:
+                    await asyncio.wait_for(self.cpu_condition.wait(), SCHEDULE_TIMEOUT * 1e-3)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_async(self):
+        # connections, queue, cpu accounting and replies all live in this event loop
+        self.request_queue = asyncio.Queue()
+        self.cpu_condition = asyncio.Condition()
+        self.socket.setblocking(False)
+        # one descriptor per client connection, allow as many as the hard limit
+        try:
+            _, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard_limit, hard_limit))
+        except (ValueError, OSError):
+            logging.warning("could not raise the open file limit: {}".format(traceback.format_exc()))
+        server = await asyncio.start_server(self.serve_client_async, sock=self.socket,
+                                            backlog=ASYNC_BACKLOG)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.handle_request_in_queue_async())
 
     def generate_log_and_send(self):
-        listener_sockets = []
-        for listener_socket in [self.monitor_socket,]:
-            if listener_socket.connect():
-                listener_sockets.append(listener_socket)
-        target_time = time.time() + self.log_frequency * 1e-3
+        """
+        Persistent status reporter.
+
+        The status board gets every sample. A sample is only reported to the
+        listeners (and the status file) when it differs from the last reported
+        one by more than the change threshold, or when waiting for the next
+        sample would leave more than the heartbeat since the last reported
+        one, so the gap between two reported samples stays within the
+        heartbeat even at the longest period. The sampling period starts at
+        log_frequency, doubles for every unchanged sample up to
+        log_max_period, and drops back on a change.
+        Reported samples are batched into one ServerReport per log_batch
+        samples or log_batch_delay, sent over sockets that stay connected,
+        along with what the scheduler did since the previous report.
+        """
+        listener_sockets = [self.monitor_socket,]
+        reconnect_time = {listener_socket: 0. for listener_socket in listener_sockets}
+        status_board = None
+        if self.status_mode == "board":
+            status_board = StatusBoard()
+            status_slot = status_board.claim_slot(self.server_id)
+        if self.execution == "burn":
+            self.cpu_meter = CpuMeter(self.burn_time, len(self.cores))
+        self.latency_window = LatencyWindow(self.wait_histogram, self.service_histogram)
+        last_reported = None
+        last_counters = self.read_scheduler_counters()
+        period = self.log_frequency
+        target_time = time.time()
         while True:
-            target_time += self.log_frequency * 1e-3
             current_status = self.get_current_status()
-            self.status_log.append(current_status)
-            if len(self.status_log) >= self.log_batch:
-                server_report = ServerReport(self.server_id, self.status_log)
-                self.unblocking_send(listener_sockets, server_report)
-                self.blocking_write(server_report)
+            if status_board is not None:
+                status_board.write(status_slot, current_status)
+            since_reported = None
+            if last_reported is not None and not self.is_status_changed(last_reported, current_status):
+                since_reported = (current_status.timestamp - last_reported.timestamp) * 1e3
+            period, is_reported = next_sample(period, since_reported, self.log_frequency, self.log_max_period,
+                                              self.heartbeat)
+            if is_reported:
+                self.status_log.append(current_status)
+                last_reported = current_status
+                if status_board is None:
+                    self.blocking_write(ServerReport(self.server_id, [current_status]))
+            if self.status_log and (len(self.status_log) >= self.log_batch or
+                                    current_status.timestamp - self.status_log[0].timestamp >= self.log_batch_delay * 1e-3):
+                counters = self.read_scheduler_counters()
+                server_report = ServerReport(self.server_id, self.status_log,
+                                             self.get_scheduler_stats(last_counters, counters))
+                last_counters = counters
+                self.send_report(listener_sockets, reconnect_time, server_report)
                 self.status_log = []
-            while time.time() < target_time:
-                time.sleep(1e-3)
+            target_time += period * 1e-3
+            # one sleep per tick, a late tick starts the next period from now
+            now = time.time()
+            target_time = max(target_time, now)
+            time.sleep(target_time - now)
+
+    def read_scheduler_counters(self):
+        # dispatched, backfilled, aged, total wait, cpu time, time and the longest wait, which restarts
+        with self.cpu_usage.get_lock():
+            now = time.time()
+            cpu_time = self.cpu_time.value + self.cpu_usage.value * (now - self.cpu_time_stamp.value)
+        with self.schedule_lock:
+            counters = (self.dispatched.value, self.backfilled.value, self.aged.value, self.wait_total.value,
+                        cpu_time, now, self.wait_max.value)
+            self.wait_max.value = 0.
+        return counters
+
+    def get_scheduler_stats(self, last_counters, counters):
+        dispatched, backfilled, aged, wait_total, cpu_time, now = [
+            value - last_value for value, last_value in zip(counters[:6], last_counters[:6])]
+        return SchedulerStats(self.scheduler_name, dispatched, backfilled, aged, cpu_time, now,
+                              wait_total, counters[6])
+
+    def is_status_changed(self, last_status, status):
+        return (abs(status.cpu_usage - last_status.cpu_usage) >= self.cpu_change_threshold
+                or status.queue_length != last_status.queue_length
+                or status.is_unavailable != last_status.is_unavailable
+                or status.rejected != last_status.rejected)
 
-    def unblocking_send(self, listener_sockets, server_report):
-        message = pickle.dumps(server_report)
+    def send_report(self, listener_sockets, reconnect_time, server_report):
+        message = encode_message(server_report, self.wire_format)
+        now = time.time()
         for listener_socket in listener_sockets:
-            multiprocessing.Process(target=listener_socket.send_and_receive, args=(message,)).start()
+            if not listener_socket.is_connected:
+                if now < reconnect_time[listener_socket]:
+                    continue
+                reconnect_time[listener_socket] = now + RECONNECT_DELAY
+                # a socket that failed to connect cannot be reused
+                listener_socket.close()
+                if not listener_socket.connect():
+                    continue
+            # acknowledgements are not waited for, only drained so they never fill the socket
+            if not listener_socket.send(message) or not listener_socket.drain():
+                listener_socket.close()
 
     def unblocking_write(self, server_report):
         multiprocessing.Process(target=self.blocking_write, args=(server_report,)).start()
@@ -163,15 +621,31 @@ class Server():
         os.replace(self.log_tmp_file_path, self.log_file_path)
 
     def get_current_status(self):
-        cpu_usage = self.cpu_usage.value
-        is_idle = (cpu_usage > 0)
-        is_unavailable = not self.request_queue.empty()
+        # requested cpu usage, or with burn execution what the requests really used since the previous sample
+        cpu_usage = self.cpu_usage.value if self.cpu_meter is None else self.cpu_meter.read()
+        is_idle = (cpu_usage <= CPU_IDLE_USAGE)
+        queue_length = self.queue_length.value
+        is_unavailable = queue_length > 0
         timestamp = time.time()
-        return ServerStatus(cpu_usage, is_idle, is_unavailable, timestamp)
+        latency = self.latency_window.read(timestamp)
+        self.completion_rate.value = latency[-1]
+        return ServerStatus(cpu_usage, is_idle, is_unavailable, timestamp,
+                            queue_length, self.in_flight.value, *latency, rejected=self.rejected.value)
 
     def run(self):
-        multiprocessing.Process(target=self.handle_request_in_queue).start()
+        # fork the status reporter before any thread exists
         multiprocessing.Process(target=self.generate_log_and_send).start()
+        if self.execution == "burn" and self.engine != "process":
+            self.burn_pool = BurnPool(self.worker_number, self.cores, self.burn_time, self.burn_core_counter)
+        if self.engine == "asyncio":
+            asyncio.run(self.run_async())
+            return
+        if self.engine == "process":
+            multiprocessing.Process(target=self.handle_request_in_queue).start()
+        else:
+            for worker_index in range(self.worker_number):
+                threading.Thread(target=self.run_worker, args=(worker_index,), daemon=True).start()
+            threading.Thread(target=self.handle_request_in_queue, daemon=True).start()
         self.wait_for_client()
 
 
@@ -0,0 +1,127 @@
+import fcntl
+import mmap
+import os
+import socket
+import struct
+
+from commonData import ServerStatus
+
+STATUS_BOARD_PATH = "/tmp/server_status/status_board"
+STATUS_BOARD_SLOTS = 1024
+BOARD_MAGIC = b"LBSB"
+BOARD_VERSION = 4
+READ_RETRIES = 100
+
+# magic, version, slot number
+HEADER = struct.Struct("<4sII")
+# sequence number, server ip, cpu usage, is idle, is unavailable, timestamp,
+# queue length, in flight requests, p50 and p99 queue wait, p50 and p99 service time,
+# completions per second, rejected requests
+SLOT = struct.Struct("<I4sdBB6xdIIfffffI")
+SEQUENCE = struct.Struct("<I")
+SLOT_IP_OFFSET = 4
+SLOT_IP_SIZE = 4
+EMPTY_IP = b"\x00" * SLOT_IP_SIZE
+
+
+class StatusBoard():
+    """
+    Fixed-layout, memory-mapped table with one slot per server.
+
+    Each slot is guarded by a sequence number (seqlock): the writer makes it
+    odd before touching the slot and even again afterwards, so a reader that
+    sees an odd or changed sequence number knows the read was torn and retries.
+    There is exactly one writer per slot (the server owning it), so writes
+    need no lock; only claiming a slot takes a file lock.
+    """
+
+    def __init__(self, path=STATUS_BOARD_PATH, slot_num=STATUS_BOARD_SLOTS):
+        self.path = path
+        self.slot_num = slot_num
+        self.size = HEADER.size + SLOT.size * slot_num
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            # first user creates the board, later users follow its header
+            file_size = os.fstat(self.fd).st_size
+            magic, version, board_slot_num = None, None, 0
+            if file_size >= HEADER.size:
+                magic, version, board_slot_num = HEADER.unpack(os.pread(self.fd, HEADER.size, 0))
+            if (magic != BOARD_MAGIC or version != BOARD_VERSION
+                    or file_size < HEADER.size + SLOT.size * board_slot_num):
+                # missing, cut short or left by another version, whatever its slots hold is stale
+                os.ftruncate(self.fd, 0)
+                os.ftruncate(self.fd, self.size)
+                os.pwrite(self.fd, HEADER.pack(BOARD_MAGIC, BOARD_VERSION, slot_num), 0)
+                board_slot_num = slot_num
+            self.slot_num = board_slot_num
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.size = HEADER.size + SLOT.size * self.slot_num
+        self.buffer = mmap.mmap(self.fd, self.size)
+
+    def slot_offset(self, index):
+        return HEADER.size + SLOT.size * index
+
+    def slot_ip(self, index):
+        offset = self.slot_offset(index) + SLOT_IP_OFFSET
+        return self.buffer[offset:offset + SLOT_IP_SIZE]
+
+    def find_slot(self, ip):
+        packed_ip = socket.inet_aton(str(ip))
+        for index in range(self.slot_num):
+            slot_ip = self.slot_ip(index)
+            if slot_ip == packed_ip:
+                return index
+            if slot_ip == EMPTY_IP:
+                # slots are claimed in order, nothing beyond the first empty one
+                return None
+        return None
+
+    def claim_slot(self, ip):
+        packed_ip = socket.inet_aton(str(ip))
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            for index in range(self.slot_num):
+                slot_ip = self.slot_ip(index)
+                if slot_ip == packed_ip:
+                    return index
+                if slot_ip == EMPTY_IP:
+                    SLOT.pack_into(self.buffer, self.slot_offset(index),
+                                   0, packed_ip, 0., 0, 0, 0., 0, 0, 0., 0., 0., 0., 0., 0)
+                    return index
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        raise IndexError("status board {} is full".format(self.path))
+
+    def write(self, index, status):
+        offset = self.slot_offset(index)
+        sequence = SEQUENCE.unpack_from(self.buffer, offset)[0]
+        SEQUENCE.pack_into(self.buffer, offset, (sequence + 1) & 0xFFFFFFFF)
+        SLOT.pack_into(self.buffer, offset, (sequence + 1) & 0xFFFFFFFF,
+                       self.slot_ip(index), status.cpu_usage, status.is_idle,
+                       status.is_unavailable, status.timestamp,
+                       status.queue_length, status.in_flight, status.wait_p50, status.wait_p99,
+                       status.service_p50, status.service_p99, status.rate, status.rejected)
+        SEQUENCE.pack_into(self.buffer, offset, (sequence + 2) & 0xFFFFFFFF)
+
+    def read(self, index):
+        offset = self.slot_offset(index)
+        for _ in range(READ_RETRIES):
+            fields = SLOT.unpack_from(self.buffer, offset)
+            sequence, _, cpu_usage, is_idle, is_unavailable = fields[:5]
+            if sequence & 1:
+                continue
+            if SEQUENCE.unpack_from(self.buffer, offset)[0] == sequence:
+                if sequence == 0:
+                    # claimed but never written
+                    return None
+                return ServerStatus(cpu_usage, bool(is_idle), bool(is_unavailable), *fields[5:])
+        return None
+
+    def close(self):
+        self.buffer.close()
+        os.close(self.fd)
@@ -0,0 +1,46 @@
+import threading
+import types
+
+from unittest import mock
+
+import pytest
+
+from flowTable import FlowTable
+from loadEstimator import LoadEstimator
+from loadIndex import IndexedHeap
+from policies import SCORE_WEIGHTS, policy_class
+
+try:
+    import controller
+except ImportError:
+    # POX is not installed, it is not vendored either
+    controller = None
+
+SERVER_IPS = ["10.0.0.1", "10.0.0.2"]
+CLIENT_IPS = ["10.0.1.1", "10.0.1.2"]
+
+
+def new_controller(policy, server_ips=SERVER_IPS):
+    """
+    A Controller built by its own __init__ with the POX core mocked out and
+    no status thread. Without POX, only the state the policies read, with
+    the controller's defaults.
+    """
+    if controller is not None:
+        with mock.patch.object(controller, "core"), \
+                mock.patch.object(controller.Controller, "listenTo", create=True), \
+                mock.patch.object(controller.Controller, "run_read_usage_thread"):
+            return controller.Controller("10.0.2.1", list(server_ips), CLIENT_IPS, "10.0.3.1", "00:00:00:00:00:11",
+                                         policy, health=False)
+    state = types.SimpleNamespace(
+        status_lock=threading.Lock(), active_servers=list(server_ips), server_status={ip: 0 for ip in server_ips},
+        load_index=IndexedHeap((ip, 0) for ip in server_ips), connection_index=IndexedHeap((ip, 0) for ip in server_ips),
+        flow_table=FlowTable(), load_estimator=LoadEstimator(), choices=2, service_time=0.75, request_cpu=20.,
+        max_queue=8, score_weights=SCORE_WEIGHTS)
+    state.policy = policy_class(policy)(state)
+    return state
+
+
+@pytest.fixture
+def make_controller():
+    return new_controller
@@ -0,0 +1,55 @@
+import argparse
+import random
+
+import pytest
+
+from client import LoadGenerator, parse_rate_profile
+from commonData import add_wire_arguments
+
+
+def generator_args(**options):
+    parser = argparse.ArgumentParser()
+    add_wire_arguments(parser)
+    args = parser.parse_args([])
+    settings = dict(client_ip="10.0.1.1", client_id="client", server_ip="10.0.2.1", server_port=5000,
+                    monitor_ip="10.0.3.1", monitor_port=6000, pipeline=1, max_retries=5, virtual_clients=4,
+                    rps="10", duration=60., arrival="poisson")
+    settings.update(options)
+    for name, value in settings.items():
+        setattr(args, name, value)
+    return args
+
+
+def test_constant_rate_profile():
+    assert parse_rate_profile("50", 30) == [(0., 50.), (30., 50.)]
+    assert parse_rate_profile("50", 30, rate_scale=0.5) == [(0., 25.), (30., 25.)]
+
+
+def test_ramp_profile_is_sorted_and_starts_at_zero():
+    assert parse_rate_profile("30:200,10:10", 60) == [(0., 10.), (10., 10.), (30., 200.)]
+    assert parse_rate_profile("0:0,20:100", 60, rate_scale=0.25) == [(0., 0.), (20., 25.)]
+
+
+def test_rate_is_ramped_linearly():
+    generator = LoadGenerator(generator_args(rps="0:0,10:100,20:100"))
+    assert generator.rate_at(0.) == 0.
+    assert generator.rate_at(2.5) == pytest.approx(25.)
+    assert generator.rate_at(15.) == pytest.approx(100.)
+    assert generator.rate_at(30.) == 100.
+
+
+def test_virtual_clients_have_their_own_ids():
+    generator = LoadGenerator(generator_args(), "-p1")
+    assert generator.client_id == "client-p1"
+    assert [client.client_id for client in generator.clients] == ["client-p1-v{}".format(index) for index in range(4)]
+
+
+@pytest.mark.parametrize("arrival", ["poisson", "constant", "pareto"])
+def test_gaps_average_to_the_rate(arrival):
+    random.seed(1)
+    generator = LoadGenerator(generator_args(arrival=arrival))
+    gaps = [generator.next_gap(50.) for _ in range(20000)]
+    # the pareto tail converges slowly
+    assert sum(gaps) / len(gaps) == pytest.approx(0.02, rel=0.15)
+    if arrival == "constant":
+        assert set(gaps) == {0.02}
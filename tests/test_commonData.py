@@ -0,0 +1,104 @@
+import pytest
+
+from commonData import (MAX_FRAME_SIZE, FRAME_HEADER, FrameDecoder, Refusal, Rejection, Request, SchedulerStats,
+                        ServerReport, ServerStatus, decode_message, encode_frame, encode_frames, encode_message,
+                        message_format, refusal_frame, refusal_reason)
+
+PAYLOADS = [b"a", b"", b"b" * 1000, bytes(range(256))]
+
+
+def fields(message):
+    return [getattr(message, name) for name in type(message).__slots__]
+
+
+def round_trip(message, wire_format="struct"):
+    payload = encode_message(message, wire_format)
+    assert message_format(payload) == wire_format
+    return decode_message(payload, accept_pickle=True)
+
+
+def test_frames_in_one_piece():
+    assert FrameDecoder().feed(encode_frames(PAYLOADS)) == PAYLOADS
+
+
+def test_frames_split_at_every_byte():
+    stream = encode_frames(PAYLOADS)
+    decoder = FrameDecoder()
+    frames = []
+    for index in range(len(stream)):
+        frames += decoder.feed(stream[index:index + 1])
+    assert frames == PAYLOADS
+    assert len(decoder.buffer) == 0
+
+
+def test_partial_frame_stays_buffered():
+    decoder = FrameDecoder()
+    frame = encode_frame(b"hello")
+    assert decoder.feed(frame[:3]) == []
+    assert decoder.feed(frame[3:] + frame[:6]) == [b"hello"]
+    assert decoder.feed(frame[6:]) == [b"hello"]
+
+
+def test_oversized_frame_refused():
+    with pytest.raises(ValueError):
+        FrameDecoder().feed(FRAME_HEADER.pack(MAX_FRAME_SIZE + 1))
+
+
+@pytest.mark.parametrize("wire_format", ["struct", "pickle"])
+def test_request(wire_format):
+    request = Request("client-1", 42, 12.5, 300)
+    request.request_send_time = 1.5
+    request.reply_receive_time = 2.25
+    request.retries = 3
+    assert fields(round_trip(request, wire_format)) == fields(request)
+
+
+def test_rejection():
+    decoded = round_trip(Rejection("client-1", 7, 250.))
+    assert (decoded.client_id, decoded.request_id, decoded.retry_after, decoded.id) == ("client-1", 7, 250., "client-1-7")
+
+
+def test_status():
+    status = ServerStatus(37.5, False, True, 1234.5, 4, 2, 0.5, 2., 10., 40., 125., 9)
+    assert fields(round_trip(status)) == fields(status)
+
+
+@pytest.mark.parametrize("scheduler_stats", [None, SchedulerStats("backfill", 10, 2, 1, 0.5, 1., 3., 0.75)])
+def test_report(scheduler_stats):
+    statuses = [ServerStatus(float(index), index == 0, False, 100. + index, index) for index in range(3)]
+    decoded = round_trip(ServerReport("10.0.0.1", statuses, scheduler_stats))
+    assert decoded.server_id == "10.0.0.1"
+    assert [fields(status) for status in decoded.status_log] == [fields(status) for status in statuses]
+    if scheduler_stats is None:
+        assert decoded.scheduler_stats is None
+    else:
+        assert fields(decoded.scheduler_stats) == fields(scheduler_stats)
+
+
+def test_pickle_refused_by_default():
+    with pytest.raises(ValueError):
+        decode_message(encode_message(Request("client-1", 1, 10, 10), "pickle"))
+
+
+def test_refusal_is_decoded_without_pickle():
+    payload = encode_message(Refusal("no pickle here"))
+    assert message_format(payload) == "struct"
+    assert decode_message(payload).reason == "no pickle here"
+
+
+def test_refusal_frame_only_for_refused_pickle():
+    request = Request("client-1", 1, 10, 10)
+    assert refusal_frame(encode_message(request)) is None
+    assert refusal_frame(encode_message(request, "pickle"), accept_pickle=True) is None
+    frames = FrameDecoder().feed(refusal_frame(encode_message(request, "pickle")))
+    assert len(frames) == 1
+    assert "--accept_pickle" in refusal_reason(frames[0])
+
+
+def test_acknowledgements_are_not_refusals():
+    assert refusal_reason(b"Report from client-1 with id '1' received") is None
+
+
+def test_unknown_tag():
+    with pytest.raises(ValueError):
+        decode_message(b"\xff")
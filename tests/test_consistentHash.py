@@ -0,0 +1,57 @@
+import pytest
+
+from consistentHash import MaglevTable
+
+TABLE_SIZE = 5003  # prime, small enough for a fast populate
+SERVERS = ["10.0.0.{}".format(index) for index in range(1, 11)]
+
+
+@pytest.fixture
+def maglev():
+    return MaglevTable(SERVERS, TABLE_SIZE)
+
+
+def test_slots_are_balanced(maglev):
+    counts = [maglev.table.count(server) for server in SERVERS]
+    assert sum(counts) == TABLE_SIZE
+    assert max(counts) - min(counts) <= 1
+
+
+def test_lookup_is_stable(maglev):
+    rebuilt = MaglevTable(SERVERS, TABLE_SIZE)
+    for client in range(100):
+        key = "10.0.1.{}".format(client)
+        assert maglev.lookup(key) in SERVERS
+        assert maglev.lookup(key) == rebuilt.lookup(key)
+
+
+def test_removing_a_server_moves_about_its_share(maglev):
+    old_table = list(maglev.table)
+    moved = maglev.set_backends(SERVERS[1:])
+    share = 1. / len(SERVERS)
+    # the removed server's slots move, and only a few others are disrupted
+    assert moved >= share - 1e-3
+    disrupted = sum(1 for old, new in zip(old_table, maglev.table) if old != SERVERS[0] and old != new)
+    assert disrupted / TABLE_SIZE < share
+
+
+def test_adding_a_server_moves_about_its_share(maglev):
+    moved = maglev.set_backends(SERVERS + ["10.0.0.11"])
+    share = 1. / (len(SERVERS) + 1)
+    assert share / 2 < moved < 2 * share
+
+
+def test_unchanged_backends_move_nothing(maglev):
+    assert maglev.set_backends(list(SERVERS)) == 0.
+
+
+def test_empty_table():
+    assert MaglevTable([], TABLE_SIZE).lookup("10.0.1.1") is None
+
+
+def test_table_built_aside_is_installed(maglev):
+    table = maglev.populate(SERVERS[1:])
+    # building reads the table, the lookups keep the old server list meanwhile
+    assert maglev.backends == SERVERS
+    maglev.set_backends(SERVERS[1:], table)
+    assert maglev.table == MaglevTable(SERVERS[1:], TABLE_SIZE).table
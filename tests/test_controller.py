@@ -0,0 +1,92 @@
+import time
+
+from unittest import mock
+
+import pytest
+
+from commonData import ServerStatus
+from policies import Policy
+
+# POX is not installed everywhere, it is not vendored either
+controller = pytest.importorskip("controller")
+
+
+class RecordingPolicy(Policy):
+    def __init__(self, controller):
+        Policy.__init__(self, controller)
+        self.statuses = []
+
+    def on_status(self, ip, status):
+        self.statuses.append((ip, status.timestamp))
+
+
+def test_policy_only_sees_newer_statuses(make_controller):
+    balancer = make_controller("resource")
+    balancer.policy = RecordingPolicy(balancer)
+    now = time.time()
+    status = ServerStatus(30., False, False, now)
+    balancer.update_server_load("10.0.0.1", status)
+    # the status thread reads the same sample until the server writes a new one
+    balancer.update_server_load("10.0.0.1", status)
+    balancer.update_server_load("10.0.0.1", ServerStatus(40., False, False, now - 1.))
+    assert balancer.policy.statuses == [("10.0.0.1", now)]
+    balancer.update_server_load("10.0.0.1", ServerStatus(40., False, False, now + 1.))
+    assert len(balancer.policy.statuses) == 2
+
+
+@pytest.fixture
+def held(make_controller):
+    balancer = make_controller("leastconnection")
+    # the overloaded server had its flows shed, it has the fewest connections
+    balancer.connection_index.update("10.0.0.2", 5)
+    balancer.load_index.update("10.0.0.2", 50.)
+    return balancer
+
+
+def hold(balancer, ip):
+    balancer.overloaded_until[ip] = time.time() + 10.
+    balancer.refresh_active_servers()
+
+
+def test_held_server_is_not_selected(held):
+    hold(held, "10.0.0.1")
+    assert held.active_servers == ["10.0.0.2"]
+    assert held.policy.select() == "10.0.0.2"
+    assert held.load_index.peek()[0] == "10.0.0.2"
+
+
+def test_held_server_comes_back(held):
+    hold(held, "10.0.0.1")
+    held.overloaded_until.pop("10.0.0.1")
+    held.refresh_active_servers()
+    assert "10.0.0.1" in held.load_index
+    assert "10.0.0.1" in held.connection_index
+    assert held.policy.select() == "10.0.0.1"
+
+
+def test_every_server_held(held):
+    hold(held, "10.0.0.1")
+    hold(held, "10.0.0.2")
+    # overloaded servers are still better than none
+    assert held.active_servers == ["10.0.0.1", "10.0.0.2"]
+    assert len(held.connection_index) == 2
+
+
+def test_rejections_shed_the_server(held):
+    now = time.time()
+    with mock.patch.object(controller, "core") as core:
+        held.update_server_load("10.0.0.1", ServerStatus(90., False, True, now, rejected=0))
+        held.update_server_load("10.0.0.1", ServerStatus(90., False, True, now + 1., rejected=0))
+        core.callLater.assert_not_called()
+        held.update_server_load("10.0.0.1", ServerStatus(90., False, True, now + 2., rejected=3))
+    core.callLater.assert_called_once_with(held.shed_server, "10.0.0.1")
+
+
+def test_table_of_an_older_server_list_is_dropped(make_controller):
+    balancer = make_controller("hash")
+    balancer.maglev_generation = 2
+    assert balancer.install_maglev(1, ["10.0.0.2"], []) is None
+    assert balancer.maglev.backends == ["10.0.0.1", "10.0.0.2"]
+    balancer.install_maglev(2, ["10.0.0.2"], balancer.maglev.populate(["10.0.0.2"]))
+    assert balancer.maglev.backends == ["10.0.0.2"]
+    assert balancer.maglev.lookup("10.0.1.1") == "10.0.0.2"
@@ -0,0 +1,39 @@
+import multiprocessing
+import os
+
+import cpuBurner
+from cpuBurner import CpuMeter, available_cores, burn, init_burn_worker, parse_cores
+
+
+def test_parse_cores():
+    assert parse_cores("0,2,4-7") == [0, 2, 4, 5, 6, 7]
+    assert parse_cores("3") == [3]
+    assert parse_cores(None) == available_cores()
+    assert parse_cores("") == available_cores()
+
+
+def test_workers_are_pinned_round_robin(monkeypatch):
+    pinned = []
+    monkeypatch.setattr(os, "sched_setaffinity", lambda pid, cores: pinned.append(cores), raising=False)
+    monkeypatch.setattr(cpuBurner, "burn_time", None)
+    monkeypatch.setattr(cpuBurner, "burn_core", None)
+    counter = multiprocessing.Value("i", 0)
+    for _ in range(3):
+        init_burn_worker(multiprocessing.Value("d", 0.), counter, [2, 5])
+    assert pinned == [{2}, {5}, {2}]
+    assert counter.value == 3
+
+
+def test_burnt_cpu_time_is_measured(monkeypatch):
+    shared_burn_time = multiprocessing.Value("d", 0.)
+    monkeypatch.setattr(cpuBurner, "burn_time", shared_burn_time)
+    meter = CpuMeter(shared_burn_time, 1)
+    burn(0.5, 100)
+    # about half of the 100 ms, loose bounds for a busy machine
+    assert 0.02 < shared_burn_time.value < 0.08
+    assert 20. < meter.read() < 80.
+
+
+def test_nothing_burnt_nothing_read():
+    meter = CpuMeter(multiprocessing.Value("d", 0.), 2)
+    assert meter.read() == 0.
@@ -0,0 +1,49 @@
+from flowTable import FlowTable
+
+
+def test_client_to_server_rules_are_counted():
+    table = FlowTable()
+    table.add(1, "10.0.1.1", "10.0.0.1", "10.0.1.1", "10.0.0.1", False)
+    table.add(1, "10.0.1.2", "10.0.0.1", "10.0.1.2", "10.0.0.1", False)
+    table.add(1, "10.0.0.1", "10.0.1.1", "10.0.1.1", "10.0.0.1", True)
+    assert len(table) == 3
+    assert table.active_flows("10.0.0.1") == 2
+    assert table.client_server() == {"10.0.1.1": "10.0.0.1", "10.0.1.2": "10.0.0.1"}
+    assert len(table.flows_of_server("10.0.0.1")) == 3
+
+
+def test_same_match_replaces_the_rule():
+    table = FlowTable()
+    old_cookie, _ = table.add(1, "10.0.1.1", "10.0.0.1", "10.0.1.1", "10.0.0.1", False)
+    cookie, replaced = table.add(1, "10.0.1.1", "10.0.0.1", "10.0.1.1", "10.0.0.2", False)
+    assert replaced.cookie == old_cookie
+    assert cookie != old_cookie
+    assert table.active_flows("10.0.0.1") == 0
+    assert table.active_flows("10.0.0.2") == 1
+
+
+def test_flow_removed_of_a_replaced_rule_is_ignored():
+    table = FlowTable()
+    old_cookie, _ = table.add(1, "10.0.1.1", "10.0.0.1", "10.0.1.1", "10.0.0.1", False)
+    table.add(1, "10.0.1.1", "10.0.0.1", "10.0.1.1", "10.0.0.1", False)
+    # the switch reports the removal of the rule the new one overwrote
+    assert table.remove(old_cookie) is None
+    assert table.active_flows("10.0.0.1") == 1
+
+
+def test_removed_rules_are_no_longer_counted():
+    table = FlowTable()
+    cookie, _ = table.add(1, "10.0.1.1", "10.0.0.1", "10.0.1.1", "10.0.0.1", False)
+    assert table.remove(cookie).server_ip == "10.0.0.1"
+    assert table.active_flows("10.0.0.1") == 0
+    assert table.server_flow_count == {}
+    assert len(table) == 0
+
+
+def test_transit_rules_are_not_counted():
+    table = FlowTable()
+    table.add(1, "10.0.1.1", "10.0.0.1", "10.0.1.1", "10.0.0.1", False)
+    cookie, _ = table.add(2, "10.0.1.1", "10.0.0.1", "10.0.1.1", "10.0.0.1", False, is_transit=True)
+    assert table.active_flows("10.0.0.1") == 1
+    assert table.remove(cookie).is_transit
+    assert table.active_flows("10.0.0.1") == 1
@@ -0,0 +1,88 @@
+import socket
+
+import pytest
+
+from healthCheck import HealthChecker
+
+
+class Checked():
+    def __init__(self, server_ips, **options):
+        self.stale = set()
+        self.events = []
+        self.checker = HealthChecker(server_ips, lambda ip: ip in self.stale,
+                                     lambda ip: self.events.append(("down", ip)),
+                                     lambda ip: self.events.append(("up", ip)), **options)
+
+    def rounds(self, times):
+        for now in times:
+            self.checker.check_all(now)
+
+
+@pytest.fixture
+def checked():
+    return Checked(["10.0.0.1", "10.0.0.2"], failure_threshold=3, grace=1000)
+
+
+def test_down_after_the_failure_threshold(checked):
+    checked.rounds([100.])
+    checked.stale.add("10.0.0.1")
+    checked.rounds([101., 101.2])
+    assert checked.events == []
+    checked.rounds([101.4, 101.6])
+    assert checked.events == [("down", "10.0.0.1")]
+
+
+def test_a_passed_round_resets_the_count(checked):
+    checked.rounds([100.])
+    checked.stale.add("10.0.0.1")
+    checked.rounds([101., 101.2])
+    checked.stale.clear()
+    checked.rounds([101.4])
+    checked.stale.add("10.0.0.1")
+    checked.rounds([101.6, 101.8])
+    assert checked.events == []
+
+
+def test_up_on_the_first_passed_round(checked):
+    checked.rounds([100.])
+    checked.stale.add("10.0.0.1")
+    checked.rounds([101., 101.2, 101.4])
+    checked.stale.clear()
+    checked.rounds([101.6, 101.8])
+    assert checked.events == [("down", "10.0.0.1"), ("up", "10.0.0.1")]
+
+
+def test_failures_during_the_grace_period_are_not_counted(checked):
+    checked.stale.add("10.0.0.1")
+    checked.rounds([100., 100.2, 100.4, 100.6, 100.8])
+    assert checked.events == []
+    checked.rounds([101., 101.2, 101.4])
+    assert checked.events == [("down", "10.0.0.1")]
+
+
+def test_a_server_joining_later_gets_its_own_grace(checked):
+    checked.rounds([100., 101.])
+    checked.checker.server_ips.append("10.0.0.3")
+    checked.stale.add("10.0.0.3")
+    checked.rounds([101.2, 101.4, 101.6])
+    assert checked.events == []
+
+
+def test_a_server_leaving_the_pool_is_forgotten(checked):
+    checked.stale.add("10.0.0.1")
+    checked.rounds([100., 101., 101.2, 101.4])
+    checked.checker.server_ips.remove("10.0.0.1")
+    checked.rounds([101.6])
+    assert checked.checker.down_servers == set()
+    assert "10.0.0.1" not in checked.checker.join_times
+
+
+def test_probe_needs_the_service_port():
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    port = listener.getsockname()[1]
+    checker = Checked(["127.0.0.1"], probe=True, probe_port=port).checker
+    assert checker.check("127.0.0.1")
+    listener.close()
+    assert not checker.check("127.0.0.1")
@@ -0,0 +1,53 @@
+import pytest
+
+from hostRegistry import CLIENT, MONITOR, SERVER, VIP, HostRegistry, pool_hosts
+
+
+@pytest.fixture
+def registry():
+    registry = HostRegistry()
+    registry.add_pool("10.0.0.0/16", CLIENT)
+    registry.add_pool("10.0.1.0/24", SERVER)
+    registry.add_pool("10.0.1.1/32", MONITOR)
+    return registry
+
+
+def test_pools_match_by_longest_prefix(registry):
+    assert registry.classify("10.0.2.7") == CLIENT
+    assert registry.classify("10.0.1.7") == SERVER
+    assert registry.classify("10.0.1.1") == MONITOR
+    assert registry.classify("10.1.0.1") is None
+    assert registry.network(SERVER).prefixlen == 24
+    assert registry.network(VIP) is None
+
+
+def test_known_hosts_take_precedence_over_the_pools(registry):
+    registry.add("10.0.1.7", VIP)
+    assert registry.classify("10.0.1.7") == VIP
+    registry.remove("10.0.1.7")
+    assert registry.classify("10.0.1.7") == SERVER
+
+
+def test_members_keep_their_order_and_change_role(registry):
+    assert registry.add("10.0.1.3", SERVER)
+    assert registry.add("10.0.1.2", SERVER)
+    assert not registry.add("10.0.1.2", SERVER)
+    registry.add("10.0.2.1", CLIENT)
+    assert registry.members[SERVER] == ["10.0.1.3", "10.0.1.2"]
+    registry.add("10.0.1.3", CLIENT)
+    assert registry.members[SERVER] == ["10.0.1.2"]
+    assert registry.hosts() == ["10.0.2.1", "10.0.1.3", "10.0.1.2"]
+    assert registry.remove("10.0.9.9") is None
+
+
+def test_pool_hosts_go_past_a_slash_24():
+    hosts = pool_hosts("10.0.0.0/22", 300)
+    assert hosts[0] == "10.0.0.1"
+    assert hosts[255] == "10.0.1.0"
+    assert len(set(hosts)) == 300
+
+
+def test_exhausted_pool_is_refused():
+    assert len(pool_hosts("10.0.0.0/30", 2)) == 2
+    with pytest.raises(ValueError):
+        pool_hosts("10.0.0.0/30", 3)
@@ -0,0 +1,55 @@
+import pytest
+
+from latencyStats import (BUCKETS_PER_DOUBLING, HISTOGRAM_BUCKETS, Histogram, LatencyWindow, bucket_of,
+                          bucket_value, percentile)
+
+
+def test_bucket_value_is_close_to_the_recorded_one():
+    for value in (0.03, 0.7, 3., 45., 1200., 60000., 300000.):
+        # the geometric middle is at most half a bucket away
+        assert bucket_value(bucket_of(value)) == pytest.approx(value, rel=2 ** (0.5 / BUCKETS_PER_DOUBLING) - 1)
+
+
+def test_buckets_are_ordered_and_bounded():
+    values = [0., 0.01, 0.011, 1., 1.1, 10., 1e9]
+    buckets = [bucket_of(value) for value in values]
+    assert buckets == sorted(buckets)
+    assert buckets[0] == buckets[1] == 0
+    assert buckets[-1] == HISTOGRAM_BUCKETS - 1
+
+
+def test_percentile():
+    counts = [0] * HISTOGRAM_BUCKETS
+    counts[bucket_of(1.)] = 98
+    counts[bucket_of(100.)] = 2
+    assert percentile(counts, 50) == bucket_value(bucket_of(1.))
+    assert percentile(counts, 98) == bucket_value(bucket_of(1.))
+    assert percentile(counts, 99) == bucket_value(bucket_of(100.))
+    assert percentile([0] * HISTOGRAM_BUCKETS, 50) == 0.
+
+
+def test_rows_are_summed():
+    histogram = Histogram(row_num=3)
+    histogram.record(1., row=0)
+    histogram.record(1., row=2)
+    histogram.record(50., row=1)
+    snapshot = histogram.snapshot()
+    assert snapshot[bucket_of(1.)] == 2
+    assert snapshot[bucket_of(50.)] == 1
+    assert sum(snapshot) == 3
+
+
+def test_window_only_covers_the_last_period():
+    wait, service = Histogram(), Histogram()
+    window = LatencyWindow(wait, service, window=1000)
+    assert window.read(100.) == (0., 0., 0., 0., 0.)
+    for _ in range(10):
+        wait.record(1.)
+        service.record(5.)
+    wait_p50, _, service_p50, _, rate = window.read(100.5)
+    assert wait_p50 == bucket_value(bucket_of(1.))
+    assert service_p50 == bucket_value(bucket_of(5.))
+    assert rate == pytest.approx(20.)
+    window.read(101.)
+    # the samples recorded before 101 s are out of the window
+    assert window.read(102.) == (0., 0., 0., 0., 0.)
@@ -0,0 +1,48 @@
+import pytest
+
+from loadEstimator import LoadEstimator
+
+
+@pytest.fixture
+def estimator():
+    estimator = LoadEstimator(alpha=0.5, stale_deadline=500)
+    estimator.start_time = 100.
+    return estimator
+
+
+def test_samples_are_smoothed(estimator):
+    estimator.update("10.0.0.1", 40., 100.)
+    estimator.update("10.0.0.1", 80., 100.1)
+    assert estimator.estimates["10.0.0.1"].value == pytest.approx(60.)
+    # the slope of the smoothed value, 200 per s, weighted by alpha
+    assert estimator.estimates["10.0.0.1"].trend == pytest.approx(100.)
+
+
+def test_estimate_is_projected_and_clamped(estimator):
+    estimator.update("10.0.0.1", 40., 100.)
+    estimator.update("10.0.0.1", 80., 100.1)
+    assert estimator.estimate("10.0.0.1", 100.1) == pytest.approx(60.)
+    assert estimator.estimate("10.0.0.1", 100.2) == pytest.approx(70.)
+    assert estimator.estimate("10.0.0.1", 100.5) == 100
+
+
+def test_older_samples_are_ignored(estimator):
+    estimator.update("10.0.0.1", 40., 100.)
+    assert not estimator.update("10.0.0.1", 90., 100.)
+    assert not estimator.update("10.0.0.1", 90., 99.)
+    assert estimator.estimate("10.0.0.1", 100.) == pytest.approx(40.)
+
+
+def test_stale_server_has_no_estimate(estimator):
+    estimator.update("10.0.0.1", 40., 100.)
+    assert not estimator.is_stale("10.0.0.1", 100.5)
+    assert estimator.is_stale("10.0.0.1", 100.6)
+    assert estimator.estimate("10.0.0.1", 100.6) is None
+
+
+def test_silent_server_gets_the_deadline_from_start(estimator):
+    assert estimator.estimate("10.0.0.2", 100.4) == 0.
+    assert estimator.estimate("10.0.0.2", 100.6) is None
+    estimator.update("10.0.0.2", 10., 100.6)
+    estimator.remove("10.0.0.2")
+    assert estimator.estimate("10.0.0.2", 100.7) is None
@@ -0,0 +1,50 @@
+import random
+
+from loadIndex import IndexedHeap
+
+
+def check_heap(index):
+    for position, (value, key) in enumerate(index.heap):
+        assert index.position[key] == position
+        if position:
+            assert index.heap[(position - 1) >> 1][0] <= value
+
+
+def test_peek_follows_updates():
+    index = IndexedHeap([("a", 5), ("b", 3), ("c", 4)])
+    assert index.peek() == ("b", 3)
+    index.update("b", 10)
+    assert index.peek() == ("c", 4)
+    index.add("a", -2)
+    assert index.peek() == ("a", 3)
+    assert index.get("b") == 10
+    assert len(index) == 3
+
+
+def test_remove():
+    index = IndexedHeap([("a", 1), ("b", 2)])
+    index.remove("a")
+    index.remove("missing")
+    assert "a" not in index
+    assert index.peek() == ("b", 2)
+    index.remove("b")
+    assert index.peek() == (None, None)
+
+
+def test_matches_a_scan():
+    generator = random.Random(0)
+    index = IndexedHeap()
+    values = {}
+    for _ in range(2000):
+        key = generator.randrange(50)
+        if generator.random() < 0.2:
+            index.remove(key)
+            values.pop(key, None)
+        else:
+            value = generator.randrange(100)
+            index.update(key, value)
+            values[key] = value
+        check_heap(index)
+        if values:
+            assert index.peek()[1] == min(values.values())
+    assert {key: index.get(key) for key in values} == values
@@ -0,0 +1,68 @@
+import pytest
+
+from netTopology import NetworkTopology
+
+
+def link(topology, dpid1, dpid2):
+    # ports numbered after the neighbor
+    topology.add_link(dpid1, dpid2, dpid2, dpid1)
+    topology.add_link(dpid2, dpid1, dpid1, dpid2)
+
+
+@pytest.fixture
+def fabric():
+    # two edge switches, 1 and 4, joined by the spines 2 and 3, and a longer path over 5 and 6
+    topology = NetworkTopology()
+    for dpid1, dpid2 in ((1, 2), (1, 3), (2, 4), (3, 4), (1, 5), (5, 6), (6, 4)):
+        link(topology, dpid1, dpid2)
+    return topology
+
+
+def test_every_equal_cost_path_is_found(fabric):
+    assert sorted(fabric.shortest_paths(1, 4)) == [(1, 2, 4), (1, 3, 4)]
+    assert fabric.shortest_paths(1, 1) == [(1,)]
+    assert fabric.shortest_paths(1, 9) == []
+
+
+def test_paths_are_bounded(fabric):
+    fabric.max_paths = 1
+    assert len(fabric.shortest_paths(1, 4)) == 1
+
+
+def test_a_link_change_drops_the_cached_paths(fabric):
+    assert len(fabric.shortest_paths(1, 4)) == 2
+    fabric.remove_link(2, 4, 4, 2)
+    assert fabric.shortest_paths(1, 4) == [(1, 3, 4)]
+    fabric.remove_link(3, 4, 4, 3)
+    assert fabric.shortest_paths(1, 4) == [(1, 5, 6, 4)]
+
+
+def test_least_congested_path_is_picked(fabric):
+    fabric.add_load((1, 2, 4), 2)
+    assert all(fabric.pick_path(1, 4, flow) == (1, 3, 4) for flow in range(10))
+    assert fabric.congestion(1, 4) == 0
+    fabric.add_load((1, 3, 4), 3)
+    assert fabric.congestion(1, 4) == 2
+    fabric.add_load((1, 2, 4), -2)
+    assert (1, 2) not in fabric.link_load
+    assert fabric.pick_path(1, 9, "flow") is None
+
+
+def test_ties_are_spread_by_flow(fabric):
+    picked = {fabric.pick_path(1, 4, ("10.0.1.{}".format(index), "10.0.0.1")) for index in range(20)}
+    assert picked == {(1, 2, 4), (1, 3, 4)}
+
+
+def test_hops_end_on_the_host_port(fabric):
+    assert fabric.hops((1, 2, 4), 7) == [(1, 2), (2, 4), (4, 7)]
+    assert fabric.uses_link((1, 2, 4), 2, 4)
+    assert not fabric.uses_link((1, 2, 4), 4, 2)
+
+
+def test_hosts_are_not_learnt_on_switch_ports(fabric):
+    assert not fabric.learn_host("10.0.1.1", 1, 2)
+    assert fabric.learn_host("10.0.1.1", 1, 7)
+    assert not fabric.learn_host("10.0.1.1", 1, 7)
+    # the port turns out to lead to another switch
+    link(fabric, 1, 7)
+    assert fabric.location("10.0.1.1") is None
@@ -0,0 +1,60 @@
+import pytest
+
+from commonData import ServerStatus
+from consistentHash import MaglevTable
+from policies import ExpectedWaitPolicy, LeastConnectionPolicy, ResourcePolicy, policy_class
+
+
+def test_policy_class():
+    assert policy_class(3) is ResourcePolicy
+    assert policy_class("4") is LeastConnectionPolicy
+    assert policy_class("expectedwait") is ExpectedWaitPolicy
+    with pytest.raises(ValueError):
+        policy_class("missing")
+
+
+def test_least_loaded(make_controller):
+    balancer = make_controller("resource")
+    balancer.load_index.update("10.0.0.1", 60.)
+    balancer.load_index.update("10.0.0.2", 20.)
+    assert balancer.policy.select() == "10.0.0.2"
+
+
+def test_least_connections(make_controller):
+    balancer = make_controller("leastconnection")
+    balancer.connection_index.update("10.0.0.2", 3)
+    assert balancer.policy.select() == "10.0.0.1"
+
+
+def test_selected_servers_count_as_queued_until_the_next_status(make_controller):
+    policy = make_controller("expectedwait").policy
+    first = policy.select()
+    second = policy.select()
+    assert first != second
+    # a newer status replaces the queue counted since the last one
+    policy.on_status(first, ServerStatus(0., True, False, 1., queue_length=0))
+    assert policy.select() == first
+
+
+def test_saturated_servers_are_skipped(make_controller):
+    policy = make_controller("expectedwait").policy
+    policy.on_status("10.0.0.1", ServerStatus(0., True, False, 1., queue_length=8))
+    assert [policy.select() for _ in range(3)] == ["10.0.0.2"] * 3
+
+
+def test_stale_servers_are_skipped(make_controller):
+    policy = make_controller("weighted").policy
+    policy.on_load("10.0.0.1", 80.)
+    assert policy.select() == "10.0.0.2"
+    policy.on_load("10.0.0.2", None)
+    assert policy.select() == "10.0.0.1"
+
+
+def test_hash_skips_a_server_left_before_the_rebuild(make_controller):
+    balancer = make_controller("hash")
+    balancer.maglev = MaglevTable(balancer.active_servers, 5003)
+    client_ips = ["10.0.1.{}".format(index) for index in range(1, 21)]
+    moved = [ip for ip in client_ips if balancer.maglev.lookup(ip) == "10.0.0.1"]
+    assert moved
+    balancer.active_servers = ["10.0.0.2"]
+    assert all(balancer.policy.select(ip) == "10.0.0.2" for ip in moved)
@@ -0,0 +1,55 @@
+import ipaddress
+
+from prefixSplit import assign_prefixes, covering_network, split_network, weighted_sequence
+
+SERVERS = ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+
+
+def covered(assignment):
+    return sum(ipaddress.ip_network(prefix).num_addresses for prefix in assignment)
+
+
+def test_weighted_sequence_follows_the_weights():
+    sequence = weighted_sequence(SERVERS[:2], {"10.0.0.1": 3}, 8)
+    assert sequence.count("10.0.0.1") == 6
+    assert sequence.count("10.0.0.2") == 2
+    # the lighter server is spread over the sequence, not bunched at the end
+    assert sequence[-2:] != ["10.0.0.2", "10.0.0.2"]
+
+
+def test_split_is_capped_by_the_host_bits():
+    assert len(split_network("10.0.1.0/24", 3)) == 16
+    assert len(split_network("10.0.1.0/30", 3)) == 4
+
+
+def test_prefixes_cover_the_whole_network_once():
+    network = ipaddress.ip_network("10.0.1.0/24")
+    for mode in ("roundrobin", "random"):
+        assignment = assign_prefixes(network, SERVERS, {}, mode)
+        assert covered(assignment) == network.num_addresses
+        prefixes = [ipaddress.ip_network(prefix) for prefix in assignment]
+        assert all(prefix.subnet_of(network) for prefix in prefixes)
+        assert not any(first.overlaps(second) for first in prefixes for second in prefixes if first != second)
+        assert set(assignment.values()) == set(SERVERS)
+
+
+def test_sibling_prefixes_of_a_server_are_merged():
+    assignment = assign_prefixes("10.0.1.0/24", SERVERS[:1], {}, "roundrobin")
+    assert assignment == {"10.0.1.0/24": "10.0.0.1"}
+
+
+def test_hash_mode_asks_the_lookup():
+    assignment = assign_prefixes("10.0.1.0/24", SERVERS[:2], {}, "hash",
+                                 lambda ip: SERVERS[int(ip.split(".")[3]) // 128])
+    assert assignment == {"10.0.1.0/25": "10.0.0.1", "10.0.1.128/25": "10.0.0.2"}
+
+
+def test_no_server_no_prefix():
+    assert assign_prefixes("10.0.1.0/24", [], {}, "roundrobin") == {}
+
+
+def test_covering_network():
+    assert str(covering_network(["10.0.1.1", "10.0.1.200"])) == "10.0.1.0/24"
+    assert str(covering_network(["10.0.1.1", "10.0.2.1"])) == "10.0.0.0/22"
+    assert str(covering_network(["10.0.1.1"])) == "10.0.1.1/32"
+    assert covering_network([]) is None
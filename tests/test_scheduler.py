@@ -0,0 +1,71 @@
+import pytest
+
+from commonData import Request
+from scheduler import create_scheduler
+
+NOW = 1000.  # In s
+# name, cpu usage, time usage, arriving 1 ms apart
+REQUESTS = [("big", 80, 100), ("long", 20, 500), ("short", 20, 50), ("small", 10, 200)]
+
+
+def filled(name, max_wait=0, requests=REQUESTS):
+    scheduler = create_scheduler(name, max_wait)
+    for index, (item, cpu_usage, time_usage) in enumerate(requests):
+        scheduler.add(item, Request("client", index, cpu_usage, time_usage), NOW + index * 1e-3)
+    return scheduler
+
+
+def drain(scheduler, free_cpu, now=NOW + 1.):
+    started = []
+    while True:
+        item = scheduler.pop(free_cpu, now)
+        if item is None:
+            return started
+        started.append(item)
+
+
+def test_fifo_head_blocks():
+    scheduler = filled("fifo")
+    assert drain(scheduler, 50) == []
+    assert drain(scheduler, 100) == ["big", "long", "short", "small"]
+    assert len(scheduler) == 0
+
+
+def test_backfill_starts_the_largest_that_fits():
+    scheduler = filled("backfill")
+    assert drain(scheduler, 50) == ["long", "short", "small"]
+    assert scheduler.backfilled_num == 3
+    assert drain(scheduler, 100) == ["big"]
+
+
+def test_sjf_starts_the_shortest_that_fits():
+    scheduler = filled("sjf")
+    assert drain(scheduler, 50) == ["short", "small", "long"]
+    assert drain(scheduler, 100) == ["big"]
+
+
+@pytest.mark.parametrize("name", ["backfill", "sjf"])
+def test_aged_request_blocks_the_others(name):
+    scheduler = filled(name, max_wait=500)
+    # the oldest waited past max_wait, nothing smaller may pass it
+    assert drain(scheduler, 50) == []
+    assert scheduler.pop(100, NOW + 1.) == "big"
+    assert scheduler.aged_num == 1
+
+
+def test_young_requests_are_not_aged():
+    scheduler = filled("sjf", max_wait=500)
+    assert scheduler.pop(50, NOW + 0.1) == "short"
+    assert scheduler.aged_num == 0
+
+
+@pytest.mark.parametrize("name", ["backfill", "sjf"])
+def test_fractional_usage_fits_fractional_free_cpu(name):
+    # 2.95 and 2.5 share the bucket of 3%, only 2.5 fits in 2.9
+    scheduler = filled(name, requests=[("big", 80, 100), ("too big", 2.95, 10), ("fits", 2.5, 10)])
+    assert drain(scheduler, 2.9) == ["fits"]
+
+
+def test_unknown_scheduler():
+    with pytest.raises(ValueError):
+        create_scheduler("lifo")
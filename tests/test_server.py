@@ -0,0 +1,37 @@
+from commonData import HEARTBEAT, LOG_FREQUENCY, LOG_MAX_PERIOD
+from server import next_sample
+
+
+def reported_gaps(changes, duration=5000):
+    # ms between reported samples of a server whose status changes at the given sample times
+    now, period, last_reported, gaps = 0., LOG_FREQUENCY, None, []
+    while now < duration:
+        since_reported = None
+        if last_reported is not None and not any(last_reported < change <= now for change in changes):
+            since_reported = now - last_reported
+        period, is_reported = next_sample(period, since_reported)
+        if is_reported:
+            if last_reported is not None:
+                gaps.append(now - last_reported)
+            last_reported = now
+        now += period
+    return gaps
+
+
+def test_changes_are_sampled_fast():
+    assert next_sample(LOG_MAX_PERIOD, None) == (LOG_FREQUENCY, True)
+
+
+def test_steady_period_backs_off():
+    period = LOG_FREQUENCY
+    for _ in range(10):
+        period, _ = next_sample(period, 0.)
+    assert period == LOG_MAX_PERIOD
+
+
+def test_steady_server_reports_within_the_heartbeat():
+    assert max(reported_gaps([])) <= HEARTBEAT
+
+
+def test_reports_within_the_heartbeat_after_changes():
+    assert max(reported_gaps([100., 1000., 1010., 2500.])) <= HEARTBEAT
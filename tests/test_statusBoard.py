@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+import statusBoard
+from commonData import ServerStatus
+from statusBoard import BOARD_MAGIC, HEADER, SEQUENCE, StatusBoard
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "status_board")
+
+
+def test_write_and_read(path):
+    board = StatusBoard(path, 8)
+    slot = board.claim_slot("10.0.0.1")
+    assert board.read(slot) is None
+    board.write(slot, ServerStatus(42., False, True, 100., 3, 2, rejected=5))
+    status = StatusBoard(path).read(StatusBoard(path).find_slot("10.0.0.1"))
+    assert (status.cpu_usage, status.is_unavailable, status.queue_length, status.in_flight, status.rejected) == \
+        (42., True, 3, 2, 5)
+
+
+def test_slots_are_claimed_once(path):
+    board = StatusBoard(path, 2)
+    assert board.claim_slot("10.0.0.1") == 0
+    assert StatusBoard(path).claim_slot("10.0.0.2") == 1
+    assert board.claim_slot("10.0.0.1") == 0
+    assert board.find_slot("10.0.0.3") is None
+    with pytest.raises(IndexError):
+        board.claim_slot("10.0.0.3")
+
+
+def test_torn_read_is_retried(path, monkeypatch):
+    board = StatusBoard(path, 1)
+    slot = board.claim_slot("10.0.0.1")
+    board.write(slot, ServerStatus(10., False, False, 1.))
+    slot_layout = statusBoard.SLOT
+
+    class WriteDuringRead():
+        # the writer finishes a new status while the reader copies the old one
+        def __init__(self):
+            self.reads = 0
+
+        def __getattr__(self, name):
+            return getattr(slot_layout, name)
+
+        def unpack_from(self, buffer, offset):
+            fields = slot_layout.unpack_from(buffer, offset)
+            self.reads += 1
+            if self.reads == 1:
+                board.write(slot, ServerStatus(20., False, False, 2.))
+            return fields
+
+    layout = WriteDuringRead()
+    monkeypatch.setattr(statusBoard, "SLOT", layout)
+    assert board.read(slot).cpu_usage == 20.
+    assert layout.reads == 2
+
+
+def test_slot_being_written_is_not_read(path):
+    board = StatusBoard(path, 1)
+    slot = board.claim_slot("10.0.0.1")
+    board.write(slot, ServerStatus(10., False, False, 1.))
+    # an odd sequence number means the writer is half way
+    offset = board.slot_offset(slot)
+    SEQUENCE.pack_into(board.buffer, offset, SEQUENCE.unpack_from(board.buffer, offset)[0] + 1)
+    assert board.read(slot) is None
+
+
+def test_board_of_another_version_is_recreated(path):
+    with open(path, "wb") as board_file:
+        board_file.write(HEADER.pack(BOARD_MAGIC, 1, 4) + b"\xff" * 64)
+    board = StatusBoard(path, 8)
+    assert board.slot_num == 8
+    assert board.find_slot("10.0.0.1") is None
+    assert os.path.getsize(path) == board.size